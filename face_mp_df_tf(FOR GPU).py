@@ -1,28 +1,3611 @@
 import cv2
-import mediapipe as mp
-from deepface import DeepFace
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
+import sys
+import importlib
+import signal
 import threading
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import heapq
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from datetime import datetime, time, timedelta
 import json
+import hashlib
+import sqlite3
 import schedule
+from collections import deque, namedtuple
+from contextlib import closing, contextmanager
+import csv
 import time as tm
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email import encoders
-import tensorflow as tf
 from PIL import Image, ImageTk
 
-# GPU sozlamalarini tekshirish
-physical_devices = tf.config.list_physical_devices('GPU')
-if physical_devices:
-    tf.config.experimental.set_memory_growth(physical_devices[0], True)
+# TensorFlow, DeepFace va MediaPipe og'ir kutubxonalar: ular birinchi
+# ishlatilganda lazy_module orqali yuklanadi, shuning uchun bosh menyu,
+# kontaktlar va jadval bo'limlari tez ochiladi.
+_lazy_modules = {}
+_lazy_lock = threading.RLock()
+
+
+def lazy_module(name):
+    """Og'ir kutubxonani birinchi chaqiruvda import qilish (keyingi chaqiruvlarda keshdan)"""
+    with _lazy_lock:
+        module = _lazy_modules.get(name)
+        if module is None:
+            if name == "deepface":
+                # GPU sozlamasi DeepFace TensorFlow'ni ishga tushirishidan oldin bo'lishi kerak
+                lazy_module("tensorflow")
+            module = importlib.import_module(name)
+            if name == "tensorflow":
+                # GPU sozlamalarini tekshirish
+                physical_devices = module.config.list_physical_devices('GPU')
+                if physical_devices:
+                    module.config.experimental.set_memory_growth(physical_devices[0], True)
+            _lazy_modules[name] = module
+        return module
+
+
+def build_arcface_model():
+    """DeepFace ArcFace modelini yuklash"""
+    return lazy_module("deepface").DeepFace.build_model("ArcFace")
+
+# ArcFace modeli kutadigan kirish o'lchami
+ARCFACE_INPUT_SIZE = (112, 112)
+ARCFACE_EMBEDDING_DIM = 512
+
+
+def crop_face(image, detection):
+    """Mediapipe aniqlagan yuzni rasmdan qirqib olish"""
+    bbox = detection.location_data.relative_bounding_box
+    h, w = image.shape[:2]
+    x, y = max(0, int(bbox.xmin * w)), max(0, int(bbox.ymin * h))
+    width, height = int(bbox.width * w), int(bbox.height * h)
+    return image[y:y+height, x:x+width]
+
+
+def detection_box(detection, width, height):
+    """Mediapipe nisbiy qutisini piksel koordinatalariga (x, y, w, h) o'tkazish"""
+    bbox = detection.location_data.relative_bounding_box
+    return (int(bbox.xmin * width), int(bbox.ymin * height),
+            int(bbox.width * width), int(bbox.height * height))
+
+
+def align_face(image, detection):
+    """Ko'z nuqtalari bo'yicha yuzni gorizontal tekislab qirqib olish"""
+    keypoints = detection.location_data.relative_keypoints
+    if len(keypoints) < 2:
+        return crop_face(image, detection)
+    bbox = detection.location_data.relative_bounding_box
+    h, w = image.shape[:2]
+    x, y = int(bbox.xmin * w), int(bbox.ymin * h)
+    width, height = int(bbox.width * w), int(bbox.height * h)
+
+    # Butun kadrni emas, faqat yuz atrofidagi kengroq sohani aylantiramiz
+    pad = int(max(width, height) * 0.25)
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    x1, y1 = min(w, x + width + pad), min(h, y + height + pad)
+    region = image[y0:y1, x0:x1]
+    if region.size == 0:
+        return region
+
+    right_eye, left_eye = keypoints[0], keypoints[1]
+    angle = np.degrees(np.arctan2((left_eye.y - right_eye.y) * h, (left_eye.x - right_eye.x) * w))
+    center = ((left_eye.x + right_eye.x) / 2 * w - x0, (left_eye.y + right_eye.y) / 2 * h - y0)
+    rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+    rotated = cv2.warpAffine(region, rotation, (region.shape[1], region.shape[0]),
+                             flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    top, left = max(0, y - y0), max(0, x - x0)
+    return rotated[top:top + height, left:left + width]
+
+
+def estimate_yaw(detection, width, height):
+    """Mediapipe nuqtalaridan boshning chapga/o'ngga burilish burchagini (gradus) baholash.
+
+    Burun uchidan ikki quloqqacha bo'lgan gorizontal masofalar nisbati
+    ishlatiladi; nuqtalar yetarli bo'lmasa None.
+    """
+    keypoints = detection.location_data.relative_keypoints
+    if len(keypoints) < 6:
+        return None
+    nose, right_ear, left_ear = keypoints[2], keypoints[4], keypoints[5]
+    to_right = abs(nose.x - right_ear.x) * width
+    to_left = abs(left_ear.x - nose.x) * width
+    if to_right + to_left <= 0:
+        return None
+    return float(np.degrees(np.arcsin(np.clip((to_right - to_left) / (to_right + to_left), -1.0, 1.0))))
+
+
+class FaceQualityGate:
+    """Neyron tarmoqdan oldingi arzon sifat filtri.
+
+    Tekshiruvlar arzonidan boshlab bajariladi: yuz o'lchami, Mediapipe
+    ishonchi, burilish burchagi va Laplasian dispersiyasi bo'yicha
+    aniqlik. check() birinchi buzilgan qoida nomini yoki None qaytaradi.
+    """
+
+    RULES = ("size", "score", "yaw", "sharpness")
+
+    def __init__(self, min_face_size=40, min_score=0.6, max_yaw=35.0, min_sharpness=40.0):
+        self.min_face_size = min_face_size
+        self.min_score = min_score
+        self.max_yaw = max_yaw
+        self.min_sharpness = min_sharpness
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(min_face_size=settings["quality_min_face_size"],
+                   min_score=settings["quality_min_score"],
+                   max_yaw=settings["quality_max_yaw"],
+                   min_sharpness=settings["quality_min_sharpness"])
+
+    @staticmethod
+    def sharpness(image, x, y, width, height):
+        """Yuz sohasining Laplasian dispersiyasi (o'lchamga bog'liq bo'lmasligi uchun 64x64 da)"""
+        region = image[max(0, y):y + height, max(0, x):x + width]
+        if region.size == 0:
+            return 0.0
+        gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    def check(self, frame, detection):
+        h, w = frame.shape[:2]
+        x, y, width, height = detection_box(detection, w, h)
+        if min(width, height) < self.min_face_size:
+            return "size"
+        score = detection.score[0] if len(detection.score) else 1.0
+        if score < self.min_score:
+            return "score"
+        yaw = estimate_yaw(detection, w, h)
+        if yaw is not None and abs(yaw) > self.max_yaw:
+            return "yaw"
+        if self.sharpness(frame, x, y, width, height) < self.min_sharpness:
+            return "sharpness"
+        return None
+
+
+class FaceEmbedder:
+    """Kadrdagi barcha yuzlarni bitta paketda ArcFace orqali vektorga aylantirish.
+
+    max_batch_size modelga bir chaqiruvda beriladigan yuzlar sonini
+    cheklaydi (faqat CPU bo'lgan kompyuterlarda xotirani sozlash uchun).
+
+    compile=True bo'lsa to'g'ri o'tish qat'iy kirish imzoli tf.function
+    orqali bajariladi va paketlar 1, 2, 4, ... max_batch_size o'lchamlariga
+    to'ldiriladi: shunday qilib faqat warm_up isitgan shakllar ishlatiladi.
+    """
+
+    def __init__(self, model, max_batch_size=16, compile=True):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        # DeepFace versiyasiga qarab model Keras modeli yoki uning o'rami bo'ladi
+        self.keras_model = getattr(model, "model", model)
+        self.buckets = []
+        bucket = 1
+        while bucket < self.max_batch_size:
+            self.buckets.append(bucket)
+            bucket *= 2
+        self.buckets.append(self.max_batch_size)
+        self.compiled = None
+        if compile:
+            try:
+                self.compiled = self._compile()
+            except Exception as e:
+                print(f"ArcFace modelini tf.function bilan kompilyatsiya qilishda xato: {e}")
+
+    def _compile(self):
+        tf = lazy_module("tensorflow")
+        keras_model = self.keras_model
+        signature = [tf.TensorSpec([None, ARCFACE_INPUT_SIZE[1], ARCFACE_INPUT_SIZE[0], 3], tf.float32)]
+
+        @tf.function(input_signature=signature)
+        def forward(batch):
+            return keras_model(batch, training=False)
+
+        return forward
+
+    @staticmethod
+    def resize_faces(faces, out=None):
+        """Yuzlarni ArcFace kirish o'lchamiga keltirib bitta uint8 (BGR) massivga yig'ish"""
+        if out is None:
+            out = np.empty((len(faces), ARCFACE_INPUT_SIZE[1], ARCFACE_INPUT_SIZE[0], 3), dtype=np.uint8)
+        for i, face in enumerate(faces):
+            out[i] = cv2.resize(face, ARCFACE_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+        return out
+
+    @staticmethod
+    def to_model_input(resized):
+        """uint8 BGR paketni modelning float32 RGB kirishiga aylantirish"""
+        return resized[..., ::-1].astype(np.float32) / np.float32(255.0)
+
+    def forward(self, batch):
+        """Tayyor paketni modeldan o'tkazish"""
+        if self.compiled is None:
+            return self.keras_model.predict(batch, verbose=0)
+        count = len(batch)
+        bucket = next((size for size in self.buckets if size >= count), count)
+        if bucket > count:
+            padding = np.zeros((bucket - count,) + batch.shape[1:], dtype=np.float32)
+            batch = np.concatenate([batch, padding])
+        try:
+            return np.asarray(self.compiled(batch))[:count]
+        except Exception as e:
+            print(f"Kompilyatsiya qilingan model ishlamadi, predict ishlatiladi: {e}")
+            self.compiled = None
+            return self.keras_model.predict(batch[:count], verbose=0)
+
+    def warm_up(self):
+        """Har bir paket o'lchami uchun bo'sh kirish bilan modelni isitish;
+        sarflangan soniyalarni qaytaradi"""
+        started = tm.perf_counter()
+        for size in self.buckets:
+            self.forward(np.zeros((size, ARCFACE_INPUT_SIZE[1], ARCFACE_INPUT_SIZE[0], 3), dtype=np.float32))
+        return tm.perf_counter() - started
+
+    def embed_resized(self, resized):
+        """Oldindan o'lchami keltirilgan uint8 yuzlar uchun vektorlar"""
+        if not len(resized):
+            return np.zeros((0, ARCFACE_EMBEDDING_DIM), dtype=np.float32)
+        outputs = [np.asarray(self.forward(self.to_model_input(resized[i:i + self.max_batch_size])),
+                              dtype=np.float32)
+                   for i in range(0, len(resized), self.max_batch_size)]
+        return np.vstack(outputs).reshape(len(resized), -1)
+
+    def embed(self, faces):
+        """Yuzlar ro'yxati uchun (N x 512) vektorlar matritsasi"""
+        if not len(faces):
+            return np.zeros((0, ARCFACE_EMBEDDING_DIM), dtype=np.float32)
+        return self.embed_resized(self.resize_faces(faces))
+
+
+def normalize_rows(vectors):
+    """Vektorlarni birlik uzunlikka keltirish"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-10)
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    """Fayl tarkibining SHA1 xeshi"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """Baza suratlaridan olingan ArcFace vektorlari ombori.
+
+    Vektorlar float32 matritsa, har bir qatorga mos o'quvchi kaliti
+    (labels) va surat yo'li (sources) sifatida yuritiladi. image_index har
+    bir suratning tarkib xeshini saqlaydi, shuning uchun o'zgarmagan
+    suratlar qayta vektorga aylantirilmaydi. Hammasi students.db
+    (StudentDatabase) da saqlanadi; eski formatdagi .npy fayllar va
+    image_index.json faqat o'qiladi (ko'chirish va ANN benchmarki uchun).
+    """
+
+    EMBEDDINGS_FILE = "embeddings.npy"
+    LABELS_FILE = "labels.npy"
+    SOURCES_FILE = "sources.npy"
+    IMAGE_INDEX_FILE = "image_index.json"
+    # Yuzni qirqish/tekislash usuli o'zgarsa oshiriladi: eski vektorlar qayta hisoblanadi
+    VERSION = 2
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.embeddings = np.zeros((0, ARCFACE_EMBEDDING_DIM), dtype=np.float32)
+        self.labels = np.array([], dtype=str)
+        self.sources = np.array([], dtype=str)
+        self.image_index = {}
+
+    def _path(self, filename):
+        return os.path.join(self.db_path, filename)
+
+    def exists(self):
+        """Saqlangan vektorlar mavjudligini tekshirish"""
+        return StudentDatabase.exists(self.db_path) or self._files_exist()
+
+    def _files_exist(self):
+        return os.path.exists(self._path(self.EMBEDDINGS_FILE)) and os.path.exists(self._path(self.LABELS_FILE))
+
+    def load(self):
+        """Saqlangan vektorlarni yuklash"""
+        if StudentDatabase.exists(self.db_path):
+            with closing(StudentDatabase(self.db_path)) as db:
+                self.embeddings, self.labels, self.sources, self.image_index = db.load_embeddings()
+            return self
+        return self.load_files()
+
+    def load_files(self):
+        """Eski formatdagi .npy va image_index.json fayllaridan yuklash"""
+        self.embeddings = np.load(self._path(self.EMBEDDINGS_FILE)).astype(np.float32, copy=False)
+        self.labels = np.load(self._path(self.LABELS_FILE))
+        if os.path.exists(self._path(self.SOURCES_FILE)):
+            self.sources = np.load(self._path(self.SOURCES_FILE))
+        else:
+            # Eski formatdagi ombor: manbasiz qatorlar keyingi indekslashda yangilanadi
+            self.sources = np.full(len(self.labels), "", dtype=str)
+        self.image_index = {}
+        if os.path.exists(self._path(self.IMAGE_INDEX_FILE)):
+            with open(self._path(self.IMAGE_INDEX_FILE), 'r') as f:
+                self.image_index = json.load(f)
+        return self
+
+    def save(self):
+        """Vektorlarni students.db ga saqlash (faqat o'zgargan suratlar yangilanadi)"""
+        with closing(StudentDatabase.open(self.db_path)) as db:
+            db.save_embeddings(self.embeddings, self.labels, self.sources, self.image_index)
+
+    def load_reference_face(self, image_path, face_detection):
+        """Baza suratidagi eng katta yuzni topib, tekislangan holda qirqib olish"""
+        img = cv2.imread(image_path)
+        if img is None:
+            return None
+        results = face_detection.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        if results.detections:
+            largest = max(results.detections,
+                          key=lambda d: d.location_data.relative_bounding_box.width *
+                                        d.location_data.relative_bounding_box.height)
+            face_img = align_face(img, largest)
+            if face_img.size != 0:
+                return face_img
+        return img
+
+    def _image_signature(self, name, image_path, previous):
+        """Surat xeshi; hajmi va vaqti o'zgarmagan bo'lsa oldingi xesh ishlatiladi"""
+        stat = os.stat(image_path)
+        if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+            sha1 = previous["sha1"]
+        else:
+            sha1 = file_sha1(image_path)
+        return {"label": name, "sha1": sha1, "size": stat.st_size, "mtime": stat.st_mtime,
+                "version": self.VERSION}
+
+    def _remove_rows(self, mask):
+        keep = ~mask
+        self.embeddings = self.embeddings[keep]
+        self.labels = self.labels[keep]
+        self.sources = self.sources[keep]
+
+    def sync_person(self, name, image_folder, face_detection, embedder):
+        """Bitta o'quvchi papkasidagi yangi yoki o'zgargan suratlarni indekslash.
+
+        O'zgarish bo'lsa True qaytaradi (saqlash chaqiruvchining vazifasi).
+        """
+        current = {}
+        if os.path.isdir(image_folder):
+            for img_file in sorted(os.listdir(image_folder)):
+                image_path = os.path.join(image_folder, img_file)
+                if os.path.isfile(image_path):
+                    current[os.path.relpath(image_path, self.db_path)] = image_path
+
+        signatures = {}
+        changed = []
+        for source, image_path in current.items():
+            previous = self.image_index.get(source)
+            signatures[source] = self._image_signature(name, image_path, previous)
+            if (not previous or previous["sha1"] != signatures[source]["sha1"]
+                    or previous.get("version") != self.VERSION):
+                changed.append(source)
+
+        person_rows = self.labels == name
+        stale_rows = person_rows & ~np.isin(self.sources, [s for s in current if s not in changed])
+        removed = [s for s, entry in self.image_index.items()
+                   if entry.get("label") == name and s not in current]
+        if not changed and not removed and not stale_rows.any():
+            return False
+
+        self._remove_rows(stale_rows)
+        for source in removed:
+            del self.image_index[source]
+
+        faces, sources, failed = [], [], set()
+        for source in changed:
+            try:
+                face_img = self.load_reference_face(current[source], face_detection)
+            except Exception as e:
+                print(f"Suratni qayta ishlashda xato ({source}): {e}")
+                failed.add(source)
+                continue
+            if face_img is not None:
+                faces.append(face_img)
+                sources.append(source)
+        embeddings = embedder.embed(faces)
+        for source in current:
+            if source in failed:
+                # Xeshsiz qolgan surat keyingi indekslashda qayta uriniladi
+                self.image_index.pop(source, None)
+            else:
+                self.image_index[source] = signatures[source]
+
+        if len(embeddings):
+            self.embeddings = np.vstack([self.embeddings, embeddings]).astype(np.float32)
+            self.labels = np.concatenate([self.labels, np.full(len(sources), name)])
+            self.sources = np.concatenate([self.sources, np.array(sources)])
+        return True
+
+    def reindex_changed(self, database, face_detection, embedder):
+        """Faqat o'zgargan papkalarni qayta indekslash, o'zgargan o'quvchilar ro'yxatini qaytarish"""
+        changed = []
+        removed = set(self.labels.tolist()) - set(database)
+        if removed:
+            self._remove_rows(np.isin(self.labels, list(removed)))
+            self.image_index = {s: e for s, e in self.image_index.items() if e.get("label") not in removed}
+        for person_name, person_data in database.items():
+            if self.sync_person(person_name, person_data["image_folder"], face_detection, embedder):
+                changed.append(person_name)
+        if changed or removed:
+            self.save()
+        return changed
+
+
+class StudentDatabase:
+    """Baza papkasidagi SQLite ombori (students.db).
+
+    O'quvchilar, ularning suratlari, suratlardan olingan ArcFace vektorlari
+    (float32 BLOB) va davomat hodisalari indekslangan jadvallarda saqlanadi.
+    Har bir o'quvchi alohida qator bo'lgani uchun bir xil ismli o'quvchilar
+    ustma-ust yozilmaydi; ilova ichida o'quvchi noyob kaliti (key) bo'yicha
+    aniqlanadi. O'zgarishlar faylni to'liq qayta yozmasdan bitta
+    tranzaksiyada saqlanadi.
+    """
+
+    FILENAME = "students.db"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            surname TEXT,
+            father_name TEXT,
+            faculty TEXT,
+            direction TEXT,
+            group_name TEXT,
+            image_folder TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS students_name ON students(name, surname);
+        CREATE INDEX IF NOT EXISTS students_group ON students(group_name);
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY,
+            student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+            path TEXT NOT NULL UNIQUE,
+            sha1 TEXT,
+            size INTEGER,
+            mtime REAL,
+            version INTEGER,
+            embedding BLOB
+        );
+        CREATE INDEX IF NOT EXISTS images_student ON images(student_id);
+        CREATE TABLE IF NOT EXISTS attendance_events (
+            id INTEGER PRIMARY KEY,
+            student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+            session TEXT NOT NULL,
+            date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            event_time TEXT,
+            probability REAL,
+            mean_distance REAL,
+            UNIQUE (session, student_id)
+        );
+        CREATE INDEX IF NOT EXISTS events_date ON attendance_events(date, status);
+        CREATE INDEX IF NOT EXISTS events_student ON attendance_events(student_id, date);
+    """
+    STUDENT_FIELDS = ("name", "surname", "father_name", "faculty", "direction", "group", "image_folder")
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(os.path.join(db_path, self.FILENAME), timeout=30, check_same_thread=False)
+        # WAL: davomat yozilayotganda ham bazani boshqa jarayonlar o'qiy oladi
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+
+    @classmethod
+    def exists(cls, db_path):
+        return os.path.exists(os.path.join(db_path, cls.FILENAME))
+
+    @classmethod
+    def open(cls, db_path):
+        """Bazani ochish; o'quvchilar jadvali bo'sh va metadata.json mavjud bo'lsa
+        eski papka avtomatik ko'chiriladi"""
+        db = cls(db_path)
+        if (os.path.exists(os.path.join(db_path, "metadata.json"))
+                and db.conn.execute("SELECT 1 FROM students LIMIT 1").fetchone() is None):
+            db.migrate()
+        return db
+
+    def close(self):
+        self.conn.close()
+
+    def migrate(self):
+        """metadata.json va embeddings.npy/labels.npy/sources.npy ni bazaga ko'chirish.
+
+        Eski fayllar o'zgartirilmaydi. Manbasi yo'q (eski formatdagi) vektorlar
+        ko'chirilmaydi, ular keyingi indekslashda suratlardan qayta olinadi.
+        """
+        with open(os.path.join(self.db_path, "metadata.json"), 'r') as f:
+            metadata = json.load(f)
+        with self.conn:
+            for key, data in metadata.items():
+                self._upsert_student(key, dict(data, name=data.get("name", key)))
+        legacy = EmbeddingStore(self.db_path)
+        if legacy._files_exist():
+            legacy.load_files()
+            self.save_embeddings(legacy.embeddings, legacy.labels, legacy.sources, legacy.image_index)
+        print(f"{self.db_path}: {len(metadata)} ta o'quvchi {self.FILENAME} ga ko'chirildi")
+
+    def students(self):
+        """Barcha o'quvchilar: {kalit: ma'lumot} (metadata.json bilan bir xil ko'rinishda)"""
+        rows = self.conn.execute(
+            "SELECT key, name, surname, father_name, faculty, direction, group_name, image_folder "
+            "FROM students ORDER BY id")
+        return {row[0]: dict(zip(self.STUDENT_FIELDS, row[1:])) for row in rows}
+
+    def student_key(self, name, surname, father_name, group):
+        """O'quvchi kaliti: shu o'quvchi allaqachon bo'lsa uning kaliti, aks holda
+        ism, "ism familiya" yoki "ism familiya (n)" dan birinchi band bo'lmagani"""
+        row = self.conn.execute(
+            "SELECT key FROM students WHERE name = ? AND surname = ? AND father_name = ? AND group_name = ?",
+            (name, surname, father_name, group)).fetchone()
+        if row:
+            return row[0]
+        candidates = [name, f"{name} {surname}"]
+        candidates += [f"{name} {surname} ({n})" for n in range(2, 1000)]
+        for key in candidates:
+            if self.conn.execute("SELECT 1 FROM students WHERE key = ?", (key,)).fetchone() is None:
+                return key
+        raise ValueError(f"{name} {surname} uchun bo'sh kalit topilmadi")
+
+    def _upsert_student(self, key, data):
+        self.conn.execute(
+            "INSERT INTO students (key, name, surname, father_name, faculty, direction, group_name, image_folder) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET name = excluded.name, "
+            "surname = excluded.surname, father_name = excluded.father_name, faculty = excluded.faculty, "
+            "direction = excluded.direction, group_name = excluded.group_name, "
+            "image_folder = excluded.image_folder",
+            (key,) + tuple(data.get(field) for field in self.STUDENT_FIELDS))
+
+    def save_student(self, key, data, images=()):
+        """O'quvchini qo'shish yoki yangilash (data - metadata.json yozuvi ko'rinishida).
+
+        images - {"path", "sha1", "size", "mtime", "version", "embedding"} yozuvlari;
+        o'quvchi bilan birga bitta tranzaksiyada saqlanadi.
+        """
+        with self.conn:
+            self._upsert_student(key, data)
+            if images:
+                student_id = self.conn.execute("SELECT id FROM students WHERE key = ?", (key,)).fetchone()[0]
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO images (student_id, path, sha1, size, mtime, version, embedding) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(student_id, image["path"], image["sha1"], image["size"], image["mtime"], image["version"],
+                      np.asarray(image["embedding"], dtype=np.float32).tobytes()) for image in images])
+
+    def load_embeddings(self):
+        """(embeddings, labels, sources, image_index) - EmbeddingStore maydonlari"""
+        rows = self.conn.execute(
+            "SELECT s.key, i.path, i.sha1, i.size, i.mtime, i.version, i.embedding "
+            "FROM images i JOIN students s ON s.id = i.student_id ORDER BY i.id").fetchall()
+        image_index = {path: {"label": key, "sha1": sha1, "size": size, "mtime": mtime, "version": version}
+                       for key, path, sha1, size, mtime, version, _ in rows}
+        rows = [row for row in rows if row[6] is not None]
+        embeddings = np.zeros((len(rows), ARCFACE_EMBEDDING_DIM), dtype=np.float32)
+        for i, row in enumerate(rows):
+            embeddings[i] = np.frombuffer(row[6], dtype=np.float32)
+        labels = np.array([row[0] for row in rows], dtype=str)
+        sources = np.array([row[1] for row in rows], dtype=str)
+        return embeddings, labels, sources, image_index
+
+    def save_embeddings(self, embeddings, labels, sources, image_index):
+        """Faqat o'zgargan suratlar qatorlarini yangilash, o'chirilganlarini olib tashlash"""
+        student_ids = dict(self.conn.execute("SELECT key, id FROM students"))
+        existing = {path: rest for path, *rest in self.conn.execute(
+            "SELECT path, student_id, sha1, size, mtime, version, embedding IS NOT NULL FROM images")}
+        vectors = {source: i for i, source in enumerate(sources) if source}
+        with self.conn:
+            self.conn.executemany("DELETE FROM images WHERE path = ?",
+                                  [(path,) for path in existing if path not in image_index])
+            for path, entry in image_index.items():
+                student_id = student_ids.get(entry["label"])
+                if student_id is None:
+                    continue
+                row = vectors.get(path)
+                state = [student_id, entry["sha1"], entry["size"], entry["mtime"], entry.get("version"),
+                         int(row is not None)]
+                if existing.get(path) == state:
+                    continue
+                blob = np.asarray(embeddings[row], dtype=np.float32).tobytes() if row is not None else None
+                self.conn.execute(
+                    "INSERT INTO images (student_id, path, sha1, size, mtime, version, embedding) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+                    "student_id = excluded.student_id, sha1 = excluded.sha1, size = excluded.size, "
+                    "mtime = excluded.mtime, version = excluded.version, embedding = excluded.embedding",
+                    state[:1] + [path] + state[1:5] + [blob])
+
+    def record_session(self, session, attendance, date):
+        """Sessiya yakunidagi har bir o'quvchi holatini davomat tarixiga yozish
+        (qayta yozilsa sessiya yozuvlari yangilanadi)"""
+        student_ids = dict(self.conn.execute("SELECT key, id FROM students"))
+        rows = [(student_ids[key], session, date.isoformat(), person["status"],
+                 person["arrival_time"] or person["late_time"],
+                 float(person["probability"]) if person["recorded"] else None,
+                 float(person["mean_distance"]) if person["recorded"] else None)
+                for key, person in attendance.items() if key in student_ids]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO attendance_events "
+                "(student_id, session, date, status, event_time, probability, mean_distance) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def attendance_counts(self, status=None, group=None, since=None, until=None):
+        """O'quvchilar bo'yicha hodisalar soni, masalan guruhning oy davomida
+        necha marta kech qolgani: [(kalit, ism, familiya, guruh, soni)]"""
+        conditions, params = [], []
+        for column, value in (("e.status = ?", status), ("s.group_name = ?", group),
+                              ("e.date >= ?", since and since.isoformat()),
+                              ("e.date <= ?", until and until.isoformat())):
+            if value:
+                conditions.append(column)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        return self.conn.execute(
+            "SELECT s.key, s.name, s.surname, s.group_name, COUNT(*) FROM attendance_events e "
+            f"JOIN students s ON s.id = e.student_id {where}"
+            "GROUP BY s.id ORDER BY COUNT(*) DESC, s.key", params).fetchall()
+
+
+# Tanib olish sozlamalari (recognition_settings.json orqali o'zgartiriladi)
+DEFAULT_RECOGNITION_SETTINGS = {
+    "min_probability": 0.5,
+    "reduction": "min",
+    "top_k": 3,
+    # Modelga bir chaqiruvda beriladigan eng ko'p yuzlar soni
+    "max_batch_size": 16,
+    # Ko'p bosqichli video oqimi: tanib olish ishchilari soni va navbat hajmi
+    "recognition_workers": 2,
+    "pipeline_queue_size": 2,
+    # 0 dan katta bo'lsa vektorlash va taqqoslash alohida jarayonlarda bajariladi
+    "process_workers": 0,
+    "process_worker_threads": 1,
+    # Yuzlarni kuzatish: har bir yuz kuzatuv davomida bir marta tanib olinadi
+    "tracking": True,
+    "track_iou_threshold": 0.3,
+    "track_max_missed": 15,
+    "track_confirm_hits": 2,
+    "track_retry_interval": 0.5,
+    "track_reverify_interval": 10.0,
+    # "exact" - to'liq qidiruv, "ivf" - katta bazalar uchun taxminiy qidiruv
+    "index_backend": "exact",
+    "ivf_nlist": 0,
+    "ivf_nprobe": 8,
+    "ann_candidates": 64,
+    # Tanib olishdan oldingi sifat filtri: kichik (piksel), past ishonchli,
+    # yon tomonga burilgan (gradus) va xira (Laplasian dispersiyasi) yuzlar o'tkazib yuboriladi
+    "quality_gate": True,
+    "quality_min_face_size": 40,
+    "quality_min_score": 0.6,
+    "quality_max_yaw": 35.0,
+    "quality_min_sharpness": 40.0,
+    # Yuklamaga moslashish: kechikish maqsadi (soniya), aniqlash kadrining eng kichik
+    # masshtabi, eng siyrak aniqlash (har n-kadr) va tanib olish pauzasi (soniya)
+    "adaptive": True,
+    "adaptive_target_latency": 0.3,
+    "adaptive_min_scale": 0.5,
+    "adaptive_max_detect_every": 4,
+    "adaptive_pause_seconds": 1.0,
+    # Davomatni har bir yozilishda JSON lines jurnalga yozish (uzilgan sessiyani tiklash uchun)
+    "journal": True,
+    # Har bir o'quvchi uchun saqlanadigan oxirgi masofalar soni (0 - saqlanmaydi)
+    "distance_history": 0,
+    # Oynadagi video ko'rinishi uchun eng ko'p kadr tezligi (0 - cheklanmaydi)
+    "preview_fps": 15,
+    # Tayyorlangan vektorlar matritsasini baza papkasidagi xotiraga akslantirilgan
+    # keshga chiqarish: shu kompyuterdagi barcha sessiya va ishchilar bitta nusxadan o'qiydi
+    "embedding_cache": True,
+    # Ko'p xonali rejimda bitta xona umumiy paketga qo'shadigan eng ko'p yuzlar (0 - cheklanmaydi)
+    "room_max_batch_faces": 0,
+    # Davomat oynasidagi unumdorlik paneli va sessiya oxirida JSON/CSV profil eksporti
+    "profile_panel": False,
+    "profile_export": False,
+}
+
+FaceMatch = namedtuple("FaceMatch", ["name", "distance", "margin"])
+EmbeddingSnapshot = namedtuple("EmbeddingSnapshot", ["version", "names", "label_ids", "matrix"])
+
+
+def prepare_match_rows(embeddings, labels):
+    """Taqqoslash uchun qatorlar: noyob ismlar, ism bo'yicha tartiblangan
+    qatorlarning ism indekslari va normallashtirilgan vektorlar"""
+    names, label_ids = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+    order = np.argsort(label_ids, kind="stable")
+    return names, label_ids[order], normalize_rows(np.asarray(embeddings)[order])
+
+
+class IVFIndex:
+    """Inverted file (IVF) taxminiy qidiruv indeksi.
+
+    Vektorlar k-means bilan nlist ta klasterga bo'linadi va qidiruvda faqat
+    so'rovga eng yaqin nprobe ta klaster ko'riladi. nprobe oshsa aniqlik
+    (recall) oshadi, lekin qidiruv sekinlashadi.
+    """
+
+    def __init__(self, matrix, nlist=0, nprobe=8, iterations=10, seed=0):
+        self.matrix = matrix
+        rows = len(matrix)
+        if not nlist:
+            nlist = int(round(4 * np.sqrt(rows)))
+        self.nlist = max(1, min(int(nlist), rows))
+        self.nprobe = max(1, min(int(nprobe), self.nlist))
+        self.centroids = self._train(iterations, seed)
+
+        assignments = np.argmax(matrix @ self.centroids.T, axis=1)
+        counts = np.bincount(assignments, minlength=self.nlist)
+        if not counts.all():
+            # Bir xil vektorlar (bitta surat bir necha marta yozilgan) bir xil markazlar
+            # beradi va argmax doim birinchisini tanlaydi: bo'sh klasterlar tashlanadi
+            self.centroids = self.centroids[counts > 0]
+            self.nlist = len(self.centroids)
+            self.nprobe = min(self.nprobe, self.nlist)
+            assignments = np.argmax(matrix @ self.centroids.T, axis=1)
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(self.nlist + 1))
+
+    def _train(self, iterations, seed):
+        """Sferik k-means bilan klaster markazlarini o'rgatish"""
+        rng = np.random.default_rng(seed)
+        centroids = self.matrix[rng.choice(len(self.matrix), self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(self.matrix @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self.matrix)
+            counts = np.bincount(assignments, minlength=self.nlist)
+            empty = counts == 0
+            if empty.any():
+                # Bo'sh klasterlarni tasodifiy vektorlar bilan qayta boshlash
+                sums[empty] = self.matrix[rng.choice(len(self.matrix), int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def search(self, queries, k):
+        """Eng yaqin nprobe ta klaster ichidan k ta eng yaqin qatorni topish"""
+        probes = np.argpartition(-(queries @ self.centroids.T), self.nprobe - 1, axis=1)[:, :self.nprobe]
+        all_distances, all_rows = [], []
+        for query, query_probes in zip(queries, probes):
+            rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in query_probes])
+            distances = 1.0 - self.matrix[rows] @ query
+            nearest = np.argsort(distances)[:k]
+            all_distances.append(distances[nearest])
+            all_rows.append(rows[nearest])
+        return all_distances, all_rows
+
+
+class FaceMatcher:
+    """Jonli yuz vektorlarini bazadagi barcha vektorlar bilan bitta matritsa
+    amalida taqqoslash.
+
+    Har bir o'quvchi uchun masofa uning suratlari bo'yicha eng kichik
+    ("min") yoki eng yaqin top_k masofaning o'rtachasi ("topk") sifatida
+    olinadi. Ehtimollik 1 - masofa deb hisoblanadi va min_probability dan
+    katta bo'lsagina o'quvchi tanilgan hisoblanadi.
+
+    index_backend="ivf" bo'lsa, butun matritsa o'rniga IVFIndex qaytargan
+    ann_candidates ta nomzod qator ichida qidiriladi. search(queries, k)
+    metodiga ega istalgan boshqa indeksni ham self.index ga berish mumkin.
+    """
+
+    def __init__(self, embeddings, labels, min_probability=0.5, reduction="min", top_k=3,
+                 index_backend="exact", ivf_nlist=0, ivf_nprobe=8, ann_candidates=64):
+        self.min_probability = float(min_probability)
+        self.reduction = reduction
+        self.top_k = max(1, int(top_k))
+        self.ann_candidates = max(1, int(ann_candidates))
+        self.index_backend = index_backend
+        self.ivf_nlist = ivf_nlist
+        self.ivf_nprobe = ivf_nprobe
+        self.version = None
+        self._set_rows(*prepare_match_rows(embeddings, labels))
+
+    def _set_rows(self, names, label_ids, matrix):
+        self.names = names
+        self.label_ids = label_ids
+        self.matrix = matrix
+
+        # Qatorlar ism bo'yicha ketma-ket joylashgan: har bir guruh boshi
+        counts = np.bincount(self.label_ids, minlength=len(self.names))
+        self.group_starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+
+        # top-k uchun (odam x surat) indeks jadvali; bo'sh joylar cheksiz masofali ustunga ishora qiladi
+        rows = len(self.label_ids)
+        self.group_rows = np.full((len(self.names), counts.max() if rows else 0), rows, dtype=np.int64)
+        positions = np.arange(rows) - self.group_starts[self.label_ids]
+        self.group_rows[self.label_ids, positions] = np.arange(rows)
+
+        self.index = None
+        if self.index_backend == "ivf" and rows:
+            self.index = IVFIndex(self.matrix, nlist=self.ivf_nlist, nprobe=self.ivf_nprobe)
+
+    @classmethod
+    def from_store(cls, store, settings):
+        """EmbeddingStore va sozlamalardan matcher yaratish"""
+        return cls.from_arrays(store.embeddings, store.labels, settings)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, settings):
+        """EmbeddingCache'dagi tayyor qatorlardan nusxa olmasdan matcher yaratish"""
+        matcher = cls.from_arrays(np.zeros((0, ARCFACE_EMBEDDING_DIM), dtype=np.float32), [], settings)
+        matcher._set_rows(snapshot.names, snapshot.label_ids, snapshot.matrix)
+        matcher.version = snapshot.version
+        return matcher
+
+    @classmethod
+    def from_arrays(cls, embeddings, labels, settings):
+        """Vektorlar, ismlar va sozlamalardan matcher yaratish"""
+        return cls(embeddings, labels,
+                   min_probability=settings.get("min_probability", 0.5),
+                   reduction=settings.get("reduction", "min"),
+                   top_k=settings.get("top_k", 3),
+                   index_backend=settings.get("index_backend", "exact"),
+                   ivf_nlist=settings.get("ivf_nlist", 0),
+                   ivf_nprobe=settings.get("ivf_nprobe", 8),
+                   ann_candidates=settings.get("ann_candidates", 64))
+
+    def person_distances(self, queries):
+        """So'rovlardan har bir o'quvchigacha bo'lgan masofalar matritsasi (Q x P)"""
+        queries = normalize_rows(np.atleast_2d(queries))
+        distances = 1.0 - queries @ self.matrix.T
+        if self.reduction == "topk" and self.top_k > 1:
+            padded = np.concatenate(
+                [distances, np.full((len(queries), 1), np.inf, dtype=np.float32)], axis=1)
+            nearest = np.sort(padded[:, self.group_rows], axis=2)[:, :, :self.top_k]
+            valid = np.isfinite(nearest)
+            return np.where(valid, nearest, 0.0).sum(axis=2) / np.maximum(valid.sum(axis=2), 1)
+        return np.minimum.reduceat(distances, self.group_starts, axis=1)
+
+    def _reduce_candidates(self, distances, rows):
+        """Nomzod qatorlar (o'sish tartibida) bo'yicha o'quvchilar masofasi"""
+        label_ids = self.label_ids[rows]
+        person_ids, first = np.unique(label_ids, return_index=True)
+        if self.reduction == "topk" and self.top_k > 1:
+            person_distances = np.array([distances[label_ids == pid][:self.top_k].mean()
+                                         for pid in person_ids])
+        else:
+            person_distances = distances[first]
+        return person_ids, person_distances
+
+    def match(self, queries):
+        """Har bir so'rov uchun FaceMatch (ism, masofa, ikkinchi nomzoddan farq) qaytarish.
+
+        Ehtimollik chegarasidan o'tmagan yuzlar uchun ism None bo'ladi.
+        """
+        queries = np.atleast_2d(queries)
+        if not len(self.names) or not len(queries):
+            return [FaceMatch(None, float("inf"), 0.0) for _ in range(len(queries))]
+
+        if self.index is not None:
+            return self._match_approximate(normalize_rows(queries))
+
+        return self._to_matches(*self._match_exact(queries))
+
+    def _match_exact(self, queries):
+        """Butun matritsa bo'yicha: eng yaqin o'quvchi, masofa va ikkinchi nomzoddan farq"""
+        per_person = self.person_distances(queries)
+        best = np.argmin(per_person, axis=1)
+        best_distances = per_person[np.arange(len(queries)), best]
+        if per_person.shape[1] > 1:
+            runner_up = np.partition(per_person, 1, axis=1)[:, 1]
+            margins = runner_up - best_distances
+        else:
+            margins = np.full(len(queries), np.inf)
+        return best, best_distances, margins
+
+    def _match_approximate(self, queries):
+        """IVF indeksi qaytargan nomzodlar ichida taqqoslash"""
+        best, best_distances, margins = [], [], []
+        for query, distances, rows in zip(queries, *self.index.search(queries, self.ann_candidates)):
+            if not len(rows):
+                # Ko'rilgan klasterlarda nomzod yo'q: shu so'rov to'liq qidiriladi
+                exact = self._match_exact(query[None])
+                best.append(exact[0][0])
+                best_distances.append(exact[1][0])
+                margins.append(exact[2][0])
+                continue
+            person_ids, person_distances = self._reduce_candidates(distances, rows)
+            order = np.argsort(person_distances)
+            best.append(person_ids[order[0]])
+            best_distances.append(person_distances[order[0]])
+            margins.append(person_distances[order[1]] - person_distances[order[0]]
+                           if len(order) > 1 else np.inf)
+        return self._to_matches(best, best_distances, margins)
+
+    def _to_matches(self, best, best_distances, margins):
+        matches = []
+        for idx, distance, margin in zip(best, best_distances, margins):
+            name = str(self.names[idx]) if 1.0 - distance > self.min_probability else None
+            matches.append(FaceMatch(name, float(distance), float(margin)))
+        return matches
+
+
+class EmbeddingCache:
+    """Bazaning taqqoslashga tayyor vektorlari uchun kompyuter bo'yicha umumiy kesh.
+
+    publish() FaceMatcher uchun tayyorlangan qatorlarni (normallashtirilgan
+    matritsa, ism indekslari, ismlar) baza papkasidagi embedding_cache/
+    <versiya>/ ga .npy fayllar sifatida bir marta yozadi. attach() ularni
+    np.load(mmap_mode="r") bilan ochadi: barcha sessiyalar va jarayon
+    ishchilari bir xil sahifalarni nusxasiz o'qiydi. Versiya - tarkib
+    xeshi; yangi versiya vaqtinchalik papkada to'liq yozilgach CURRENT
+    fayli os.replace bilan almashtiriladi, shuning uchun o'quvchilar
+    yarim yozilgan keshni ko'rmaydi. poll() yangi versiyani check_interval
+    soniyada bir martadan ko'p tekshirmaydi.
+    """
+
+    DIRECTORY = "embedding_cache"
+    CURRENT_FILE = "CURRENT"
+    # Boshqa jarayonlar hali ulanib turgan bo'lishi mumkin: eng yangi versiyalar o'chirilmaydi
+    KEEP_VERSIONS = 2
+
+    def __init__(self, db_path, check_interval=1.0):
+        self.root = os.path.join(db_path, self.DIRECTORY)
+        self.check_interval = check_interval
+        self.version = None
+        self.last_check = float("-inf")
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(embeddings, labels):
+        """Vektorlar va ismlar tarkibidan versiya nomi"""
+        digest = hashlib.sha1(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        digest.update("\n".join(str(label) for label in labels).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, self.CURRENT_FILE), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write_array(directory, filename, array):
+        with open(os.path.join(directory, filename), 'wb') as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def publish(self, embeddings, labels):
+        """Vektorlarni yangi versiya sifatida e'lon qilish (o'zgarmagan bo'lsa hech narsa
+        yozilmaydi); versiya nomini qaytaradi"""
+        version = self.fingerprint(embeddings, labels)
+        if self.current_version() == version:
+            return version
+        target = os.path.join(self.root, version)
+        if not os.path.isdir(target):
+            os.makedirs(self.root, exist_ok=True)
+            temp_dir = tempfile.mkdtemp(prefix=f".{version}-", dir=self.root)
+            names, label_ids, matrix = prepare_match_rows(
+                np.asarray(embeddings, dtype=np.float32).reshape(-1, ARCFACE_EMBEDDING_DIM), labels)
+            self._write_array(temp_dir, "names.npy", names)
+            self._write_array(temp_dir, "label_ids.npy", label_ids.astype(np.int32))
+            self._write_array(temp_dir, "matrix.npy", matrix.astype(np.float32, copy=False))
+            try:
+                os.replace(temp_dir, target)
+            except OSError:
+                # Xuddi shu versiyani boshqa jarayon allaqachon e'lon qilgan
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                if not os.path.isdir(target):
+                    raise
+        pointer = os.path.join(self.root, f".{self.CURRENT_FILE}-{os.getpid()}")
+        with open(pointer, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, os.path.join(self.root, self.CURRENT_FILE))
+        self._remove_old_versions(version)
+        return version
+
+    def _remove_old_versions(self, current):
+        versions = sorted((entry for entry in os.scandir(self.root)
+                           if entry.is_dir() and not entry.name.startswith(".") and entry.name != current),
+                          key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in versions[self.KEEP_VERSIONS - 1:]:
+            # Windows'da ochiq akslantirilgan faylni o'chirib bo'lmaydi - keyingi safar o'chiriladi
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    @staticmethod
+    def _load(path):
+        try:
+            return np.asarray(np.load(path, mmap_mode="r"))
+        except ValueError:
+            # Bo'sh massivni xotiraga akslantirib bo'lmaydi
+            return np.load(path)
+
+    def attach(self):
+        """Joriy versiyani nusxasiz ulash: EmbeddingSnapshot yoki kesh bo'lmasa None"""
+        for _ in range(3):
+            version = self.current_version()
+            if version is None:
+                return None
+            path = os.path.join(self.root, version)
+            try:
+                snapshot = EmbeddingSnapshot(version, np.load(os.path.join(path, "names.npy")),
+                                             self._load(os.path.join(path, "label_ids.npy")),
+                                             self._load(os.path.join(path, "matrix.npy")))
+            except FileNotFoundError:
+                # Versiya o'qish paytida almashtirildi - yangisini olamiz
+                continue
+            self.version = version
+            self.last_check = tm.monotonic()
+            return snapshot
+        return None
+
+    def poll(self):
+        """Yangi versiya e'lon qilingan bo'lsa uni ulab qaytarish, aks holda None"""
+        with self.lock:
+            now = tm.monotonic()
+            if now - self.last_check < self.check_interval:
+                return None
+            self.last_check = now
+            if self.current_version() in (None, self.version):
+                return None
+            return self.attach()
+
+
+def publish_embedding_cache(db_path, store, settings):
+    """Vektorlar omborini umumiy keshga chiqarish (sozlamada o'chirilgan bo'lsa None)"""
+    if not settings.get("embedding_cache"):
+        return None
+    try:
+        return EmbeddingCache(db_path).publish(store.embeddings, store.labels)
+    except OSError as e:
+        print(f"Vektorlar keshini yozishda xato: {e}")
+        return None
+
+
+def build_face_matcher(db_path, store, settings):
+    """Matcher va (yangilanishlarni kuzatish uchun) EmbeddingCache; kesh
+    o'chirilgan yoki yozilmagan bo'lsa matcher ombordan quriladi va kesh None"""
+    if publish_embedding_cache(db_path, store, settings):
+        cache = EmbeddingCache(db_path)
+        snapshot = cache.attach()
+        if snapshot is not None:
+            return FaceMatcher.from_snapshot(snapshot, settings), cache
+    return FaceMatcher.from_store(store, settings), None
+
+
+# Jarayon ishchisining holati (har bir ishchi jarayonda bir marta to'ldiriladi)
+_worker_state = {}
+
+
+def _recognition_worker_init(db_path, settings, ready=None, failed=None):
+    """Jarayon ishchisi: ArcFace modeli va vektorlar bazasini bir marta yuklash va modelni isitish.
+
+    Yuklashda xato bo'lsa u failed hisoblagichida qayd etiladi: initializer
+    xato bilan tugasa Pool ishchini cheksiz qayta ishga tushiradi.
+    """
+    try:
+        _load_recognition_worker(db_path, settings)
+    except Exception as e:
+        print(f"Tanib olish jarayonini ishga tushirishda xato: {e}")
+        if failed is not None:
+            with failed.get_lock():
+                failed.value += 1
+        return
+    if ready is not None:
+        with ready.get_lock():
+            ready.value += 1
+
+
+def _load_recognition_worker(db_path, settings):
+    """Ishchi holatini to'ldirish: TensorFlow oqimlari, model, matcher va isitish"""
+    try:
+        threads = settings.get("process_worker_threads", 1)
+        tf = lazy_module("tensorflow")
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(threads)
+    except Exception as e:
+        print(f"TensorFlow oqimlarini sozlashda xato: {e}")
+    model = build_arcface_model()
+    _worker_state["embedder"] = FaceEmbedder(model, settings["max_batch_size"])
+    _worker_state["settings"] = settings
+    # Kesh bo'lsa ishchilar vektorlarni bazadan o'z nusxasiga yuklamaydi
+    cache = EmbeddingCache(db_path) if settings.get("embedding_cache") else None
+    snapshot = cache.attach() if cache else None
+    if snapshot is not None:
+        _worker_state["cache"] = cache
+        _worker_state["matcher"] = FaceMatcher.from_snapshot(snapshot, settings)
+    else:
+        _worker_state["matcher"] = FaceMatcher.from_store(EmbeddingStore(db_path).load(), settings)
+    _worker_state["segments"] = {}
+    try:
+        _worker_state["embedder"].warm_up()
+    except Exception as e:
+        print(f"Modelni isitishda xato: {e}")
+
+
+def _recognition_worker_match(segment_name, count):
+    """Umumiy xotiradagi count ta yuzni vektorga aylantirib taqqoslash"""
+    segments = _worker_state["segments"]
+    if segment_name not in segments:
+        segments[segment_name] = shared_memory.SharedMemory(name=segment_name)
+    faces = np.ndarray((count, ARCFACE_INPUT_SIZE[1], ARCFACE_INPUT_SIZE[0], 3),
+                       dtype=np.uint8, buffer=segments[segment_name].buf)
+    embeddings = _worker_state["embedder"].embed_resized(faces)
+    cache = _worker_state.get("cache")
+    snapshot = cache.poll() if cache else None
+    if snapshot is not None:
+        _worker_state["matcher"] = FaceMatcher.from_snapshot(snapshot, _worker_state["settings"])
+    # Jarayonlar orasida oddiy kortejlar uzatiladi
+    return [tuple(match) for match in _worker_state["matcher"].match(embeddings)]
+
+
+class ProcessRecognizer:
+    """Yuz vektorlash va taqqoslashni alohida jarayonlar pulida bajarish.
+
+    Har bir ishchi ArcFace modelini bir marta yuklaydi, vektorlar bazasiga
+    esa EmbeddingCache orqali nusxasiz ulanadi va yangi versiyaga o'zi
+    o'tadi (kesh o'chirilgan bo'lsa bazani o'zi yuklaydi). Yuzlar pickle qilinmaydi: ular oldindan ajratilgan umumiy xotira
+    bloklariga yoziladi va ishchiga faqat blok nomi yuboriladi.
+    """
+
+    def __init__(self, db_path, settings, workers):
+        self.workers = max(1, int(workers))
+        self.slot_faces = max(1, int(settings["max_batch_size"]))
+        context = multiprocessing.get_context("spawn")
+        # Modeli yuklanib isitilgan va yuklay olmagan ishchilar soni
+        self.ready = context.Value("i", 0)
+        self.failed = context.Value("i", 0)
+        self.timed_out = False
+        self.pool = context.Pool(self.workers, initializer=_recognition_worker_init,
+                                 initargs=(db_path, settings, self.ready, self.failed))
+        slot_bytes = self.slot_faces * ARCFACE_INPUT_SIZE[0] * ARCFACE_INPUT_SIZE[1] * 3
+        self.segments = [shared_memory.SharedMemory(create=True, size=slot_bytes)
+                         for _ in range(self.workers)]
+        self.free_segments = queue.Queue()
+        for segment in self.segments:
+            self.free_segments.put(segment)
+
+    @property
+    def broken(self):
+        """Kamida bitta ishchi modelni yoki bazani yuklay olmadi"""
+        return self.timed_out or self.failed.value > 0
+
+    def warm_up(self, timeout=300):
+        """Barcha ishchilar modelni yuklab isitguncha kutish; kutilgan soniyalarni qaytaradi.
+
+        Ishchi yuklashda xato qilsa yoki timeout o'tsa RuntimeError.
+        """
+        started = tm.perf_counter()
+        while (self.ready.value < self.workers and not self.broken
+               and tm.perf_counter() - started < timeout):
+            tm.sleep(0.05)
+        if self.broken:
+            raise RuntimeError("Tanib olish jarayonlari modelni yuklay olmadi")
+        if self.ready.value < self.workers:
+            self.timed_out = True
+            raise RuntimeError(f"Tanib olish jarayonlari {timeout} soniyada tayyor bo'lmadi")
+        return tm.perf_counter() - started
+
+    def match_faces(self, faces):
+        """Yuzlar ro'yxati uchun FaceMatch natijalari"""
+        if self.broken:
+            # Yuklanmagan ishchiga yuborilgan vazifa natija bermaydi
+            raise RuntimeError("Tanib olish jarayonlari ishlamayapti")
+        matches = []
+        for start in range(0, len(faces), self.slot_faces):
+            chunk = faces[start:start + self.slot_faces]
+            segment = self.free_segments.get()
+            try:
+                view = np.ndarray((len(chunk), ARCFACE_INPUT_SIZE[1], ARCFACE_INPUT_SIZE[0], 3),
+                                  dtype=np.uint8, buffer=segment.buf)
+                FaceEmbedder.resize_faces(chunk, out=view)
+                del view
+                result = self.pool.apply(_recognition_worker_match, (segment.name, len(chunk)))
+            finally:
+                self.free_segments.put(segment)
+            matches.extend(FaceMatch(*match) for match in result)
+        return matches
+
+    def close(self):
+        """Ishchi jarayonlarni to'xtatib, umumiy xotirani bo'shatish"""
+        self.pool.terminate()
+        self.pool.join()
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+
+
+def box_iou(a, b):
+    """Ikki (x, y, w, h) quti kesishmasining birlashmaga nisbati"""
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class Track:
+    """Kadrlar bo'ylab kuzatilayotgan bitta yuz"""
+
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.last_seen = now
+        self.missed = 0
+        self.name = None
+        self.votes = 0
+        self.confident = False
+        self.last_recognized = None
+        self.requested_at = None
+        self.annotation = None
+
+
+class FaceTracker:
+    """Mediapipe qutilarini IoU (yoki markazlar masofasi) bo'yicha kadrlar
+    orasida bog'lab, har bir yuzga barqaror kuzatuv raqami beradi.
+
+    Tanib olish faqat yangi kuzatuvlarda, hali ishonchli bo'lmagan
+    kuzatuvlarda yoki reverify_interval soniyada bir marta bajariladi.
+    Ism confirm_hits marta ketma-ket tasdiqlansa kuzatuv ishonchli bo'ladi.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=15, confirm_hits=2,
+                 retry_interval=0.5, reverify_interval=10.0, pending_timeout=2.0):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.confirm_hits = max(1, int(confirm_hits))
+        self.retry_interval = retry_interval
+        self.reverify_interval = reverify_interval
+        self.pending_timeout = pending_timeout
+        self.tracks = {}
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(iou_threshold=settings["track_iou_threshold"],
+                   max_missed=settings["track_max_missed"],
+                   confirm_hits=settings["track_confirm_hits"],
+                   retry_interval=settings["track_retry_interval"],
+                   reverify_interval=settings["track_reverify_interval"])
+
+    def update(self, boxes, now):
+        """Yangi kadr qutilarini kuzatuvlarga bog'lash; qutilar tartibida kuzatuvlar ro'yxati"""
+        with self.lock:
+            candidates = sorted(
+                ((box_iou(track.box, box), track_id, i)
+                 for track_id, track in self.tracks.items() for i, box in enumerate(boxes)),
+                reverse=True)
+            assigned = [None] * len(boxes)
+            used = set()
+            for iou, track_id, i in candidates:
+                if iou < self.iou_threshold:
+                    break
+                if assigned[i] is None and track_id not in used:
+                    assigned[i] = track_id
+                    used.add(track_id)
+
+            # IoU yetmagan qutilar uchun markazlar masofasi bo'yicha bog'lash
+            for i, box in enumerate(boxes):
+                if assigned[i] is not None:
+                    continue
+                cx, cy = box[0] + box[2] / 2, box[1] + box[3] / 2
+                best_id, best_dist = None, max(box[2], box[3]) * 0.5
+                for track_id, track in self.tracks.items():
+                    if track_id in used:
+                        continue
+                    tx, ty = track.box[0] + track.box[2] / 2, track.box[1] + track.box[3] / 2
+                    dist = ((cx - tx) ** 2 + (cy - ty) ** 2) ** 0.5
+                    if dist < best_dist:
+                        best_id, best_dist = track_id, dist
+                if best_id is not None:
+                    assigned[i] = best_id
+                    used.add(best_id)
+
+            result = []
+            for i, box in enumerate(boxes):
+                if assigned[i] is None:
+                    track = Track(self.next_id, box, now)
+                    self.tracks[track.track_id] = track
+                    self.next_id += 1
+                else:
+                    track = self.tracks[assigned[i]]
+                    track.box = box
+                    track.last_seen = now
+                    track.missed = 0
+                result.append(track)
+
+            seen = {track.track_id for track in result}
+            for track_id in list(self.tracks):
+                if track_id not in seen:
+                    track = self.tracks[track_id]
+                    track.missed += 1
+                    if track.missed > self.max_missed:
+                        del self.tracks[track_id]
+            return result
+
+    def needs_recognition(self, track, now):
+        """Kuzatuv uchun hozir tanib olish kerakmi"""
+        if track.requested_at is not None and now - track.requested_at < self.pending_timeout:
+            return False
+        if track.last_recognized is None:
+            return True
+        if not track.confident:
+            if track.name is None:
+                return now - track.last_recognized >= self.retry_interval
+            return True
+        return now - track.last_recognized >= self.reverify_interval
+
+    def mark_requested(self, track, now):
+        track.requested_at = now
+
+    def apply_result(self, track_id, match, annotation, now):
+        """Tanib olish natijasini kuzatuvga yozish"""
+        with self.lock:
+            track = self.tracks.get(track_id)
+            if track is None:
+                return
+            track.last_recognized = now
+            track.requested_at = None
+            if match is None or match.name is None:
+                if not track.confident:
+                    track.name, track.votes = None, 0
+                return
+            if match.name == track.name:
+                track.votes += 1
+            else:
+                track.name, track.votes, track.confident = match.name, 1, False
+            track.confident = track.votes >= self.confirm_hits
+            track.annotation = annotation
+
+    def annotations(self):
+        """Joriy kadrda ko'rinayotgan kuzatuvlar uchun (quti, matn, rang)"""
+        with self.lock:
+            return [(track.box, track.annotation[1], track.annotation[2])
+                    for track in self.tracks.values()
+                    if track.missed == 0 and track.annotation and track.name]
+
+
+class DropOldestQueue:
+    """Cheklangan navbat: to'lganda eng eski element tashlab yuboriladi.
+
+    Bir nechta navbatni bitta ishchi kutishi uchun umumiy condition berish mumkin.
+    lossless=True bo'lsa hech narsa tashlanmaydi: put joy bo'shaguncha kutadi
+    (video faylni to'liq qayta ishlash uchun).
+    """
+
+    def __init__(self, maxsize, condition=None, lossless=False):
+        self.maxsize = max(1, int(maxsize))
+        self.items = deque()
+        self.condition = condition or threading.Condition()
+        self.lossless = lossless
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.condition:
+            if self.lossless:
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.condition.wait()
+            elif len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            # Umumiy condition'ni yozuvchilar ham kutishi mumkin
+            if self.lossless:
+                self.condition.notify_all()
+            else:
+                self.condition.notify()
+
+    def get(self, timeout=None):
+        """Navbatdan element olish; vaqt tugasa yoki navbat yopilsa None"""
+        with self.condition:
+            if not self.items and not self.closed:
+                self.condition.wait(timeout)
+            return self._pop()
+
+    def get_nowait(self):
+        with self.condition:
+            return self._pop()
+
+    def _pop(self):
+        if not self.items:
+            return None
+        item = self.items.popleft()
+        if self.lossless:
+            self.condition.notify_all()
+        return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+# Bosqich kechikishlari gistogrammasi chegaralari (ms); oxirgi ustun - 1000 ms dan ko'p
+PROFILE_HISTOGRAM_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class StageStats:
+    """Oqim bosqichlari bo'yicha kechikish hisoblagichlari.
+
+    Persentillar va gistogramma oxirgi sample_size ta o'lchov bo'yicha
+    hisoblanadi (None - barcha o'lchovlar saqlanadi). count(name) bilan
+    aniqlangan yuzlar, tanib olishlar kabi oddiy hisoblagichlar yuritiladi.
+    """
+
+    def __init__(self, sample_size=1024):
+        self.lock = threading.Lock()
+        self.started = tm.perf_counter()
+        self.sample_size = sample_size
+        self.stages = {}
+        self.totals = {}
+
+    @contextmanager
+    def timer(self, stage):
+        """with stats.timer("bosqich"): ... blokining vaqtini yozish"""
+        started = tm.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, tm.perf_counter() - started)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0) + value
+
+    def counters(self):
+        with self.lock:
+            return dict(self.totals)
+
+    def record(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {"count": 0, "total": 0.0, "last": 0.0, "max": 0.0,
+                                              "samples": deque(maxlen=self.sample_size)}
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["last"] = seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["samples"].append(seconds)
+
+    def snapshot(self):
+        """Har bir bosqich uchun soni, FPS, o'rtacha/oxirgi/eng katta kechikish,
+        p50/p95/p99 (ms) va PROFILE_HISTOGRAM_MS bo'yicha gistogramma"""
+        elapsed = max(tm.perf_counter() - self.started, 1e-6)
+        with self.lock:
+            stages = {stage: (dict(entry), np.array(entry["samples"]))
+                      for stage, entry in self.stages.items()}
+        snapshot = {}
+        for stage, (entry, samples) in stages.items():
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+            bins = np.searchsorted(PROFILE_HISTOGRAM_MS, samples * 1000, side="right")
+            snapshot[stage] = {
+                "count": entry["count"],
+                "fps": entry["count"] / elapsed,
+                "avg_ms": entry["total"] / entry["count"] * 1000,
+                "last_ms": entry["last"] * 1000,
+                "max_ms": entry["max"] * 1000,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "histogram": np.bincount(bins, minlength=len(PROFILE_HISTOGRAM_MS) + 1).tolist(),
+            }
+        return snapshot
+
+
+class AdaptiveController:
+    """Yuklama ostida aniqlash chastotasi, aniqlash o'lchami va tanib olishni
+    moslashtiruvchi boshqaruvchi.
+
+    Kadr olingandan natijagacha bo'lgan kechikish (EWMA) target_latency dan
+    oshsa yoki tanib olish navbati to'lsa sifat bosqichma-bosqich
+    pasaytiriladi: avval aniqlash kadri kichraytiriladi, keyin aniqlash har
+    n-kadrda bajariladi. Navbat to'la va kechikish ikki baravar oshsa tanib
+    olish pause_seconds ga to'xtatiladi. Kechikish target_latency ning
+    yarmidan past va navbat bo'sh bo'lsa teskari tartibda tiklanadi.
+    Mediapipe nisbiy qutilar qaytargani uchun yuzlar baribir to'liq
+    o'lchamli kadrdan qirqiladi.
+    """
+
+    SCALES = (1.0, 0.75, 0.5, 0.35)
+
+    def __init__(self, target_latency=0.3, min_scale=0.5, max_detect_every=4,
+                 pause_seconds=1.0, adjust_interval=0.5, smoothing=0.2):
+        self.target_latency = target_latency
+        self.pause_seconds = pause_seconds
+        self.adjust_interval = adjust_interval
+        self.smoothing = smoothing
+        self.scales = [scale for scale in self.SCALES if scale >= min_scale] or [1.0]
+        self.max_level = len(self.scales) - 1 + max(1, int(max_detect_every)) - 1
+        self.level = 0
+        self.latency = 0.0
+        self.paused_until = 0.0
+        self.last_adjust = 0.0
+        self.frame_counter = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(target_latency=settings["adaptive_target_latency"],
+                   min_scale=settings["adaptive_min_scale"],
+                   max_detect_every=settings["adaptive_max_detect_every"],
+                   pause_seconds=settings["adaptive_pause_seconds"])
+
+    @property
+    def scale(self):
+        return self.scales[min(self.level, len(self.scales) - 1)]
+
+    @property
+    def detect_every(self):
+        return 1 + max(0, self.level - (len(self.scales) - 1))
+
+    def should_detect(self):
+        """Joriy kadrda aniqlash bajarilishi kerakmi (har detect_every-kadr)"""
+        self.frame_counter += 1
+        return self.frame_counter % self.detect_every == 0
+
+    def recognition_paused(self, now):
+        return now < self.paused_until
+
+    def observe(self, latency):
+        """Kadr olingandan bosqich tugagunicha o'tgan vaqtni (soniya) qo'shish"""
+        with self.lock:
+            self.latency += self.smoothing * (latency - self.latency)
+
+    def update(self, queue_fill, now):
+        """Navbat to'lganligi (0..1) va kechikish bo'yicha bosqichni o'zgartirish"""
+        with self.lock:
+            if now - self.last_adjust < self.adjust_interval:
+                return
+            self.last_adjust = now
+            if self.latency > self.target_latency or queue_fill >= 1.0:
+                self.level = min(self.level + 1, self.max_level)
+                if queue_fill >= 1.0 and self.latency > 2 * self.target_latency:
+                    self.paused_until = now + self.pause_seconds
+            elif self.latency < 0.5 * self.target_latency and queue_fill == 0:
+                self.level = max(self.level - 1, 0)
+
+    def state(self):
+        return {"scale": self.scale, "detect_every": self.detect_every,
+                "paused": self.recognition_paused(tm.monotonic()), "latency_ms": self.latency * 1000}
+
+
+class RecognitionService:
+    """Bir nechta kamera oqimi uchun umumiy tanib olish ishchilari.
+
+    Har bir oqim o'zining cheklangan navbatiga ega. Ishchilar navbatlarni
+    navbatma-navbat aylanib chiqib, turli kameralardan kelgan yuzlarni
+    max_batch_faces tagacha bitta paketga birlashtiradi va
+    recognize_batch([(frame, detections), ...]) ni bir marta chaqiradi.
+    Natijalar har bir oqimning handle_results metodiga qaytariladi.
+
+    grouped=True bo'lsa oqimlar guruhlarga (masalan, xonalar sessiyasi)
+    biriktiriladi va recognize_batch(items, groups) ko'rinishida har bir
+    element qaysi guruhdan kelgani bilan chaqiriladi. set_group_limit bilan
+    bitta guruh bitta paketga qo'shadigan yuzlar soni cheklanadi, shunda
+    gavjum xona boshqa xonalarni siqib chiqarmaydi.
+    """
+
+    def __init__(self, recognize_batch, workers=2, max_batch_faces=16, sample_size=1024, grouped=False):
+        self.recognize_batch = recognize_batch
+        self.workers = max(1, int(workers))
+        self.max_batch_faces = max(1, int(max_batch_faces))
+        self.grouped = grouped
+        self.condition = threading.Condition()
+        self.streams = []
+        self.group_limits = {}
+        self.next_stream = 0
+        self.stats = StageStats(sample_size)
+        self.batches = 0
+        self.faces = 0
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def register(self, pipeline, queue_size, lossless=False, group=None):
+        """Oqimni ro'yxatdan o'tkazib, unga tanib olish navbatini berish"""
+        stream_queue = DropOldestQueue(queue_size, condition=self.condition, lossless=lossless)
+        with self.condition:
+            self.streams.append((pipeline, stream_queue, group))
+        return stream_queue
+
+    def unregister(self, pipeline):
+        with self.condition:
+            self.streams = [stream for stream in self.streams if stream[0] is not pipeline]
+
+    def set_group_limit(self, group, max_faces):
+        """Guruhning bitta paketdagi yuzlari sonini cheklash (0 yoki None - cheklanmaydi)"""
+        with self.condition:
+            if max_faces:
+                self.group_limits[group] = int(max_faces)
+            else:
+                self.group_limits.pop(group, None)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"recognition-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+
+    def status(self):
+        """Tanib olish statistikasi va o'rtacha paket hajmi"""
+        return {
+            "stages": self.stats.snapshot(),
+            "batches": self.batches,
+            "faces": self.faces,
+            "avg_batch_faces": self.faces / self.batches if self.batches else 0.0,
+        }
+
+    def _take_jobs(self):
+        """Oqimlar navbatidan paket uchun ishlar yig'ish (condition ushlangan holda)"""
+        jobs, faces = [], 0
+        group_faces = {}
+        streams = self.streams
+        for offset in range(len(streams)):
+            pipeline, stream_queue, group = streams[(self.next_stream + offset) % len(streams)]
+            limit = self.group_limits.get(group)
+            while faces < self.max_batch_faces:
+                if limit is not None and group_faces.get(group, 0) >= limit:
+                    break
+                job = stream_queue.get_nowait()
+                if job is None:
+                    break
+                jobs.append((pipeline, job, group))
+                faces += len(job[3])
+                group_faces[group] = group_faces.get(group, 0) + len(job[3])
+        if streams:
+            self.next_stream = (self.next_stream + 1) % len(streams)
+        return jobs
+
+    def _worker_loop(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                jobs = self._take_jobs()
+                if not jobs:
+                    self.condition.wait(0.1)
+                    jobs = self._take_jobs()
+            if not jobs:
+                continue
+            started = tm.perf_counter()
+            items = [(job[2], job[3]) for _, job, _ in jobs]
+            try:
+                if self.grouped:
+                    batch_results = self.recognize_batch(items, [group for _, _, group in jobs])
+                else:
+                    batch_results = self.recognize_batch(items)
+            except Exception as e:
+                # Oqimlar kadrni yakunlangan deb hisoblashi uchun bo'sh natija qaytariladi
+                print(f"Tanib olish bosqichida xato: {e}")
+                batch_results = [[] for _ in jobs]
+            elapsed = tm.perf_counter() - started
+            self.stats.record("recognize", elapsed)
+            self.batches += 1
+            self.faces += sum(len(job[3]) for _, job, _ in jobs)
+            for (pipeline, job, _), results in zip(jobs, batch_results):
+                pipeline.handle_results(job, results, elapsed)
+
+
+class AttendancePipeline:
+    """Bitta kamera uchun kadr olish, aniqlash va ko'rsatish bosqichlaridan
+    iborat video oqimi.
+
+    Bosqichlar alohida oqimlarda ishlaydi va cheklangan navbatlar bilan
+    bog'langan: kamera oqimi doim eng yangi kadrni saqlaydi, sekin tanib
+    olish esa kadr olish va ko'rsatishni to'xtatib qo'ymaydi. Tanib olish
+    umumiy RecognitionService ishchilarida bajariladi, shuning uchun bir
+    nechta kamera bitta model va bitta bazadan foydalanadi.
+
+    on_results(results, captured_at) -> [(box, matn, rang) yoki None]
+    tanib olish ishchilarida chaqiriladi; on_frame(frame) ko'rsatish
+    oqimida chizilgan kadr bilan (display_fps dan tez emas, 0 - cheklanmaydi),
+    on_error(pipeline, xabar) esa kamera xatosida chaqiriladi.
+
+    tracker berilsa, aniqlash bosqichi faqat tanib olish kerak bo'lgan
+    kuzatuvlarni yuboradi; skip_recognition(name) True qaytargan ishonchli
+    kuzatuvlar (masalan, davomati yozilgan o'quvchilar) umuman tanib
+    olinmaydi.
+
+    quality_gate berilsa sifatsiz yuzlar tanib olishga yuborilmaydi va
+    rad etish sababi bo'yicha hisoblagichlar yuritiladi. controller
+    (AdaptiveController) berilsa yuklamaga qarab aniqlash chastotasi,
+    aniqlash o'lchami va tanib olish pauzasi tanlanadi.
+
+    replay=True rejimida (yozilgan video) navbatlar kadr tashlamaydi,
+    fayl tugashi xato hisoblanmaydi va barcha kadrlar qayta ishlangach
+    finished hodisasi o'rnatiladi. group - umumiy tanib olish xizmatidagi
+    guruh (grouped=True xizmatda oqim qaysi sessiyaga tegishli ekani).
+    """
+
+    def __init__(self, cap, face_detection, service, on_results, on_frame=None, on_error=None,
+                 queue_size=2, tracker=None, skip_recognition=None, name="", replay=False,
+                 quality_gate=None, controller=None, display_fps=0, group=None):
+        self.cap = cap
+        self.face_detection = face_detection
+        self.service = service
+        self.on_results = on_results
+        self.on_frame = on_frame
+        self.on_error = on_error
+        self.tracker = tracker
+        self.skip_recognition = skip_recognition
+        self.name = name
+        self.replay = replay
+        self.quality_gate = quality_gate
+        self.controller = controller
+        self.display_interval = 1.0 / display_fps if display_fps > 0 and not replay else 0.0
+
+        self.stats = StageStats(None if replay else 1024)
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()
+        self.detect_queue = DropOldestQueue(1, lossless=replay)
+        self.recognition_queue = service.register(self, queue_size, lossless=replay, group=group)
+        self.display_queue = DropOldestQueue(1, lossless=replay)
+        self.annotations = []
+        self.annotations_frame_id = -1
+        self.lock = threading.Lock()
+        self.threads = []
+        self.frames_total = None
+        self.frames_done = 0
+
+    @property
+    def running(self):
+        return not self.stop_event.is_set()
+
+    def start(self):
+        targets = [("capture", self._capture_loop), ("detect", self._detect_loop)]
+        if self.on_frame:
+            targets.append(("display", self._display_loop))
+        for stage, target in targets:
+            thread = threading.Thread(target=target, name=f"pipeline-{self.name}-{stage}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        """Barcha bosqichlarni to'xtatish va oqimlar tugashini kutish"""
+        self.stop_event.set()
+        self.finished.set()
+        self.service.unregister(self)
+        for stage_queue in (self.detect_queue, self.recognition_queue, self.display_queue):
+            stage_queue.close()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+
+    def status(self):
+        """Bosqichlar statistikasi, navbat chuqurligi va tashlangan kadrlar"""
+        return {
+            "stages": self.stats.snapshot(),
+            "counters": self.stats.counters(),
+            "adaptive": self.controller.state() if self.controller else None,
+            "queue_depth": {"detect": len(self.detect_queue),
+                            "recognize": len(self.recognition_queue),
+                            "display": len(self.display_queue)},
+            "dropped": {"detect": self.detect_queue.dropped,
+                        "recognize": self.recognition_queue.dropped,
+                        "display": self.display_queue.dropped},
+        }
+
+    def _frame_done(self, count=1):
+        """Replay rejimida to'liq qayta ishlangan kadrlarni sanash"""
+        if not self.replay:
+            return
+        with self.lock:
+            self.frames_done += count
+            done = self.frames_total is not None and self.frames_done >= self.frames_total
+        if done:
+            self.finished.set()
+
+    def _fail(self, message):
+        if not self.stop_event.is_set() and self.on_error:
+            self.on_error(self, message)
+        self.stop()
+
+    def _capture_loop(self):
+        frame_id = 0
+        last_display = float("-inf")
+        while not self.stop_event.is_set():
+            if not self.cap or not self.cap.isOpened():
+                self._fail("Kamera uzildi!")
+                break
+            started = tm.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                if self.replay:
+                    # Video tugadi: qolgan kadrlar qayta ishlangach finished o'rnatiladi
+                    with self.lock:
+                        self.frames_total = frame_id
+                    self._frame_done(0)
+                    break
+                self._fail("Kamera o'qishda xato!")
+                break
+            self.stats.record("capture", tm.perf_counter() - started)
+            item = (frame_id, datetime.now(), frame)
+            self.detect_queue.put(item)
+            # Ko'rsatish tezligi kamera tezligiga bog'liq emas: ortiqcha kadrlar chizilmaydi
+            if self.on_frame and started - last_display >= self.display_interval:
+                last_display = started
+                self.display_queue.put(item)
+            frame_id += 1
+
+    def _detect_loop(self):
+        controller = self.controller
+        while not self.stop_event.is_set():
+            item = self.detect_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            frame_id, captured_at, frame = item
+            if controller and not controller.should_detect():
+                self.stats.count("skipped_detections")
+                continue
+            started = tm.perf_counter()
+            detect_input = frame
+            if controller and controller.scale < 1.0:
+                # Nisbiy qutilar to'liq o'lchamli kadrga to'g'ridan-to'g'ri qo'llanadi
+                detect_input = cv2.resize(frame, None, fx=controller.scale, fy=controller.scale,
+                                          interpolation=cv2.INTER_AREA)
+            results = self.face_detection.process(cv2.cvtColor(detect_input, cv2.COLOR_BGR2RGB))
+            self.stats.record("detect", tm.perf_counter() - started)
+            detections = results.detections or []
+            self.stats.count("processed_frames")
+            self.stats.count("detections", len(detections))
+            now = tm.monotonic()
+            paused = False
+            if controller:
+                controller.observe((datetime.now() - captured_at).total_seconds())
+                controller.update(len(self.recognition_queue) / self.recognition_queue.maxsize, now)
+                paused = controller.recognition_paused(now)
+            if self.tracker is None:
+                if self.quality_gate:
+                    detections = [d for d in detections if self._passes_quality(frame, d)]
+                if detections and paused:
+                    self.stats.count("paused_recognitions", len(detections))
+                    self._frame_done()
+                elif detections:
+                    self.stats.count("recognition_requests", len(detections))
+                    self.recognition_queue.put((frame_id, captured_at, frame, detections, None))
+                else:
+                    self._publish(frame_id, [])
+                    self._frame_done()
+                continue
+
+            h, w = frame.shape[:2]
+            tracks = self.tracker.update([detection_box(d, w, h) for d in detections], now)
+            pending = [(track, detection) for track, detection in zip(tracks, detections)
+                       if self.tracker.needs_recognition(track, now)
+                       and not (track.confident and self.skip_recognition
+                                and self.skip_recognition(track.name))]
+            # Kuzatuvdagi natijasi qayta ishlatilgan yuzlar - tanib olish keshidan foydalanish
+            self.stats.count("track_hits", len(detections) - len(pending))
+            if pending and paused:
+                # Kuzatuvlar saqlanadi, tanib olish yuklama kamaygach davom etadi
+                self.stats.count("paused_recognitions", len(pending))
+                pending = []
+            if self.quality_gate:
+                # Rad etilgan kuzatuv keyingi kadrlarda yana tekshiriladi
+                pending = [(track, d) for track, d in pending if self._passes_quality(frame, d)]
+            if pending:
+                self.stats.count("recognition_requests", len(pending))
+                for track, _ in pending:
+                    self.tracker.mark_requested(track, now)
+                self.recognition_queue.put((frame_id, captured_at, frame,
+                                            [d for _, d in pending], [t.track_id for t, _ in pending]))
+            else:
+                self._frame_done()
+            self._publish(frame_id, self.tracker.annotations())
+
+    def _passes_quality(self, frame, detection):
+        rule = self.quality_gate.check(frame, detection)
+        if rule is None:
+            return True
+        self.stats.count(f"rejected_{rule}")
+        return False
+
+    def handle_results(self, job, results, elapsed):
+        """Umumiy ishchidan qaytgan tanib olish natijalarini qayta ishlash"""
+        try:
+            self._handle_results(job, results, elapsed)
+        finally:
+            self._frame_done()
+
+    def _handle_results(self, job, results, elapsed):
+        frame_id, captured_at, _, _, track_ids = job
+        try:
+            annotations = self.on_results(results, captured_at)
+        except Exception as e:
+            print(f"Tanib olish natijalarini yozishda xato: {e}")
+            return
+        self.stats.record("recognize", elapsed)
+        # Kadr olingandan davomatga yozilgunicha o'tgan umumiy vaqt
+        latency = (datetime.now() - captured_at).total_seconds()
+        self.stats.record("latency", latency)
+        if self.controller:
+            self.controller.observe(latency)
+        if track_ids is None:
+            self._publish(frame_id, [a for a in annotations if a])
+            return
+        now = tm.monotonic()
+        for track_id, (_, match), annotation in zip(track_ids, results, annotations):
+            self.tracker.apply_result(track_id, match, annotation, now)
+
+    def _publish(self, frame_id, annotations):
+        with self.lock:
+            if frame_id > self.annotations_frame_id:
+                self.annotations = annotations
+                self.annotations_frame_id = frame_id
+
+    def _display_loop(self):
+        while not self.stop_event.is_set():
+            item = self.display_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            started = tm.perf_counter()
+            # Kadr boshqa bosqichlarda ham o'qilayotgani uchun nusxasiga chizamiz
+            frame = item[2].copy()
+            with self.lock:
+                annotations = list(self.annotations)
+            for (x, y, width, height), text, color in annotations:
+                cv2.rectangle(frame, (x, y), (x + width, y + height), color, 2)
+                cv2.putText(frame, text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+            self.on_frame(frame)
+            self.stats.record("display", tm.perf_counter() - started)
+
+
+def format_pipeline_status(status):
+    """Kamera oqimi statistikasini bir qatorli matnga aylantirish"""
+    stages = status["stages"]
+    parts = []
+    if "capture" in stages:
+        parts.append(f"Kamera: {stages['capture']['fps']:.1f} FPS")
+    if "detect" in stages:
+        parts.append(f"Aniqlash: {stages['detect']['avg_ms']:.0f} ms")
+    if "recognize" in stages:
+        parts.append(f"Tanib olish: {stages['recognize']['fps']:.1f} FPS")
+    if "display" in stages:
+        parts.append(f"Ekran: {stages['display']['fps']:.1f} FPS")
+    parts.append(f"Navbat: {status['queue_depth']['recognize']}")
+    adaptive = status.get("adaptive")
+    if adaptive and (adaptive["scale"] < 1.0 or adaptive["detect_every"] > 1 or adaptive["paused"]):
+        parts.append(f"Moslashuv: x{adaptive['scale']:.2f}, har {adaptive['detect_every']}-kadr"
+                     + (", tanib olish pauzada" if adaptive["paused"] else ""))
+    rejected = sum(value for name, value in status["counters"].items() if name.startswith("rejected_"))
+    if rejected:
+        parts.append(f"Sifatsiz yuzlar: {rejected}")
+    parts.append(f"Tashlangan kadrlar: {sum(status['dropped'].values())}")
+    return " | ".join(parts)
+
+
+def format_service_status(status):
+    """Umumiy tanib olish ishchilari statistikasini matnga aylantirish"""
+    recognize = status["stages"].get("recognize")
+    if not recognize:
+        return "Tanib olish: -"
+    return (f"Tanib olish: {recognize['avg_ms']:.0f} ms/paket, {recognize['fps']:.1f} paket/s, "
+            f"o'rtacha {status['avg_batch_faces']:.1f} yuz/paket")
+
+
+def format_profile(profile):
+    """Sessiya profilini unumdorlik paneli uchun jadval matniga aylantirish"""
+    lines = ["Bosqich".ljust(28) + "soni".rjust(7) + "o'rt ms".rjust(9)
+             + "p50".rjust(8) + "p95".rjust(8) + "p99".rjust(8)]
+    for scope, entry in profile["scopes"].items():
+        for stage, stats in entry["stages"].items():
+            lines.append(f"{(scope + ':' + stage)[:28]:<28}{stats['count']:>7}{stats['avg_ms']:>9.1f}"
+                         f"{stats['p50_ms']:>8.1f}{stats['p95_ms']:>8.1f}{stats['p99_ms']:>8.1f}")
+        if entry["counters"]:
+            counters = ", ".join(f"{name}={value:.1f}" if isinstance(value, float) else f"{name}={value}"
+                                 for name, value in entry["counters"].items())
+            lines.append(f"  {scope}: {counters}")
+    return "\n".join(lines)
+
+
+def write_profile(profile, base_filename):
+    """Sessiya profilini base_filename_profile.json va .csv fayllariga yozish.
+
+    CSV'da bosqich qatorlari uchun value ustuni FPS, hisoblagichlar uchun qiymatning o'zi.
+    """
+    json_path = f"{base_filename}_profile.json"
+    csv_path = f"{base_filename}_profile.csv"
+    with open(json_path, 'w') as f:
+        json.dump(dict(profile, histogram_edges_ms=list(PROFILE_HISTOGRAM_MS)), f, indent=4, default=float)
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["scope", "kind", "name", "count", "value", "avg_ms", "p50_ms", "p95_ms",
+                         "p99_ms", "max_ms"])
+        for scope, entry in profile["scopes"].items():
+            for stage, stats in entry["stages"].items():
+                writer.writerow([scope, "stage", stage, stats["count"], f"{stats['fps']:.3f}",
+                                 *(f"{stats[key]:.3f}" for key in ("avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"))])
+            for name, value in entry["counters"].items():
+                writer.writerow([scope, "counter", name, "", value, "", "", "", "", ""])
+    return json_path, csv_path
+
+
+def synthetic_embeddings(identities, images_per_person=4, dim=ARCFACE_EMBEDDING_DIM, noise=0.8, seed=0):
+    """Benchmark uchun sun'iy vektorlar bazasi (har bir o'quvchi atrofida shovqinli suratlar)"""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((identities, dim)))
+    labels = np.repeat(np.array([f"person_{i}" for i in range(identities)]), images_per_person)
+    jitter = rng.standard_normal((identities * images_per_person, dim)) * noise / np.sqrt(dim)
+    embeddings = normalize_rows(np.repeat(centers, images_per_person, axis=0) + jitter)
+    return embeddings, labels
+
+
+class SyntheticVideo:
+    """cv2.VideoCapture o'rnida ishlatiladigan sun'iy video: fon ustida
+    siljiydigan bazadagi yuz suratlari (benchmark uchun).
+
+    Video bo'laklarga bo'linadi; har bir bo'lakda keyingi faces_per_frame
+    ta o'quvchi yangi joydan harakatlanadi, shuning uchun butun video
+    davomida barcha suratlar ko'rinadi.
+    """
+
+    def __init__(self, face_images, frames=300, size=(640, 480), faces_per_frame=3, seed=0):
+        self.frames = int(frames)
+        self.width, self.height = size
+        self.faces_per_frame = max(1, int(faces_per_frame))
+        self.position = 0
+        face_height = self.height // 3
+        self.faces = []
+        for image in face_images:
+            if image is None or image.size == 0:
+                continue
+            scale = face_height / image.shape[0]
+            width = min(max(1, int(image.shape[1] * scale)), self.width // self.faces_per_frame)
+            self.faces.append(cv2.resize(image, (width, face_height)))
+        segments = max(1, -(-len(self.faces) // self.faces_per_frame))
+        self.segment_length = max(1, -(-self.frames // segments))
+        rng = np.random.default_rng(seed)
+        self.paths = rng.uniform(-1, 1, (segments, self.faces_per_frame, 2, 2))
+        self.background = rng.integers(60, 200, (self.height, self.width, 3), dtype=np.uint8)
+
+    def __str__(self):
+        return f"synthetic({self.frames} kadr)"
+
+    def isOpened(self):
+        return bool(self.faces)
+
+    def set(self, *args):
+        return True
+
+    def release(self):
+        self.position = self.frames
+
+    def read(self):
+        if self.position >= self.frames:
+            return False, None
+        frame = self.background.copy()
+        segment, step = divmod(self.position, self.segment_length)
+        t = step / self.segment_length
+        for i in range(self.faces_per_frame):
+            face = self.faces[(segment * self.faces_per_frame + i) % len(self.faces)]
+            start, velocity = self.paths[segment, i]
+            h, w = face.shape[:2]
+            # Yuz kadr chegarasidan qaytib harakatlanadi
+            x, y = np.abs(((start + velocity * t) % 2.0) - 1.0) * [self.width - w, self.height - h]
+            frame[int(y):int(y) + h, int(x):int(x) + w] = face
+        self.position += 1
+        return True, frame
+
+
+def benchmark_ann(embeddings, labels, nprobe_values=(1, 2, 4, 8, 16, 32), nlist=0,
+                  queries=1000, noise=0.8, seed=1):
+    """IVF qidiruvining exact qidiruvga nisbatan recall@1 va kechikishini o'lchash"""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(embeddings), min(queries, len(embeddings)), replace=False)
+    jitter = rng.standard_normal((len(picks), embeddings.shape[1])) * noise / np.sqrt(embeddings.shape[1])
+    query_vectors = normalize_rows(embeddings[picks] + jitter)
+
+    exact = FaceMatcher(embeddings, labels, min_probability=-1.0)
+    started = tm.perf_counter()
+    exact_names = [m.name for m in exact.match(query_vectors)]
+    exact_ms = (tm.perf_counter() - started) * 1000 / len(query_vectors)
+
+    results = [{"backend": "exact", "nprobe": None, "recall@1": 1.0, "ms_per_query": exact_ms}]
+    ann = FaceMatcher(embeddings, labels, min_probability=-1.0, index_backend="ivf", ivf_nlist=nlist)
+    for nprobe in nprobe_values:
+        ann.index.nprobe = max(1, min(nprobe, ann.index.nlist))
+        started = tm.perf_counter()
+        ann_names = [m.name for m in ann.match(query_vectors)]
+        elapsed_ms = (tm.perf_counter() - started) * 1000 / len(query_vectors)
+        recall = float(np.mean([a == e for a, e in zip(ann_names, exact_names)]))
+        results.append({"backend": f"ivf(nlist={ann.index.nlist})", "nprobe": ann.index.nprobe,
+                        "recall@1": recall, "ms_per_query": elapsed_ms})
+    return results
+
+
+def read_recognition_settings(path):
+    """Tanib olish sozlamalarini JSON fayldan o'qish (yo'q kalitlar standart qiymatda qoladi)"""
+    settings = dict(DEFAULT_RECOGNITION_SETTINGS)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                settings.update(json.load(f))
+        except Exception as e:
+            print(f"Tanib olish sozlamalarini o'qishda xato: {e}")
+    return settings
+
+
+def create_face_detector():
+    """Mediapipe yuz aniqlagichini yaratish (har bir kamera oqimi uchun alohida)"""
+    return lazy_module("mediapipe").solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
+
+
+def parse_camera_source(text):
+    """Kamera indeksi yoki IP kamera URL manzilini ajratish"""
+    text = str(text).strip()
+    return int(text) if text.isdigit() else text
+
+
+def load_database_metadata(db_path):
+    """Baza o'quvchilari {kalit: ma'lumot}; eski metadata.json birinchi ochilishda
+    students.db ga ko'chiriladi"""
+    if not StudentDatabase.exists(db_path) and not os.path.exists(os.path.join(db_path, "metadata.json")):
+        raise FileNotFoundError(f"Baza topilmadi: {db_path}")
+    with closing(StudentDatabase.open(db_path)) as db:
+        return db.students()
+
+
+def record_attendance_history(db_path, filename, attendance, date):
+    """Sessiya natijasini baza davomat tarixiga yozish (sessiya nomi - Excel fayl nomi)"""
+    if not StudentDatabase.exists(db_path):
+        return 0
+    session = os.path.splitext(os.path.basename(filename))[0]
+    with closing(StudentDatabase(db_path)) as db:
+        return db.record_session(session, attendance, date)
+
+
+def prepare_embedding_store(db_path, database, face_detection, embedder):
+    """Baza vektorlarini yuklash, o'zgargan suratlarni qayta indekslash"""
+    store = EmbeddingStore(db_path)
+    if store.exists():
+        store.load()
+    changed = store.reindex_changed(database, face_detection, embedder)
+    if changed:
+        print(f"Vektorlari yangilangan o'quvchilar: {', '.join(changed)}")
+    return store
+
+
+# Ommaviy importda rad etilgan surat sabablari
+IMPORT_REJECT_REASONS = {
+    "unreadable": "surat o'qilmadi",
+    "no_face": "yuz topilmadi",
+    "multiple_faces": "bir nechta yuz",
+    "size": "yuz juda kichik",
+    "score": "aniqlash ishonchi past",
+    "yaw": "yuz yon tomonga burilgan",
+    "sharpness": "surat xira",
+}
+IMPORT_CSV_FIELDS = ("name", "surname", "father_name", "faculty", "direction", "group", "images")
+IMPORT_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def read_import_csv(path):
+    """Import CSV: name, surname, father_name, faculty, direction, group, images
+    ustunlari; images - ";" bilan ajratilgan surat yo'llari (CSV papkasiga nisbatan)"""
+    base = os.path.dirname(os.path.abspath(path))
+    students = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = [field for field in IMPORT_CSV_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"CSV faylda ustunlar yo'q: {', '.join(missing)}")
+        for row in reader:
+            student = {field: (row[field] or "").strip() for field in IMPORT_CSV_FIELDS[:-1]}
+            student["images"] = [os.path.join(base, image.strip())
+                                 for image in (row["images"] or "").split(";") if image.strip()]
+            students.append(student)
+    return students
+
+
+def read_import_tree(root, faculty="", direction=""):
+    """Import papkasi: <guruh>/<Ism_Familiya[_Otasining ismi]>/suratlar"""
+    students = []
+    for group in sorted(os.listdir(root)):
+        group_path = os.path.join(root, group)
+        if not os.path.isdir(group_path):
+            continue
+        for folder in sorted(os.listdir(group_path)):
+            folder_path = os.path.join(group_path, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            parts = folder.split("_", 2) + ["", ""]
+            students.append({
+                "name": parts[0], "surname": parts[1], "father_name": parts[2].replace("_", " "),
+                "faculty": faculty, "direction": direction, "group": group,
+                "images": [os.path.join(folder_path, image) for image in sorted(os.listdir(folder_path))
+                           if image.lower().endswith(IMPORT_IMAGE_EXTENSIONS)],
+            })
+    return students
+
+
+_import_local = threading.local()
+
+
+def _prepare_import_image(image_path, quality_gate):
+    """Ishchi oqimda: suratni o'qish, yagona yuzni topish va tekislash.
+
+    (yuz, None) yoki (None, rad etish sababi) qaytaradi. Mediapipe
+    oqimlar orasida bo'lishib ishlatilmagani uchun har oqimda alohida detektor.
+    """
+    if not hasattr(_import_local, "face_detection"):
+        _import_local.face_detection = create_face_detector()
+    img = cv2.imread(image_path)
+    if img is None:
+        return None, "unreadable"
+    results = _import_local.face_detection.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    detections = results.detections or []
+    if not detections:
+        return None, "no_face"
+    if len(detections) > 1:
+        return None, "multiple_faces"
+    if quality_gate:
+        rule = quality_gate.check(img, detections[0])
+        if rule:
+            return None, rule
+    face = align_face(img, detections[0])
+    if face.size == 0:
+        return None, "no_face"
+    return face, None
+
+
+def bulk_import(db_path, students, embedder, workers=4, min_images=4, quality_gate=None, progress=None,
+                batch_faces=256):
+    """O'quvchilarni ommaviy ro'yxatga olish.
+
+    Suratlar ishchilar hovuzida o'qiladi va yuzi aniqlanadi. Yaroqli yuzlar
+    bir necha o'quvchidan yig'ilib, kamida batch_faces tadan bitta
+    embedder.embed chaqiruvida vektorlanadi. Kamida min_images ta
+    yaroqli surati bor o'quvchi suratlari baza papkasiga ko'chiriladi va
+    o'quvchi, suratlar hamda vektorlar bitta tranzaksiyada yoziladi.
+    Bazada allaqachon bor o'quvchilar o'tkazib yuboriladi.
+    progress(qayta ishlangan suratlar, jami suratlar, soniyalar) har bir
+    o'quvchidan keyin chaqiriladi. Hisobot lug'atini qaytaradi.
+    """
+    started = tm.perf_counter()
+    report = {"imported": [], "skipped": [], "rejected_students": {}, "rejected_images": [],
+              "images": 0, "seconds": 0.0}
+    os.makedirs(db_path, exist_ok=True)
+    with closing(StudentDatabase.open(db_path)) as db:
+        enrolled = db.students()
+        pending, seen = [], set()
+        for student in students:
+            identity = (student["name"], student["surname"], student["father_name"], student["group"])
+            key = db.student_key(*identity)
+            if key in enrolled or identity in seen:
+                report["skipped"].append(key)
+            else:
+                seen.add(identity)
+                pending.append(student)
+        total = sum(len(student["images"]) for student in pending)
+        done = 0
+        batch = []
+
+        def enrol_batch():
+            faces = [face for _, accepted in batch for _, face in accepted]
+            embeddings = embedder.embed(faces)
+            offset = 0
+            for student, accepted in batch:
+                key = _enrol_imported_student(db, student, accepted, embeddings[offset:offset + len(accepted)])
+                offset += len(accepted)
+                report["imported"].append(key)
+                report["images"] += len(accepted)
+            batch.clear()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [[pool.submit(_prepare_import_image, image_path, quality_gate)
+                        for image_path in student["images"]] for student in pending]
+            for student, student_futures in zip(pending, futures):
+                accepted = []
+                for image_path, future in zip(student["images"], student_futures):
+                    try:
+                        face, reason = future.result()
+                    except Exception as e:
+                        face, reason = None, str(e)
+                    if face is None:
+                        report["rejected_images"].append((image_path, IMPORT_REJECT_REASONS.get(reason, reason)))
+                    else:
+                        accepted.append((image_path, face))
+                done += len(student_futures)
+                label = f"{student['name']} {student['surname']}"
+                if len(accepted) < min_images:
+                    report["rejected_students"][label] = (
+                        f"yaroqli suratlar {len(accepted)} ta, kamida {min_images} ta kerak")
+                else:
+                    batch.append((student, accepted))
+                    if sum(len(faces) for _, faces in batch) >= batch_faces:
+                        enrol_batch()
+                if progress:
+                    progress(done, total, tm.perf_counter() - started)
+        if batch:
+            enrol_batch()
+    report["seconds"] = tm.perf_counter() - started
+    return report
+
+
+def _enrol_imported_student(db, student, accepted, embeddings):
+    """Suratlarni o'quvchi papkasiga ko'chirib, o'quvchi va vektorlarini yozish"""
+    key = db.student_key(student["name"], student["surname"], student["father_name"], student["group"])
+    db_path = os.path.abspath(db.db_path)
+    folder = os.path.join(db_path, f"{student['name']}_{student['surname']}")
+    suffix = 2
+    while os.path.exists(folder):
+        folder = os.path.join(db_path, f"{student['name']}_{student['surname']}_{suffix}")
+        suffix += 1
+    os.makedirs(folder)
+    images = []
+    for i, ((image_path, _), embedding) in enumerate(zip(accepted, embeddings)):
+        new_path = os.path.join(folder, f"{student['name']}_{i}{os.path.splitext(image_path)[1].lower()}")
+        shutil.copyfile(image_path, new_path)
+        stat = os.stat(new_path)
+        images.append({"path": os.path.relpath(new_path, db.db_path), "sha1": file_sha1(new_path),
+                       "size": stat.st_size, "mtime": stat.st_mtime,
+                       "version": EmbeddingStore.VERSION, "embedding": embedding})
+    db.save_student(key, dict(student, image_folder=folder), images)
+    return key
+
+
+def warm_up_recognizer(embedder, process_recognizer=None):
+    """Tanib olishda ishlatiladigan modelni (jarayon ishchilari yoki shu jarayondagi) isitish"""
+    if process_recognizer:
+        try:
+            return process_recognizer.warm_up()
+        except RuntimeError as e:
+            print(f"{e}: shu jarayondagi model ishlatiladi")
+    if embedder is None:
+        return 0.0
+    return embedder.warm_up()
+
+
+def match_face_crops(faces, embedder, matcher, process_recognizer=None):
+    """Tekislangan yuzlarni vektorga aylantirib bazadagi o'quvchilar bilan taqqoslash"""
+    if process_recognizer and not process_recognizer.broken:
+        return process_recognizer.match_faces(faces)
+    if embedder is None or matcher is None:
+        return []
+    return matcher.match(embedder.embed(faces))
+
+
+class DistanceStats:
+    """O'quvchi masofalari uchun Welford usulidagi oqimli statistika.
+
+    O'rtacha va dispersiya (np.var kabi populyatsiya dispersiyasi) har bir
+    yangi masofada O(1) da yangilanadi, xotira ham o'zgarmaydi. recent_size
+    berilsa oxirgi masofalar halqa buferida saqlanadi.
+    """
+
+    def __init__(self, recent_size=0):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.recent = deque(maxlen=recent_size) if recent_size else None
+
+    def add(self, value):
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.recent is not None:
+            self.recent.append(value)
+
+    def restore(self, count, mean, m2):
+        """Saqlangan holatdan davom etish (oxirgi masofalar buferi tiklanmaydi)"""
+        self.count, self.mean, self.m2 = int(count), float(mean), float(m2)
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std_dev(self):
+        return float(np.sqrt(self.variance))
+
+
+def new_attendance_table(database, recent_size=0):
+    """Bazadagi har bir o'quvchi uchun bo'sh davomat yozuvi"""
+    return {
+        name: {
+            "name": data.get("name", name),
+            "surname": data["surname"],
+            "father_name": data["father_name"],
+            "faculty": data["faculty"],
+            "direction": data["direction"],
+            "group": data["group"],
+            "status": "Kelmagan",
+            "arrival_time": None,
+            "late_time": None,
+            "recorded": False,
+            "distances": DistanceStats(recent_size),
+            "probability": 0.0,
+            "mean_distance": 0.0,
+            "variance": 0.0,
+            "std_dev": 0.0
+        }
+        for name, data in database.items()
+    }
+
+
+def attendance_filename(directory=""):
+    """Davomat Excel fayli uchun vaqt belgili nom"""
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    return os.path.join(directory, f"attendance_{timestamp}.xlsx")
+
+
+def write_attendance_excel(attendance, filename):
+    """Davomat jadvalini Excel faylga yozish"""
+    df = pd.DataFrame([
+        {
+            "Ism": data.get("name", name),
+            "Familiya": data["surname"],
+            "Otasining ismi": data["father_name"],
+            "Fakultet": data["faculty"],
+            "Yo'nalish": data["direction"],
+            "Guruh": data["group"],
+            "Holati": data["status"],
+            "Kelgan vaqti": data["arrival_time"],
+            "Kech qolgan vaqti": data["late_time"],
+            "Ehtimollik": f"{data['probability']:.2%}" if data["probability"] > 0 else None,
+            "O'rtacha masofa": f"{data['mean_distance']:.4f}" if data["mean_distance"] > 0 else None,
+            "Dispersiya": f"{data['variance']:.4f}" if data["variance"] > 0 else None,
+            "Kvadrat chetlanish": f"{data['std_dev']:.4f}" if data["std_dev"] > 0 else None
+        }
+        for name, data in attendance.items()
+    ])
+    df.to_excel(filename, index=False)
+
+
+# Jurnalda saqlanadigan davomat yozuvi maydonlari
+JOURNAL_FIELDS = ("status", "arrival_time", "late_time", "probability", "mean_distance", "variance", "std_dev")
+JOURNAL_STATS_FIELDS = ("probability", "mean_distance", "variance", "std_dev")
+
+
+def journal_filename(filename):
+    """Davomat Excel fayli nomiga mos jurnal fayli nomi"""
+    return os.path.splitext(filename)[0] + ".jsonl"
+
+
+class AttendanceJournal:
+    """Davomat holati o'zgarishlarining faqat qo'shib boriladigan JSON lines jurnali.
+
+    O'quvchi yozilgan zahoti bitta qator qo'shiladi va diskka majburan
+    yoziladi (fsync), shuning uchun jarayon to'satdan to'xtasa ham sessiya
+    jurnaldan tiklanadi. Qator turlari: start (baza papkasi, xona va muddatlar),
+    resume, mark, stats (sessiya oxiridagi statistika) va end. mark va stats
+    masofalar statistikasining holatini ham saqlaydi.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        broken_tail = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                broken_tail = f.read(1) != b"\n"
+        self.file = open(path, "a", encoding="utf-8")
+        if broken_tail:
+            # Uzilib qolgan oxirgi qator keyingi yozuv bilan qo'shilib ketmasligi uchun
+            self.file.write("\n")
+
+    @classmethod
+    def create(cls, path, db_path, late_deadline, deadline, room=""):
+        journal = cls(path)
+        record = {"event": "start", "db": os.path.abspath(db_path),
+                  "late_deadline": late_deadline.isoformat(), "deadline": deadline.isoformat()}
+        if room:
+            record["room"] = room
+        journal.append(record)
+        return journal
+
+    @classmethod
+    def resume(cls, path):
+        journal = cls(path)
+        journal.append({"event": "resume"})
+        return journal
+
+    def append(self, *records):
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            if self.file is None:
+                return
+            for record in records:
+                self.file.write(json.dumps(dict(record, time=timestamp), ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    @staticmethod
+    def _record(event, name, person, fields):
+        record = {"event": event, "name": name}
+        for key in fields:
+            value = person[key]
+            record[key] = float(value) if isinstance(value, (float, np.floating)) else value
+        distances = person["distances"]
+        # Tiklangan sessiyada o'rtacha va dispersiya shu holatdan davom etadi
+        record["distance_stats"] = [distances.count, distances.mean, distances.m2]
+        return record
+
+    def mark(self, name, person):
+        """O'quvchi birinchi marta yozilganini qayd etish"""
+        self.append(self._record("mark", name, person, JOURNAL_FIELDS))
+
+    def finish(self, attendance):
+        """Yakuniy statistikani yozib jurnalni yopish"""
+        self.append(*[self._record("stats", name, person, JOURNAL_STATS_FIELDS)
+                      for name, person in attendance.items() if person["recorded"]],
+                    {"event": "end"})
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_journal(path):
+    """Jurnalni o'qish: (start yozuvi, barcha yozuvlar, yakunlanganmi).
+
+    Oxirgi qator yozilayotganda jarayon to'xtagan bo'lsa, u tashlab ketiladi.
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    start = next((record for record in records if record.get("event") == "start"), None)
+    finished = any(record.get("event") == "end" for record in records)
+    return start, records, finished
+
+
+def apply_journal(attendance, records):
+    """Jurnal yozuvlarini davomat jadvaliga qo'llash (bazada yo'q ismlar o'tkazib yuboriladi)"""
+    for record in records:
+        person = attendance.get(record.get("name"))
+        if person is None:
+            continue
+        if record["event"] == "mark":
+            for key in JOURNAL_FIELDS:
+                person[key] = record[key]
+            person["recorded"] = True
+        elif record["event"] == "stats":
+            for key in JOURNAL_STATS_FIELDS:
+                person[key] = record[key]
+        else:
+            continue
+        if "distance_stats" in record:
+            person["distances"].restore(*record["distance_stats"])
+    return attendance
+
+
+def export_journal(path, database, filename=None):
+    """Jurnal bo'yicha davomat Excel faylini yaratish (standart nom jurnal nomiga mos)"""
+    filename = filename or os.path.splitext(path)[0] + ".xlsx"
+    _, records, _ = read_journal(path)
+    write_attendance_excel(apply_journal(new_attendance_table(database), records), filename)
+    return filename
+
+
+def find_unfinished_journals(db_path, directory="", room=""):
+    """db_path bazasi va room xonasi uchun yozilgan yakunlanmagan jurnallar:
+    [(yo'l, start yozuvi, yozuvlar)], eng yangisi birinchi. Boshqa baza yoki
+    xonaning jurnallariga tegilmaydi."""
+    directory = directory or "."
+    db_path = os.path.abspath(db_path)
+    unfinished = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not (name.startswith("attendance_") and name.endswith(".jsonl")):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            start, records, finished = read_journal(path)
+        except OSError:
+            continue
+        if (start is not None and not finished and start.get("db") == db_path
+                and start.get("room", "") == room):
+            unfinished.append((path, start, records))
+    return unfinished
+
+
+def finalize_journal(path, database):
+    """Tiklanmaydigan jurnaldan Excel yaratib, uni yakunlangan deb belgilash"""
+    filename = export_journal(path, database)
+    journal = AttendanceJournal(path)
+    journal.append({"event": "end"})
+    journal.close()
+    return filename
+
+
+def parse_deadline(value, now=None):
+    """Soat:daqiqa (bugun, o'tib ketgan bo'lsa ertaga) yoki daqiqalar sonini vaqtga aylantirish"""
+    now = now or datetime.now()
+    value = str(value).strip()
+    if ":" in value:
+        hour, minute = (int(part) for part in value.split(":", 1))
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError("Soat 0-23, daqiqa 0-59 oralig'ida bo'lishi kerak!")
+        deadline = datetime.combine(now.date(), time(hour, minute))
+        if deadline < now:
+            deadline += timedelta(days=1)
+        return deadline
+    return now + timedelta(minutes=int(value))
+
+
+class Schedule:
+    """Bir marta tahlil qilingan dars jadvali.
+
+    JSON ko'rinishi: {"Monday": {"start", "late", "end"}} yoki bir kunda
+    bir nechta dars uchun shunday yozuvlar ro'yxati. "exceptions" kaliti
+    ostida sana bo'yicha istisnolar beriladi: {"YYYY-MM-DD": [darslar]};
+    bo'sh ro'yxat - o'sha kuni dars yo'q. Vaqtlar "HH:MM" ko'rinishida.
+    """
+
+    DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+    def __init__(self, weekly, exceptions):
+        self.weekly = weekly
+        self.exceptions = exceptions
+
+    @classmethod
+    def parse(cls, data):
+        """JSON jadvalni tekshirib tahlil qilish; xato bo'lsa ValueError"""
+        weekly = {}
+        for index, day in enumerate(cls.DAYS):
+            if data.get(day):
+                weekly[index] = cls._parse_sessions(data[day], day)
+        exceptions = {}
+        for day, sessions in (data.get("exceptions") or {}).items():
+            try:
+                date = datetime.strptime(day, "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError(f"Istisno sanasi noto'g'ri: {day} (YYYY-MM-DD)")
+            exceptions[date] = cls._parse_sessions(sessions, day) if sessions else []
+        if not weekly and not exceptions:
+            raise ValueError("Jadvalda davomat kunlari topilmadi!")
+        return cls(weekly, exceptions)
+
+    @staticmethod
+    def _parse_sessions(entries, day):
+        if isinstance(entries, dict):
+            entries = [entries]
+        sessions = []
+        for entry in entries:
+            try:
+                start, late, end = (datetime.strptime(entry[key], "%H:%M").time()
+                                    for key in ("start", "late", "end"))
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{day}: vaqt formati noto'g'ri (start, late, end - HH:MM)")
+            if not start <= late < end:
+                raise ValueError(f"{day}: boshlanish <= kech qolish < tugash bo'lishi kerak")
+            sessions.append((start, late, end))
+        sessions.sort()
+        for previous, current in zip(sessions, sessions[1:]):
+            if current[0] < previous[2]:
+                raise ValueError(f"{day}: darslar vaqti ustma-ust tushmoqda")
+        return sessions
+
+    def sessions_on(self, day):
+        """Berilgan sanadagi darslar (istisnolar hisobga olingan)"""
+        if day in self.exceptions:
+            return self.exceptions[day]
+        return self.weekly.get(day.weekday(), [])
+
+    def next_window(self, now):
+        """Hali tugamagan eng yaqin dars: (boshlanish, kech qolish, tugash) yoki None"""
+        horizon = 8 if self.weekly else 0
+        if self.exceptions:
+            horizon = max(horizon, (max(self.exceptions) - now.date()).days + 1)
+        for offset in range(horizon):
+            day = now.date() + timedelta(days=offset)
+            for session in self.sessions_on(day):
+                start, late, end = (datetime.combine(day, value) for value in session)
+                if now < end:
+                    return start, late, end
+        return None
+
+
+class ScheduleTimer:
+    """Jadval chegaralarida uyg'onadigan heapq asosidagi taymer.
+
+    events() generatori har bir darsning boshlanishi, kech qolish
+    chegarasi va tugashida ("start" | "late" | "end", (boshlanish,
+    kech qolish, tugash)) qaytaradi. Oraliqda stop_event kutiladi,
+    shuning uchun to'xtatish darhol ta'sir qiladi. Davom etayotgan dars
+    uchun "start" darhol qaytariladi; iste'molchi kechiksa o'tib ketgan
+    hodisalar ketma-ket beriladi.
+    """
+
+    ORDER = {"start": 0, "late": 1, "end": 2}
+    # Tizim soati o'zgarsa (NTP, yozgi vaqt) kutish shu oraliqda qayta hisoblanadi
+    MAX_WAIT = 300.0
+
+    def __init__(self, schedule, stop_event=None):
+        self.schedule = schedule
+        self.stop_event = stop_event or threading.Event()
+
+    def _push(self, heap, window):
+        if window is None:
+            return
+        for kind, when in zip(("start", "late", "end"), window):
+            heapq.heappush(heap, (when, self.ORDER[kind], kind, window))
+
+    def events(self, now=None):
+        heap = []
+        self._push(heap, self.schedule.next_window(now or datetime.now()))
+        while heap and not self.stop_event.is_set():
+            when, _, kind, window = heap[0]
+            delay = (when - datetime.now()).total_seconds()
+            if delay > 0:
+                self.stop_event.wait(min(delay, self.MAX_WAIT))
+                continue
+            heapq.heappop(heap)
+            if kind == "end":
+                self._push(heap, self.schedule.next_window(window[2]))
+            yield kind, window
+
+
+class AttendanceSession:
+    """Bitta davomat sessiyasi: kameralar, tanib olish oqimlari va davomat jadvali.
+
+    Tkinter'ga bog'liq emas: grafik ilova ham, headless rejim ham shu
+    klassdan foydalanadi. match_faces(faces) -> [FaceMatch yoki None],
+    on_recorded(name, status, probability, mean_distance, variance, std_dev)
+    o'quvchi birinchi marta yozilganda chaqiriladi. attach_journal bilan
+    ulangan jurnalga har bir yozilish darhol qayd etiladi.
+
+    Ko'p xonali rejimda start'ga umumiy RecognitionService beriladi: yuzlar
+    barcha xonalar uchun bitta modelda vektorlanadi, taqqoslash esa shu
+    sessiyaning match_embeddings(vektorlar) -> [FaceMatch] funksiyasida.
+    """
+
+    def __init__(self, database, match_faces, settings, late_deadline, deadline, on_recorded=None,
+                 match_embeddings=None):
+        self.database = database
+        self.match_faces = match_faces
+        self.match_embeddings = match_embeddings
+        self.settings = settings
+        self.late_deadline = late_deadline
+        self.deadline = deadline
+        self.on_recorded = on_recorded
+        self.attendance = new_attendance_table(database, settings["distance_history"])
+        self.lock = threading.Lock()
+        self.camera_sources = []
+        self.caps = []
+        self.pipelines = []
+        self.service = None
+        self.owns_service = False
+        self.stats = StageStats()
+        self.last_profile = None
+        self.journal = None
+
+    @property
+    def running(self):
+        return any(pipeline.running for pipeline in self.pipelines)
+
+    def profile(self):
+        """Kamera oqimlari, tanib olish ishchilari va sessiya bosqichlari
+        statistikasi (to'xtatilgan sessiyada oxirgi holat)"""
+        if not self.pipelines and self.last_profile is not None:
+            return self.last_profile
+        scopes = {}
+        for pipeline in self.pipelines:
+            status = pipeline.status()
+            scopes[pipeline.name] = {
+                "stages": status["stages"],
+                "counters": dict(status["counters"], dropped_frames=sum(status["dropped"].values())),
+            }
+        if self.service:
+            status = self.service.status()
+            scopes["recognition"] = {
+                "stages": status["stages"],
+                "counters": {"batches": status["batches"], "faces": status["faces"],
+                             "avg_batch_faces": status["avg_batch_faces"]},
+            }
+        scopes["session"] = {"stages": self.stats.snapshot(), "counters": self.stats.counters()}
+        return {"seconds": tm.perf_counter() - self.stats.started, "scopes": scopes}
+
+    def warm_up(self, warm_up):
+        """Kamera ochilishidan oldin modelni isitish; sarflangan vaqt profilga
+        "warmup" bosqichi sifatida yoziladi"""
+        started = tm.perf_counter()
+        try:
+            warm_up()
+        except Exception as e:
+            print(f"Modelni isitishda xato: {e}")
+        self.stats.record("warmup", tm.perf_counter() - started)
+
+    def open_cameras(self, camera_sources):
+        """Kameralarni ochish; ochilmagan manbani qaytaradi (hammasi ochilsa None).
+
+        Manba o'rnida tayyor VideoCapture'ga o'xshash obyekt ham berilishi mumkin.
+        """
+        for camera_source in camera_sources:
+            cap = camera_source if hasattr(camera_source, "read") else cv2.VideoCapture(camera_source)
+            if not cap.isOpened():
+                cap.release()
+                self.stop()
+                return camera_source
+            # Kamera ichki buferida eski kadrlar yig'ilmasligi uchun
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.camera_sources.append(camera_source)
+            self.caps.append(cap)
+        return None
+
+    def attach_journal(self, journal, records=()):
+        """Jurnalni ulash; records - tiklanayotgan sessiyaning avvalgi yozuvlari"""
+        with self.lock:
+            apply_journal(self.attendance, records)
+            self.journal = journal
+
+    def start(self, workers, face_detection=None, on_frame=None, on_error=None, replay=False, service=None):
+        """Umumiy tanib olish ishchilari va har bir kamera oqimini ishga tushirish.
+
+        on_frame(index, frame) berilmasa kadrlar umuman chizilmaydi;
+        replay=True video fayllarni kadr tashlamasdan oxirigacha o'tkazadi.
+        service berilsa (ko'p xonali rejim) oqimlar shu xizmatga shu sessiya
+        guruhi sifatida ulanadi va xizmat sessiya bilan birga to'xtatilmaydi.
+        """
+        quality_gate = FaceQualityGate.from_settings(self.settings) if self.settings["quality_gate"] else None
+        self.owns_service = service is None
+        if service is None:
+            # Barcha kameralar bitta model, bitta baza va bitta davomat jadvalidan foydalanadi
+            service = RecognitionService(self.recognize_batch, workers=workers,
+                                         max_batch_faces=self.settings["max_batch_size"],
+                                         sample_size=None if replay else 1024).start()
+        else:
+            service.set_group_limit(self, self.settings["room_max_batch_faces"])
+        self.service = service
+        for i, (camera_source, cap) in enumerate(zip(self.camera_sources, self.caps)):
+            detector = face_detection if i == 0 and face_detection is not None else create_face_detector()
+            self.pipelines.append(AttendancePipeline(
+                cap, detector, self.service, self.process_matches,
+                on_frame=(lambda frame, i=i: on_frame(i, frame)) if on_frame else None,
+                on_error=on_error,
+                queue_size=self.settings["pipeline_queue_size"],
+                tracker=FaceTracker.from_settings(self.settings) if self.settings["tracking"] else None,
+                skip_recognition=self.is_recorded, name=str(camera_source), replay=replay,
+                quality_gate=quality_gate, display_fps=self.settings["preview_fps"],
+                # Replay rejimida barcha kadrlar o'zgarishsiz qayta ishlanishi kerak
+                controller=AdaptiveController.from_settings(self.settings)
+                if self.settings["adaptive"] and not replay else None,
+                group=self).start())
+        return self
+
+    def stop(self):
+        """Barcha kamera oqimlari va umumiy tanib olish ishchilarini to'xtatish"""
+        if self.pipelines:
+            self.last_profile = self.profile()
+        pipelines, self.pipelines = self.pipelines, []
+        for pipeline in pipelines:
+            pipeline.stop()
+        if self.service:
+            if self.owns_service:
+                self.service.stop()
+            else:
+                self.service.set_group_limit(self, None)
+            self.service = None
+        caps, self.caps = self.caps, []
+        for cap in caps:
+            cap.release()
+        with self.lock:
+            journal, self.journal = self.journal, None
+        if journal:
+            journal.finish(self.attendance)
+
+    def status_text(self):
+        """Har bir kamera va umumiy tanib olish ishchilari holati"""
+        lines = [f"{pipeline.name}: {format_pipeline_status(pipeline.status())}"
+                 for pipeline in self.pipelines]
+        if self.service:
+            lines.append(format_service_status(self.service.status()))
+        return "\n".join(lines)
+
+    def recognize_batch(self, items):
+        """Bir yoki bir nechta kadrdagi barcha yuzlarni bitta paketda tanib olish.
+
+        items - [(frame, detections), ...]. Har bir kadr uchun aniqlangan
+        yuzlar tartibida ((x, y, width, height), FaceMatch yoki None)
+        ro'yxatini qaytaradi.
+        """
+        all_boxes, faces, owners = self.align_batch(items)
+        face_matches = []
+        if faces:
+            try:
+                with self.stats.timer("embed_match"):
+                    face_matches = self.match_faces(faces)
+            except Exception as e:
+                print(f"Yuzlarni tanib olishda xato: {e}")
+        return self.assign_matches(all_boxes, owners, face_matches)
+
+    def align_batch(self, items):
+        """Kadrlardagi yuzlarni tekislash: (har bir kadr qutilari, yuzlar, (kadr, yuz) egalari)"""
+        all_boxes, faces, owners = [], [], []
+        with self.stats.timer("align"):
+            for item_index, (frame, detections) in enumerate(items):
+                h, w = frame.shape[:2]
+                all_boxes.append([detection_box(detection, w, h) for detection in detections])
+                for i, detection in enumerate(detections):
+                    face_img = align_face(frame, detection)
+                    if face_img.size != 0:
+                        faces.append(face_img)
+                        owners.append((item_index, i))
+        return all_boxes, faces, owners
+
+    def assign_matches(self, all_boxes, owners, face_matches):
+        """align_batch natijasi va yuzlar bo'yicha FaceMatch'lardan har bir kadr natijasini yig'ish"""
+        matches = [[None] * len(boxes) for boxes in all_boxes]
+        for (item_index, i), match in zip(owners, face_matches):
+            matches[item_index][i] = match
+        if face_matches:
+            recognized = sum(1 for match in face_matches if match is not None)
+            self.stats.count("recognized", recognized)
+            self.stats.count("unknown", len(face_matches) - recognized)
+        return [list(zip(boxes, item_matches)) for boxes, item_matches in zip(all_boxes, matches)]
+
+    def process_matches(self, results, current_time):
+        """Tanib olish natijalarini davomatga yozib, har bir yuz uchun
+        kadrga chiziladigan (quti, matn, rang) yoki None qaytarish"""
+        annotations = []
+        for box, match in results:
+            if match is None or match.name not in self.attendance:
+                annotations.append(None)
+                continue
+            name = match.name
+            self.mark_attendance(match, current_time)
+            status = self.attendance[name]["status"]
+            probability = self.attendance[name]["probability"]
+            color = (0, 0, 255)
+            if status == "Kelgan":
+                color = (0, 255, 0)
+            elif status == "Kech qolgan":
+                color = (255, 165, 0)
+            annotations.append((box, f"{name} ({status}, {probability:.2%})", color))
+        return annotations
+
+    def is_recorded(self, name):
+        """O'quvchining davomati allaqachon yozilganmi"""
+        person = self.attendance.get(name)
+        return bool(person and person["recorded"])
+
+    def mark_attendance(self, match, current_time):
+        """Tanilgan o'quvchi statistikasi va davomat holatini yangilash"""
+        with self.lock:
+            self._mark_attendance(match, current_time)
+
+    def _mark_attendance(self, match, current_time):
+        name = match.name
+        person = self.attendance[name]
+        person["distances"].add(match.distance)
+        mean, variance, std_dev = self.calculate_statistics(person["distances"])
+        person["probability"] = 1 - match.distance
+        person["mean_distance"] = mean
+        person["variance"] = variance
+        person["std_dev"] = std_dev
+
+        if not person["recorded"]:
+            if current_time <= self.late_deadline:
+                person["status"] = "Kelgan"
+                person["arrival_time"] = current_time.strftime("%H:%M:%S")
+            else:
+                person["status"] = "Kech qolgan"
+                person["late_time"] = current_time.strftime("%H:%M:%S")
+            person["recorded"] = True
+            self.stats.count("attendance_marks")
+            if self.journal:
+                self.journal.mark(name, person)
+            if self.on_recorded:
+                self.on_recorded(
+                    name,
+                    person["status"],
+                    person["probability"],
+                    person["mean_distance"],
+                    person["variance"],
+                    person["std_dev"]
+                )
+
+    @staticmethod
+    def calculate_statistics(distances):
+        """Masofalar statistikasini hisoblash (DistanceStats yoki masofalar ro'yxati)"""
+        if not isinstance(distances, DistanceStats):
+            stats = DistanceStats()
+            for distance in distances:
+                stats.add(distance)
+            distances = stats
+        if not distances.count:
+            return 0.0, 0.0, 0.0
+
+        return distances.mean, distances.variance, distances.std_dev
+
+
+class HeadlessAttendance:
+    """Tkinter va displeysiz davomat (server yoki xizmat sifatida ishlatish uchun).
+
+    Qo'lda rejimda berilgan muddatgacha, jadval rejimida esa har bir
+    jadval oynasida davomat o'tkazadi. Kadrlar chizilmaydi, natija grafik
+    ilovadagi save_attendance bilan bir xil Excel faylga yoziladi.
+
+    RoomManager ichida xona sifatida ishlaganda embedder va service
+    (grouped=True RecognitionService) tashqaridan beriladi: model va
+    tanib olish ishchilari barcha xonalar uchun bitta, xonada faqat
+    kamera oqimlari, baza va o'z taqqoslagichi qoladi. name berilsa
+    konsol xabarlari xona nomi bilan boshlanadi. Vektorlar EmbeddingCache
+    orqali ulanadi; boshqa jarayon yangi versiya e'lon qilsa taqqoslagich
+    ish davomida almashtiriladi.
+    """
+
+    def __init__(self, db_path, camera_sources, settings, output_dir="", embedder=None, service=None, name=""):
+        self.camera_sources = camera_sources
+        self.settings = settings
+        self.output_dir = output_dir
+        self.name = name
+        self.service = service
+        self.stop_event = threading.Event()
+        self.db_path = db_path
+        self.database = load_database_metadata(db_path)
+        self.face_detection = create_face_detector()
+        self.embedder = embedder or FaceEmbedder(build_arcface_model(), settings["max_batch_size"])
+        store = prepare_embedding_store(db_path, self.database, self.face_detection, self.embedder)
+        self.matcher, self.cache = build_face_matcher(db_path, store, settings)
+        self.database_version = self.matcher.version
+        self.process_recognizer = None
+        # Umumiy xizmatda vektorlash shu jarayondagi yagona modelda bajariladi
+        if settings["process_workers"] > 0 and service is None:
+            self.process_recognizer = ProcessRecognizer(db_path, settings, settings["process_workers"])
+        self.session = None
+        self.state = "kutilmoqda"
+        self.window = None
+        self.last_file = None
+        self.last_error = None
+
+    def stop(self):
+        """Joriy sessiyani yakunlash (natija baribir saqlanadi) va kutishni to'xtatish"""
+        self.stop_event.set()
+
+    def close(self):
+        """Jarayon ishchilarini to'xtatish"""
+        if self.process_recognizer:
+            self.process_recognizer.close()
+            self.process_recognizer = None
+
+    def log(self, message):
+        print(f"[{self.name}] {message}" if self.name else message, flush=True)
+
+    def status(self):
+        """Xona holati: holat, joriy yoki keyingi dars, yozilganlar va kamera oqimlari"""
+        session = self.session
+        status = {
+            "state": self.state,
+            "window": [value.isoformat(timespec="minutes") for value in self.window] if self.window else None,
+            "last_file": self.last_file,
+            "last_error": self.last_error,
+        }
+        if session is not None:
+            status["recorded"] = sum(1 for person in session.attendance.values() if person["recorded"])
+            status["students"] = len(session.attendance)
+            status["cameras"] = {pipeline.name: {
+                "running": pipeline.running,
+                "queue_depth": pipeline_status["queue_depth"],
+                "dropped": pipeline_status["dropped"],
+                "latency_p95_ms": pipeline_status["stages"].get("latency", {}).get("p95_ms"),
+            } for pipeline in list(session.pipelines) for pipeline_status in [pipeline.status()]}
+        return status
+
+    def refresh_matcher(self):
+        """Keshda vektorlarning yangi versiyasi bo'lsa matcherni almashtirish"""
+        snapshot = self.cache.poll() if self.cache else None
+        if snapshot is None:
+            return False
+        self.matcher = FaceMatcher.from_snapshot(snapshot, self.settings)
+        self.log(f"Vektorlar bazasi yangilandi (versiya {snapshot.version})")
+        return True
+
+    def match_face_crops(self, faces):
+        self.refresh_matcher()
+        return match_face_crops(faces, self.embedder, self.matcher, self.process_recognizer)
+
+    def match_embeddings(self, embeddings):
+        self.refresh_matcher()
+        return self.matcher.match(embeddings)
+
+    def on_recorded(self, name, status, probability, mean_distance, variance, std_dev):
+        self.log(f"{datetime.now().strftime('%H:%M:%S')} {name}: {status} "
+                 f"(ehtimollik {probability:.2%}, o'rtacha masofa {mean_distance:.4f})")
+
+    def on_pipeline_error(self, pipeline, message):
+        self.log(f"{pipeline.name}: {message}")
+
+    def recover_journal(self):
+        """Shu baza va xona uchun tugash vaqti o'tmagan eng yangi yakunlanmagan
+        jurnalni qaytarish; qolgan jurnallaridan Excel yaratilib, ular yakunlanadi"""
+        resumable = None
+        for path, start, records in find_unfinished_journals(self.db_path, self.output_dir, self.name):
+            if resumable is None and datetime.fromisoformat(start["deadline"]) > datetime.now():
+                resumable = (path, start, records)
+                continue
+            self.log(f"Yakunlanmagan davomat saqlandi: {finalize_journal(path, self.database)}")
+        return resumable
+
+    def run_session(self, late_deadline, deadline, status_interval=60):
+        """Bitta davomat sessiyasini tugash vaqtigacha o'tkazib Excel fayl nomini qaytarish.
+
+        Jurnal yoqilgan bo'lsa uzilib qolgan sessiya o'z muddatlari bilan davom ettiriladi.
+        """
+        self.refresh_matcher()
+        if self.matcher.version != self.database_version:
+            # Yangi ro'yxatga olingan o'quvchilar keyingi sessiya jadvaliga kiradi
+            self.database = load_database_metadata(self.db_path)
+            self.database_version = self.matcher.version
+        resumed = self.recover_journal() if self.settings["journal"] else None
+        if resumed:
+            late_deadline = datetime.fromisoformat(resumed[1]["late_deadline"])
+            deadline = datetime.fromisoformat(resumed[1]["deadline"])
+        session = AttendanceSession(self.database, self.match_face_crops, self.settings,
+                                    late_deadline, deadline, on_recorded=self.on_recorded,
+                                    match_embeddings=self.match_embeddings)
+        if self.service is None:
+            session.warm_up(lambda: warm_up_recognizer(self.embedder, self.process_recognizer))
+        failed = session.open_cameras(self.camera_sources)
+        if failed is not None:
+            self.state = "xato"
+            self.last_error = f"Kamera ochilmadi! ({failed})"
+            raise RuntimeError(self.last_error)
+        filename = attendance_filename(self.output_dir)
+        if resumed:
+            filename = os.path.splitext(resumed[0])[0] + ".xlsx"
+            session.attach_journal(AttendanceJournal.resume(resumed[0]), resumed[2])
+            recorded = sum(1 for person in session.attendance.values() if person["recorded"])
+            self.log(f"Uzilib qolgan davomat tiklandi: {resumed[0]} ({recorded} o'quvchi yozilgan)")
+        elif self.settings["journal"]:
+            session.attach_journal(AttendanceJournal.create(journal_filename(filename), self.db_path,
+                                                            late_deadline, deadline, self.name))
+        workers = (self.process_recognizer.workers if self.process_recognizer
+                   else self.settings["recognition_workers"])
+        session.start(workers, face_detection=self.face_detection, on_error=self.on_pipeline_error,
+                      service=self.service)
+        self.session = session
+        self.state = "davomat"
+        self.last_error = None
+        if self.service is None:
+            warmup = session.stats.snapshot()["warmup"]["last_ms"]
+            self.log(f"Model isitildi: {warmup:.0f} ms")
+        self.log(f"Davomat boshlandi: kech qolish {late_deadline.strftime('%H:%M')}, "
+                 f"tugash {deadline.strftime('%H:%M')}")
+        last_status = tm.monotonic()
+        try:
+            # Barcha kameralar uzilsa ham sessiya yakunlanadi va natija saqlanadi
+            while not self.stop_event.is_set() and session.running:
+                remaining = (deadline - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                self.stop_event.wait(min(1.0, remaining))
+                if status_interval and tm.monotonic() - last_status >= status_interval:
+                    self.log(session.status_text())
+                    last_status = tm.monotonic()
+        finally:
+            session.stop()
+            self.state = "kutilmoqda"
+        if self.settings["journal"]:
+            export_journal(journal_filename(filename), self.database, filename)
+        else:
+            write_attendance_excel(session.attendance, filename)
+        try:
+            record_attendance_history(self.db_path, filename, session.attendance, deadline.date())
+        except sqlite3.Error as e:
+            self.log(f"Davomat tarixini yozishda xato: {e}")
+        if self.settings["profile_export"]:
+            for path in write_profile(session.profile(), os.path.splitext(filename)[0]):
+                self.log(f"Unumdorlik profili saqlandi: {path}")
+        recorded = sum(1 for person in session.attendance.values() if person["recorded"])
+        self.log(f"Davomat saqlandi: {filename} ({recorded}/{len(session.attendance)} o'quvchi)")
+        self.session = None
+        self.last_file = filename
+        return filename
+
+    def run_manual(self, late_deadline, deadline):
+        """Qo'lda rejim: bitta sessiya"""
+        if late_deadline >= deadline:
+            raise ValueError("Kech qolish chegarasi umumiy tugash vaqtidan oldin bo'lishi kerak!")
+        return self.run_session(late_deadline, deadline)
+
+    def run_schedule(self, schedule, status_interval=60):
+        """Jadval rejimi: to'xtatilguncha har bir darsda davomat o'tkazish"""
+        self.window = schedule.next_window(datetime.now())
+        if self.window is None:
+            self.state = "jadval tugagan"
+            self.log("Jadvalda keyingi darslar topilmadi!")
+            return
+        self.log(f"Keyingi davomat: {self.window[0].strftime('%Y-%m-%d %H:%M')}")
+        for kind, (start, late, end) in ScheduleTimer(schedule, self.stop_event).events():
+            if kind == "end":
+                self.window = schedule.next_window(end)
+                if self.window:
+                    self.log(f"Keyingi davomat: {self.window[0].strftime('%Y-%m-%d %H:%M')}")
+                continue
+            if kind != "start":
+                continue
+            self.window = (start, late, end)
+            # Kamera ochilmasa dars tugaguncha qayta uriniladi
+            while not self.stop_event.is_set() and datetime.now() < end:
+                try:
+                    self.run_session(late, end, status_interval)
+                    break
+                except RuntimeError as e:
+                    self.log(f"{e} 60 soniyadan keyin qayta uriniladi.")
+                    self.stop_event.wait(60)
+        if self.stop_event.is_set():
+            self.state = "to'xtatilgan"
+        elif self.window is None:
+            self.state = "jadval tugagan"
+
+
+def read_rooms_config(path):
+    """Xonalar konfiguratsiyasini o'qish va tekshirish.
+
+    {"status_file": "...", "status_interval": 10, "rooms": [{"name", "db",
+    "cameras": [...], "schedule": fayl yoki jadval, "output_dir",
+    "settings": {...}}]}. Nisbiy yo'llar konfiguratsiya papkasiga nisbatan
+    olinadi; xatoda ValueError.
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(value):
+        return value if os.path.isabs(value) else os.path.join(base, value)
+
+    rooms, names, output_dirs = [], set(), set()
+    for index, room in enumerate(config.get("rooms") or []):
+        name = str(room.get("name") or f"xona-{index + 1}")
+        if name in names:
+            raise ValueError(f"Xona nomi takrorlangan: {name}")
+        names.add(name)
+        if not room.get("db") or not room.get("cameras") or not room.get("schedule"):
+            raise ValueError(f"{name}: db, cameras va schedule kerak!")
+        schedule = room["schedule"]
+        if isinstance(schedule, str):
+            with open(resolve(schedule), 'r') as f:
+                schedule = json.load(f)
+        overrides = room.get("settings") or {}
+        unknown = sorted(set(overrides) - set(DEFAULT_RECOGNITION_SETTINGS))
+        shared = sorted(set(overrides) & set(RoomManager.SHARED_SETTINGS))
+        if unknown or shared:
+            raise ValueError(f"{name}: xona sozlamalarida ruxsat etilmagan kalitlar: {', '.join(unknown + shared)}")
+        output_dir = resolve(room.get("output_dir") or name)
+        # Xonalar jurnallari va Excel fayllari bir-birini bosib ketmasligi uchun
+        output_key = os.path.normcase(os.path.abspath(output_dir))
+        if output_key in output_dirs:
+            raise ValueError(f"{name}: output_dir boshqa xona bilan bir xil: {output_dir}")
+        output_dirs.add(output_key)
+        rooms.append({
+            "name": name,
+            "db": resolve(room["db"]),
+            "cameras": [parse_camera_source(str(camera)) for camera in room["cameras"]],
+            "schedule": Schedule.parse(schedule),
+            "output_dir": output_dir,
+            "settings": overrides,
+        })
+    if not rooms:
+        raise ValueError("Konfiguratsiyada xonalar topilmadi!")
+    status_file = config.get("status_file")
+    return rooms, resolve(status_file) if status_file else None, float(config.get("status_interval", 10))
+
+
+class RoomManager:
+    """Bitta jarayonda ko'p xonali jadval rejimi.
+
+    Har bir xona - o'z kameralari, bazasi, jadvali va natijalar papkasiga
+    ega HeadlessAttendance. ArcFace modeli (FaceEmbedder) va tanib olish
+    ishchilari (RecognitionService) hamma xonalar uchun bitta: ishchilar
+    turli xonalardan kelgan yuzlarni bitta paketda vektorlaydi, taqqoslash
+    esa har bir xonaning o'z bazasida bajariladi. Shuning uchun yangi xona
+    faqat kamera oqimlari qo'shadi. Xona sozlamalari umumiy sozlamalar
+    ustiga yoziladi; room_max_batch_faces xonaning paketdagi ulushini
+    cheklaydi. Holat status_file ga status_interval soniyada bir marta
+    JSON ko'rinishida yoziladi.
+    """
+
+    # Umumiy model va ishchilarga tegishli, xona bo'yicha o'zgartirib bo'lmaydigan sozlamalar
+    SHARED_SETTINGS = ("max_batch_size", "recognition_workers", "process_workers", "process_worker_threads")
+
+    def __init__(self, rooms, settings, status_file=None, status_interval=10.0):
+        self.settings = settings
+        self.status_file = status_file
+        self.status_interval = max(1.0, status_interval)
+        self.started = datetime.now()
+        self.embedder = FaceEmbedder(build_arcface_model(), settings["max_batch_size"])
+        self.stats = StageStats()
+        self.service = RecognitionService(self.recognize_batch, workers=settings["recognition_workers"],
+                                          max_batch_faces=settings["max_batch_size"], grouped=True)
+        self.rooms = []
+        self.schedules = {}
+        self.threads = []
+        for room in rooms:
+            runner = HeadlessAttendance(room["db"], room["cameras"], dict(settings, **room["settings"]),
+                                        output_dir=room["output_dir"], embedder=self.embedder,
+                                        service=self.service, name=room["name"])
+            self.rooms.append(runner)
+            self.schedules[runner.name] = room["schedule"]
+
+    def recognize_batch(self, items, sessions):
+        """Barcha xonalar yuzlarini bitta paketda vektorlab, har birini o'z bazasida taqqoslash"""
+        prepared, faces = [], []
+        for session in dict.fromkeys(sessions):
+            indices = [i for i, owner in enumerate(sessions) if owner is session]
+            all_boxes, session_faces, owners = session.align_batch([items[i] for i in indices])
+            prepared.append((session, indices, all_boxes, owners, len(faces), len(session_faces)))
+            faces.extend(session_faces)
+        with self.stats.timer("embed"):
+            embeddings = self.embedder.embed(faces)
+        self.stats.count("faces", len(faces))
+        results = [[] for _ in items]
+        for session, indices, all_boxes, owners, offset, count in prepared:
+            face_matches = []
+            if count:
+                try:
+                    with session.stats.timer("match"):
+                        face_matches = session.match_embeddings(embeddings[offset:offset + count])
+                except Exception as e:
+                    print(f"Yuzlarni tanib olishda xato: {e}")
+            for i, item_results in zip(indices, session.assign_matches(all_boxes, owners, face_matches)):
+                results[i] = item_results
+        return results
+
+    def status(self):
+        """Umumiy xizmat va har bir xona holati"""
+        service = self.service.status()
+        return {
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "started": self.started.isoformat(timespec="seconds"),
+            "recognition": {
+                "batches": service["batches"],
+                "faces": service["faces"],
+                "avg_batch_faces": service["avg_batch_faces"],
+                "recognize_p95_ms": service["stages"].get("recognize", {}).get("p95_ms"),
+                "embed_p95_ms": self.stats.snapshot().get("embed", {}).get("p95_ms"),
+            },
+            "rooms": {runner.name: runner.status() for runner in self.rooms},
+        }
+
+    def write_status(self):
+        """Holat faylini atomar yangilash (o'quvchi hech qachon yarim faylni ko'rmaydi)"""
+        if not self.status_file:
+            return
+        temp_path = self.status_file + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.status(), f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.status_file)
+        except OSError as e:
+            print(f"Holat faylini yozishda xato: {e}", flush=True)
+
+    def _run_room(self, runner):
+        try:
+            runner.run_schedule(self.schedules[runner.name], status_interval=0)
+        except Exception as e:
+            runner.state = "xato"
+            runner.last_error = str(e)
+            runner.log(f"Xona to'xtadi: {e}")
+
+    def run(self):
+        """Barcha xonalarni ishga tushirib, to'xtatilguncha yoki jadvallar tugaguncha kutish"""
+        warmup = self.embedder.warm_up()
+        print(f"Model isitildi: {warmup * 1000:.0f} ms ({len(self.rooms)} xona)", flush=True)
+        self.service.start()
+        for runner in self.rooms:
+            thread = threading.Thread(target=self._run_room, args=(runner,), name=f"room-{runner.name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        alive = list(self.threads)
+        try:
+            while alive:
+                self.write_status()
+                alive[0].join(self.status_interval)
+                alive = [thread for thread in alive if thread.is_alive()]
+        finally:
+            self.write_status()
+
+    def stop(self):
+        """Barcha xonalarning joriy sessiyasini saqlab to'xtatish"""
+        for runner in self.rooms:
+            runner.stop()
+
+    def close(self):
+        self.service.stop()
+        for runner in self.rooms:
+            runner.close()
+
+
+def peak_rss_mb():
+    """Jarayon boshidan beri eng katta rezident xotira (MB); Windows'da None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux'da KB, macOS'da baytlarda qaytariladi
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def benchmark_replay(sources, database, match_faces, settings, face_detection=None, warm_up=None):
+    """Videolarni davomat yo'lidan (aniqlash -> tanib olish -> davomat)
+    kadr tashlamasdan o'tkazib, o'tkazuvchanlik va kechikishlarni o'lchash"""
+    session = AttendanceSession(database, match_faces, settings, datetime.max, datetime.max)
+    if warm_up:
+        session.warm_up(warm_up)
+    failed = session.open_cameras(sources)
+    if failed is not None:
+        raise RuntimeError(f"Video ochilmadi! ({failed})")
+    started = tm.perf_counter()
+    session.start(settings["recognition_workers"], face_detection=face_detection, replay=True)
+    try:
+        for pipeline in session.pipelines:
+            pipeline.finished.wait()
+        elapsed = max(tm.perf_counter() - started, 1e-6)
+        frames = sum(pipeline.frames_total or 0 for pipeline in session.pipelines)
+        faces = sum(pipeline.stats.counters().get("detections", 0) for pipeline in session.pipelines)
+        stages = {}
+        for pipeline in session.pipelines:
+            for stage, entry in pipeline.status()["stages"].items():
+                stages[stage if len(session.pipelines) == 1 else f"{pipeline.name}:{stage}"] = entry
+        service_status = session.service.status()
+        stages["batch"] = service_status["stages"].get("recognize")
+        stages.update(session.stats.snapshot())
+    finally:
+        session.stop()
+    return {
+        "frames": frames,
+        "faces": faces,
+        "recognized_faces": service_status["faces"],
+        "recorded": sum(1 for person in session.attendance.values() if person["recorded"]),
+        "seconds": elapsed,
+        "frames_per_s": frames / elapsed,
+        "faces_per_s": faces / elapsed,
+        "stages": {stage: entry for stage, entry in stages.items() if entry},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+class UiChannel:
+    """Ishchi oqimlardan Tk oynasiga yagona xabar kanali.
+
+    Ishchi oqimlar Tk'ga umuman tegmaydi, faqat navbatga xabar qo'yadi;
+    asosiy oqimdagi root.after pump'i uni har interval ms da bo'shatadi:
+    - post(key, fn, *args): bir tick ichida bir xil kalitdan faqat
+      oxirgisi bajariladi (kadr, taymer matni);
+    - append(key, fn, text): qatorlar yig'ilib, fn(qatorlar) bilan bitta
+      chaqiruvda yoziladi (holat qatorlari);
+    - call(fn, *args): bir martalik xabar (xato oynasi, to'xtatish),
+      tick boshiga ko'pi bilan max_calls tasi bajariladi.
+    """
+
+    def __init__(self, root, interval=30, max_calls=20):
+        self.root = root
+        self.interval = interval
+        self.max_calls = max_calls
+        self.lock = threading.Lock()
+        self.latest = {}
+        self.batches = {}
+        self.calls = deque()
+
+    def start(self):
+        self.root.after(self.interval, self._pump)
+        return self
+
+    def post(self, key, fn, *args):
+        with self.lock:
+            self.latest[key] = (fn, args)
+
+    def append(self, key, fn, text):
+        with self.lock:
+            self.batches.setdefault(key, (fn, []))[1].append(text)
+
+    def call(self, fn, *args):
+        with self.lock:
+            self.calls.append((fn, args))
+
+    def _pump(self):
+        with self.lock:
+            calls = [self.calls.popleft() for _ in range(min(self.max_calls, len(self.calls)))]
+            latest, self.latest = self.latest, {}
+            batches, self.batches = self.batches, {}
+        messages = calls + list(latest.values()) + [(fn, (lines,)) for fn, lines in batches.values()]
+        for fn, args in messages:
+            try:
+                fn(*args)
+            except tk.TclError:
+                # Oyna yoki vidjet allaqachon yopilgan
+                pass
+            except Exception as e:
+                print(f"Interfeysni yangilashda xato: {e}")
+        try:
+            self.root.after(self.interval, self._pump)
+        except tk.TclError:
+            pass
+
+
+class PreviewRenderer:
+    """Kamera kadrlarini Tk oynasida arzon ko'rsatish.
+
+    Kadr oldindan ajratilgan buferga bir marta INTER_LINEAR bilan
+    kichraytiriladi (ko'rish uchun yetarli, INTER_AREA dan ~10 barobar arzon), rangi bir marta BGR->RGB ga o'giriladi va bitta doimiy
+    PhotoImage'ga joyida (paste) yoziladi. submit() istalgan oqimdan
+    chaqiriladi va chizishni UiChannel orqali asosiy oqimga yuboradi;
+    oldingi kadr hali chizilmagan bo'lsa yoki max_fps oshayotgan bo'lsa
+    yangi kadr tashlab yuboriladi (0 - cheklanmaydi).
+    """
+
+    def __init__(self, ui, label, size, max_fps=0):
+        self.ui = ui
+        self.label = label
+        self.size = size
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        width, height = size
+        self.resized = np.empty((height, width, 3), dtype=np.uint8)
+        self.rgb = np.empty((height, width, 3), dtype=np.uint8)
+        self.photo = None
+        self.pending = False
+        self.last_render = 0.0
+        self.lock = threading.Lock()
+
+    def submit(self, frame):
+        """Kadrni ko'rsatishga yuborish; tashlab yuborilsa False"""
+        now = tm.monotonic()
+        with self.lock:
+            # Tk oqimi rgb buferini o'qib bo'lmaguncha unga yozilmaydi
+            if self.pending or now - self.last_render < self.min_interval:
+                return False
+            self.last_render = now
+        source = frame
+        if frame.shape[1::-1] != tuple(self.size):
+            cv2.resize(frame, self.size, dst=self.resized, interpolation=cv2.INTER_LINEAR)
+            source = self.resized
+        cv2.cvtColor(source, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        with self.lock:
+            self.pending = True
+        self.ui.post(self, self._draw)
+        return True
+
+    def _draw(self):
+        try:
+            image = Image.fromarray(self.rgb)
+            if self.photo is None:
+                self.photo = ImageTk.PhotoImage(image=image)
+                self.label.config(image=self.photo)
+            else:
+                self.photo.paste(image)
+        except tk.TclError:
+            pass
+        finally:
+            with self.lock:
+                self.pending = False
+
 
 class AttendanceApp:
     def __init__(self):
@@ -31,6 +3614,8 @@ class AttendanceApp:
         self.root.minsize(1000, 700)
         self.root.title("Davomat Tizimi")
         self.root.configure(bg="#f0f2f5")
+        # Fon oqimlari vidjetlarni faqat shu kanal orqali yangilaydi
+        self.ui = UiChannel(self.root).start()
         
         self.current_frame = None
         self.database_path = None
@@ -42,25 +3627,63 @@ class AttendanceApp:
         self.mode_choice = None
         self.schedule_file = None
         self.schedule_data = None
+        self.schedule = None
+        self.schedule_stop = None
         self.attendance_data = None
+        self.embedding_store = None
+        self.embedding_cache = None
+        self.session = None
+        self.session_profile = None
+        self.journal_path = None
+        self.process_recognizer = None
         self.contacts_file = "contacts.json"
         self.smtp_settings_file = "smtp_settings.json"
+        self.recognition_settings_file = "recognition_settings.json"
         self.contacts = self.load_contacts()
         self.smtp_settings = self.load_smtp_settings()
+        self.recognition_settings = self.load_recognition_settings()
+        self.matcher = None
         
-        # Mediapipe sozlamalari
-        self.mp_face_detection = mp.solutions.face_detection
-        self.face_detection = self.mp_face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
-        
-        # Pre-load ArcFace model
-        try:
-            self.arcface_model = DeepFace.build_model("ArcFace")
-        except Exception as e:
-            messagebox.showerror("Xato", f"ArcFace modelini yuklashda xato: {e}")
-            self.arcface_model = None
+        # Mediapipe va ArcFace birinchi kerak bo'lganda fon oqimida yuklanadi
+        self.face_detection = None
+        self.arcface_model = None
+        self.embedder = None
+        self.models_ready = threading.Event()
+        self.model_error = None
+        self.warmup_thread = None
         
         self.create_main_interface()
         
+    def start_model_warmup(self):
+        """Mediapipe va ArcFace modellarini fon oqimida yuklashni boshlash (bir marta)"""
+        if self.warmup_thread is None:
+            self.warmup_thread = threading.Thread(target=self._warm_up_models, name="model-warmup", daemon=True)
+            self.warmup_thread.start()
+
+    def _warm_up_models(self):
+        try:
+            self.face_detection = create_face_detector()
+            self.arcface_model = build_arcface_model()
+            self.embedder = FaceEmbedder(self.arcface_model, self.recognition_settings["max_batch_size"])
+            self.embedder.warm_up()
+        except Exception as e:
+            self.model_error = e
+        finally:
+            self.models_ready.set()
+
+    def ensure_models(self):
+        """Modellar tayyorligini tekshirish; yuklash tugamagan bo'lsagina kutiladi"""
+        self.start_model_warmup()
+        if not self.models_ready.is_set():
+            self.root.config(cursor="watch")
+            self.root.update_idletasks()
+            self.models_ready.wait()
+            self.root.config(cursor="")
+        if self.embedder is None:
+            messagebox.showerror("Xato", f"ArcFace modelini yuklashda xato: {self.model_error}")
+            return False
+        return True
+
     def load_contacts(self):
         """Kontaktlar faylini yuklash"""
         if os.path.exists(self.contacts_file):
@@ -99,6 +3722,10 @@ class AttendanceApp:
         except Exception as e:
             print(f"SMTP sozlamalarini saqlashda xato: {e}")
 
+    def load_recognition_settings(self):
+        """Tanib olish sozlamalarini yuklash"""
+        return read_recognition_settings(self.recognition_settings_file)
+
     def create_main_interface(self):
         """Asosiy interfeysni yaratish"""
         if self.current_frame:
@@ -134,6 +3761,8 @@ class AttendanceApp:
     def quit_application(self):
         """Ilovadan chiqish"""
         self.running = False
+        self.stop_pipelines()
+        self.close_process_recognizer()
         if self.cap:
             self.cap.release()
         try:
@@ -164,6 +3793,7 @@ class AttendanceApp:
 
     def show_create_database(self):
         """Yangi o'quvchi qo'shish interfeysini ko'rsatish"""
+        self.start_model_warmup()
         if self.current_frame:
             self.current_frame.destroy()
             
@@ -202,6 +3832,8 @@ class AttendanceApp:
         
         ttk.Button(self.current_frame, text="Saqlash",
                   command=self.save_to_database).pack(pady=10)
+        ttk.Button(self.current_frame, text="O'zgargan suratlarni qayta indekslash",
+                  command=self.reindex_database).pack(pady=5)
         ttk.Button(self.current_frame, text="Orqaga",
                   command=self.show_attendance_section).pack(pady=5)
 
@@ -228,21 +3860,32 @@ class AttendanceApp:
         if not all([name, surname, father_name, faculty, direction, group, len(file_paths) >= 4]):
             messagebox.showwarning("Ogohlantirish", "Barcha maydonlarni to'ldiring va kamida 4 ta surat tanlang!")
             return
+        if not self.ensure_models():
+            return
             
         valid_images = 0
         db_path = os.path.join(os.getcwd(), db_name)
-        person_path = os.path.join(db_path, f"{name}_{surname}")
+        os.makedirs(db_path, exist_ok=True)
+        try:
+            with closing(StudentDatabase.open(db_path)) as db:
+                key = db.student_key(name, surname, father_name, group)
+                students = db.students()
+        except Exception as e:
+            messagebox.showerror("Xato", f"Bazani ochishda xato: {e}")
+            return
+        if key in students:
+            # Qayta ro'yxatga olish: suratlar o'sha papkaga yoziladi
+            person_path = students[key]["image_folder"]
+        else:
+            # Bir xil ism-familiyali o'quvchilar suratlari aralashib ketmasligi uchun
+            person_path = os.path.join(db_path, f"{name}_{surname}")
+            used = {data["image_folder"] for data in students.values()}
+            suffix = 2
+            while person_path in used or os.path.exists(person_path):
+                person_path = os.path.join(db_path, f"{name}_{surname}_{suffix}")
+                suffix += 1
         os.makedirs(person_path, exist_ok=True)
         
-        metadata = {}
-        metadata_path = os.path.join(db_path, "metadata.json")
-        if os.path.exists(metadata_path):
-            try:
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-            except:
-                pass
-        
         for i, file_path in enumerate(file_paths):
             try:
                 img = cv2.imread(file_path)
@@ -263,7 +3906,8 @@ class AttendanceApp:
             messagebox.showerror("Xato", "Kamida 4 ta suratda yuz aniqlanishi kerak!")
             return
         
-        metadata[name] = {
+        student = {
+            "name": name,
             "surname": surname,
             "father_name": father_name,
             "faculty": faculty,
@@ -273,15 +3917,52 @@ class AttendanceApp:
         }
         
         try:
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=4)
+            with closing(StudentDatabase.open(db_path)) as db:
+                db.save_student(key, student)
         except Exception as e:
-            messagebox.showerror("Xato", f"Metadata faylini saqlashda xato: {e}")
+            messagebox.showerror("Xato", f"O'quvchini bazaga saqlashda xato: {e}")
             return
         
-        messagebox.showinfo("Muvaffaqiyat", f"{name} {db_name} bazasiga qo'shildi!")
+        self.update_embedding_store(db_path, key, person_path)
+        messagebox.showinfo("Muvaffaqiyat", f"{key} {db_name} bazasiga qo'shildi!")
         self.show_attendance_section()
 
+    def update_embedding_store(self, db_path, name, image_folder):
+        """Yangi o'quvchining faqat o'zgargan suratlarini vektorlar omboriga qo'shish"""
+        if not self.embedder:
+            return
+        try:
+            store = EmbeddingStore(db_path)
+            if store.exists():
+                store.load()
+            if store.sync_person(name, image_folder, self.face_detection, self.embedder):
+                store.save()
+                publish_embedding_cache(db_path, store, self.recognition_settings)
+        except Exception as e:
+            messagebox.showerror("Xato", f"Baza vektorlarini yangilashda xato: {e}")
+
+    def reindex_database(self):
+        """Baza papkasida o'zgargan suratlarni qayta indekslash"""
+        if not self.ensure_models():
+            return
+        db_name = self.db_name_entry.get().strip() or "face_database"
+        db_path = os.path.join(os.getcwd(), db_name)
+        try:
+            database = load_database_metadata(db_path)
+            store = EmbeddingStore(db_path)
+            if store.exists():
+                store.load()
+            changed = store.reindex_changed(database, self.face_detection, self.embedder)
+            if changed:
+                publish_embedding_cache(db_path, store, self.recognition_settings)
+        except Exception as e:
+            messagebox.showerror("Xato", f"Qayta indekslashda xato: {e}")
+            return
+        if changed:
+            messagebox.showinfo("Muvaffaqiyat", f"Qayta indekslandi: {', '.join(changed)}")
+        else:
+            messagebox.showinfo("Ma'lumot", "O'zgargan suratlar topilmadi.")
+
     def show_create_schedule(self):
         """Jadval yaratish interfeysini ko'rsatish"""
         if self.current_frame:
@@ -292,6 +3973,8 @@ class AttendanceApp:
         
         ttk.Label(self.current_frame, text="Jadval Yaratish",
                  font=("Helvetica", 18, "bold")).pack(pady=10)
+        ttk.Label(self.current_frame, text="Bir kunda bir nechta dars bo'lsa vaqtlarni vergul bilan kiriting "
+                                           "(masalan, 08:30, 10:00)").pack(pady=2)
         
         self.schedule_entries = {}
         days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
@@ -303,15 +3986,15 @@ class AttendanceApp:
             frame.pack(fill="x", pady=2)
             
             ttk.Label(frame, text="Boshlanish vaqti (HH:MM):", width=20).pack(side="left")
-            start_entry = ttk.Entry(frame, width=10)
+            start_entry = ttk.Entry(frame, width=20)
             start_entry.pack(side="left", padx=5)
             
             ttk.Label(frame, text="Kech qolish (HH:MM):", width=20).pack(side="left")
-            late_entry = ttk.Entry(frame, width=10)
+            late_entry = ttk.Entry(frame, width=20)
             late_entry.pack(side="left", padx=5)
             
             ttk.Label(frame, text="Tugash vaqti (HH:MM):", width=20).pack(side="left")
-            end_entry = ttk.Entry(frame, width=10)
+            end_entry = ttk.Entry(frame, width=20)
             end_entry.pack(side="left", padx=5)
             
             self.schedule_entries[day] = {
@@ -331,27 +4014,23 @@ class AttendanceApp:
         days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
         
         for day in days:
-            start_time = self.schedule_entries[day]["start"].get().strip()
-            late_time = self.schedule_entries[day]["late"].get().strip()
-            end_time = self.schedule_entries[day]["end"].get().strip()
-            
+            start_times, late_times, end_times = (
+                [value.strip() for value in self.schedule_entries[day][key].get().split(",") if value.strip()]
+                for key in ("start", "late", "end"))
+            if not (start_times or late_times or end_times):
+                continue
+            if not len(start_times) == len(late_times) == len(end_times):
+                messagebox.showwarning("Ogohlantirish", f"{day} kuni uchun har bir darsning uchala vaqti kiritilishi kerak!")
+                return
+            sessions = [{"start": start, "late": late, "end": end}
+                        for start, late, end in zip(start_times, late_times, end_times)]
             try:
-                if start_time:
-                    datetime.strptime(start_time, "%H:%M")
-                if late_time:
-                    datetime.strptime(late_time, "%H:%M")
-                if end_time:
-                    datetime.strptime(end_time, "%H:%M")
-            except ValueError:
-                messagebox.showwarning("Ogohlantirish", f"{day} kuni uchun vaqt formati noto'g'ri! (HH:MM, masalan, 09:00)")
+                Schedule._parse_sessions(sessions, day)
+            except ValueError as e:
+                messagebox.showwarning("Ogohlantirish", f"{e} (HH:MM, masalan, 09:00)")
                 return
-            
-            if start_time and late_time and end_time:
-                schedule_data[day] = {
-                    "start": start_time,
-                    "late": late_time,
-                    "end": end_time
-                }
+            # Bitta darsli kunlar eski {start, late, end} ko'rinishida saqlanadi
+            schedule_data[day] = sessions[0] if len(sessions) == 1 else sessions
         
         if not schedule_data:
             messagebox.showwarning("Ogohlantirish", "Kamida bir kun uchun jadval kiritilishi kerak!")
@@ -369,6 +4048,8 @@ class AttendanceApp:
 
     def show_attendance_setup(self):
         """Davomat sozlamalari interfeysini ko'rsatish"""
+        # Foydalanuvchi sozlamalarni to'ldirayotganda modellar fonda yuklanadi
+        self.start_model_warmup()
         if self.current_frame:
             self.current_frame.destroy()
             
@@ -435,6 +4116,14 @@ class AttendanceApp:
         self.ip_entry.pack(fill="x", expand=True, padx=5)
         self.ip_entry.config(state="disabled")
         
+        extra_cam_frame = ttk.Frame(scrollable_frame)
+        extra_cam_frame.pack(fill="x", pady=5)
+        ttk.Label(extra_cam_frame, text="Qo'shimcha kameralar:", width=15).pack(side="left")
+        self.extra_cameras_entry = ttk.Entry(extra_cam_frame)
+        self.extra_cameras_entry.pack(fill="x", expand=True, padx=5)
+        ttk.Label(scrollable_frame, text="Vergul bilan ajrating, masalan: 1, rtsp://192.168.1.10/stream",
+                 font=("Helvetica", 8)).pack(anchor="w", padx=5)
+        
         ttk.Label(scrollable_frame, text="Kech qolish chegarasi:", font=("Helvetica", 12, "bold")).pack(pady=10)
         late_deadline_frame = ttk.Frame(scrollable_frame)
         late_deadline_frame.pack(fill="x", pady=5)
@@ -548,13 +4237,15 @@ class AttendanceApp:
             self.load_schedule()
 
     def load_schedule(self):
-        """Jadval faylini yuklash"""
+        """Jadval faylini yuklash va bir marta tahlil qilish"""
         try:
             with open(self.schedule_file, 'r') as f:
                 self.schedule_data = json.load(f)
+            self.schedule = Schedule.parse(self.schedule_data)
         except Exception as e:
             messagebox.showerror("Xato", f"Jadval faylini o'qishda xato: {e}")
             self.schedule_data = None
+            self.schedule = None
 
     def detect_available_cameras(self, max_index=3):
         """Mavjud kameralarni aniqlash"""
@@ -569,16 +4260,39 @@ class AttendanceApp:
                 pass
         return available_cameras
 
-    def calculate_statistics(self, distances):
-        """Masofalar statistikasini hisoblash"""
-        if not distances:
-            return 0.0, 0.0, 0.0
-        
-        mean = np.mean(distances)
-        variance = np.var(distances)
-        std_dev = np.sqrt(variance)
-        
-        return mean, variance, std_dev
+    def load_embedding_store(self, db_path):
+        """Baza vektorlarini yuklash, kerak bo'lsa suratlardan qurish"""
+        if not self.ensure_models():
+            return None
+        try:
+            return prepare_embedding_store(db_path, self.database, self.face_detection, self.embedder)
+        except Exception as e:
+            messagebox.showerror("Xato", f"Baza vektorlarini yuklashda xato: {e}")
+            return None
+
+    def close_process_recognizer(self):
+        """Jarayon ishchilarini to'xtatish"""
+        if self.process_recognizer:
+            self.process_recognizer.close()
+            self.process_recognizer = None
+
+    def start_process_recognizer(self):
+        """Sozlamada yoqilgan bo'lsa jarayon ishchilarini ishga tushirish.
+
+        Har bir ishchi modelni yuklagani uchun bu barcha kiritilgan
+        ma'lumotlar tekshirilgandan keyin, eng oxirida chaqiriladi.
+        """
+        self.close_process_recognizer()
+        if self.recognition_settings["process_workers"] <= 0:
+            return True
+        try:
+            self.process_recognizer = ProcessRecognizer(
+                self.db_select_var.get(), self.recognition_settings,
+                self.recognition_settings["process_workers"])
+        except Exception as e:
+            messagebox.showerror("Xato", f"Tanib olish jarayonlarini ishga tushirishda xato: {e}")
+            return False
+        return True
 
     def start_attendance(self):
         """Davomatni boshlash"""
@@ -587,12 +4301,18 @@ class AttendanceApp:
             return
             
         try:
-            with open(os.path.join(self.db_select_var.get(), "metadata.json"), 'r') as f:
-                self.database = json.load(f)
+            self.database = load_database_metadata(self.db_select_var.get())
+            self.database_path = self.db_select_var.get()
         except Exception as e:
             messagebox.showerror("Xato", f"Baza faylini yuklashda xato: {e}")
             return
-            
+
+        self.embedding_store = self.load_embedding_store(self.db_select_var.get())
+        if self.embedding_store is None:
+            return
+        self.matcher, self.embedding_cache = build_face_matcher(
+            self.db_select_var.get(), self.embedding_store, self.recognition_settings)
+
         camera_source = self.camera_choice.get()
         if camera_source == "IP Camera":
             camera_source = self.ip_entry.get().strip()
@@ -605,6 +4325,10 @@ class AttendanceApp:
             except:
                 messagebox.showerror("Xato", "Kamera tanlashda xato!")
                 return
+        camera_sources = [camera_source]
+        for extra in self.extra_cameras_entry.get().split(","):
+            if extra.strip():
+                camera_sources.append(parse_camera_source(extra))
 
         if self.mode_choice.get() == "manual":
             if self.late_deadline_choice.get() == "time":
@@ -646,22 +4370,41 @@ class AttendanceApp:
             if self.late_deadline >= self.deadline:
                 messagebox.showwarning("Xato", "Kech qolish chegarasi umumiy tugash vaqtidan oldin bo'lishi kerak!")
                 return
+            if not self.start_process_recognizer():
+                return
 
-            self.attendance_system(camera_source)
+            self.attendance_system(camera_sources)
         else:
-            if not self.schedule_file or not self.schedule_data:
+            if not self.schedule_file or not self.schedule:
                 messagebox.showwarning("Xato", "Jadval fayli tanlanmadi yoki noto'g'ri!")
                 return
+            if not self.start_process_recognizer():
+                return
             self.running = True
-            threading.Thread(target=self.run_scheduled_attendance, args=(camera_source,), daemon=True).start()
+            self.run_scheduled_attendance(camera_sources)
 
-    def run_scheduled_attendance(self, camera_source):
+    def run_scheduled_attendance(self, camera_sources):
         """Jadval bo'yicha davomatni boshqarish"""
+        self.scheduled_cameras = camera_sources
+        self.schedule_stop = threading.Event()
+        timer = ScheduleTimer(self.schedule, self.schedule_stop)
+
+        def schedule_loop():
+            # Fon oqimi faqat chegaralarni kutadi; oynalar asosiy oqimda UiChannel orqali ochiladi
+            for kind, window in timer.events():
+                self.ui.call(self.on_schedule_event, kind, window)
+
+        self.show_schedule_waiting()
+        threading.Thread(target=schedule_loop, name="schedule", daemon=True).start()
+
+    def show_schedule_waiting(self):
+        """Keyingi darsni kutish oynasi"""
         if self.current_frame:
             self.current_frame.destroy()
             
         self.current_frame = ttk.Frame(self.root)
         self.current_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        waiting_frame = self.current_frame
         
         ttk.Label(self.current_frame, text="Jadval bo'yicha kutish rejimi",
                  font=("Helvetica", 16, "bold")).pack(pady=10)
@@ -686,87 +4429,68 @@ class AttendanceApp:
                   command=self.stop_attendance).pack(pady=10)
         
         def update_timer():
-            while self.running:
-                current_time = datetime.now()
-                current_day = current_time.strftime("%A")
-                try:
-                    self.day_label.config(text=f"{current_day}")
-                except tk.TclError:
-                    self.running = False
-                    break
-                
-                if current_day in self.schedule_data:
-                    schedule_entry = self.schedule_data[current_day]
-                    start_time = datetime.strptime(schedule_entry["start"], "%H:%M").time()
-                    start_datetime = datetime.combine(current_time.date(), start_time)
-                    if current_time > start_datetime:
-                        start_datetime += timedelta(days=1)
-                    try:
-                        self.start_time_label.config(text=f"{start_datetime.strftime('%H:%M')}")
-                    except tk.TclError:
-                        self.running = False
-                        break
-                
-                try:
-                    self.current_time_label.config(text=f"{current_time.strftime('%H:%M:%S')}")
-                except tk.TclError:
-                    self.running = False
-                    break
-                
-                if current_day in self.schedule_data:
-                    schedule_entry = self.schedule_data[current_day]
-                    start_time = datetime.strptime(schedule_entry["start"], "%H:%M").time()
-                    start_datetime = datetime.combine(current_time.date(), start_time)
-                    if current_time > start_datetime:
-                        start_datetime += timedelta(days=1)
-                    seconds_to_wait = max(0, (start_datetime - current_time).total_seconds())
-                    minutes, seconds = divmod(int(seconds_to_wait), 60)
+            # Oyna almashgan yoki jadval to'xtatilgan bo'lsa taymer ham to'xtaydi
+            if not self.running or self.current_frame is not waiting_frame:
+                return
+            current_time = datetime.now()
+            window = self.schedule.next_window(current_time)
+            try:
+                self.day_label.config(text=current_time.strftime("%A"))
+                self.current_time_label.config(text=current_time.strftime("%H:%M:%S"))
+                if window:
+                    seconds_to_wait = max(0, int((window[0] - current_time).total_seconds()))
+                    minutes, seconds = divmod(seconds_to_wait, 60)
                     hours, minutes = divmod(minutes, 60)
-                    try:
-                        self.remaining_time_label.config(text=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
-                    except tk.TclError:
-                        self.running = False
-                        break
-                
-                self.root.after(1000, update_timer)
+                    self.start_time_label.config(text=window[0].strftime("%Y-%m-%d %H:%M"))
+                    self.remaining_time_label.config(text=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
+                else:
+                    self.start_time_label.config(text="Keyingi darslar yo'q")
+                    self.remaining_time_label.config(text="")
+            except tk.TclError:
                 return
+            self.root.after(1000, update_timer)
 
-        self.root.after(0, update_timer)
+        update_timer()
 
-        while self.running:
-            current_day = datetime.now().strftime("%A")
-            current_time = datetime.now()
-            
-            if current_day in self.schedule_data:
-                schedule_entry = self.schedule_data[current_day]
-                start_time = datetime.strptime(schedule_entry["start"], "%H:%M").time()
-                late_time = datetime.strptime(schedule_entry["late"], "%H:%M").time()
-                end_time = datetime.strptime(schedule_entry["end"], "%H:%M").time()
-                
-                start_datetime = datetime.combine(current_time.date(), start_time)
-                late_datetime = datetime.combine(current_time.date(), late_time)
-                end_datetime = datetime.combine(current_time.date(), end_time)
-                
-                if current_time > end_datetime:
-                    start_datetime += timedelta(days=1)
-                    late_datetime += timedelta(days=1)
-                    end_datetime += timedelta(days=1)
-                
-                if current_time < start_datetime:
-                    seconds_to_wait = (start_datetime - current_time).total_seconds()
-                    tm.sleep(seconds_to_wait)
-                
-                if start_datetime <= datetime.now() <= end_datetime:
-                    self.late_deadline = late_datetime
-                    self.deadline = end_datetime
-                    self.attendance_system(camera_source)
-                elif datetime.now() > end_datetime:
-                    self.start_surveillance(camera_source)
-            
-            tm.sleep(60)
+    def on_schedule_event(self, kind, window):
+        """Jadval chegarasi: dars boshlanishi, kech qolish chegarasi yoki tugashi (asosiy oqimda)"""
+        if self.schedule_stop is None or self.schedule_stop.is_set():
+            return
+        start, late, end = window
+        if kind == "start" and self.session is None and datetime.now() < end:
+            self.late_deadline = late
+            self.deadline = end
+            self.attendance_system(self.scheduled_cameras)
+            if self.session is None:
+                # Kameralar ochilmadi - keyingi darsni kutishda davom etiladi
+                self.show_schedule_waiting()
+        elif kind == "late" and self.session:
+            self.write_status_lines([f"{'='*50}\nKech qolish chegarasi: {late.strftime('%H:%M')}\n"])
+        elif kind == "end" and self.session:
+            self.finish_scheduled_session()
 
-    def attendance_system(self, camera_source):
-        """Davomat jarayonini boshqarish"""
+    def finish_scheduled_session(self):
+        """Dars tugaganda davomatni saqlab, keyingi darsni kutishga qaytish"""
+        if hasattr(self, 'timer_event'):
+            self.timer_event.set()
+        self.stop_pipelines()
+        if hasattr(self, 'attendance'):
+            self.save_attendance()
+        self.show_schedule_waiting()
+
+
+    def match_face_crops(self, faces):
+        """Tekislangan yuzlarni vektorga aylantirib bazadagi o'quvchilar bilan taqqoslash"""
+        # Boshqa jarayon yangi vektorlar versiyasini e'lon qilsa matcher almashtiriladi
+        snapshot = self.embedding_cache.poll() if self.embedding_cache else None
+        if snapshot is not None:
+            self.matcher = FaceMatcher.from_snapshot(snapshot, self.recognition_settings)
+        return match_face_crops(faces, self.embedder, self.matcher, self.process_recognizer)
+
+    def attendance_system(self, camera_sources):
+        """Davomat jarayonini boshqarish (bir yoki bir nechta kamera)"""
+        if not isinstance(camera_sources, (list, tuple)):
+            camera_sources = [camera_sources]
         if self.current_frame:
             self.current_frame.destroy()
             
@@ -774,183 +4498,140 @@ class AttendanceApp:
         self.current_frame.pack(fill="both", expand=True, padx=20, pady=20)
         
         self.running = True
-        self.cap = cv2.VideoCapture(camera_source)
-        
-        if not self.cap.isOpened():
-            messagebox.showerror("Xato", "Kamera ochilmadi!")
+        resumed = self.recover_attendance_journal() if self.recognition_settings["journal"] else None
+        if resumed:
+            self.late_deadline = datetime.fromisoformat(resumed[1]["late_deadline"])
+            self.deadline = datetime.fromisoformat(resumed[1]["deadline"])
+        self.session = AttendanceSession(self.database, self.match_face_crops, self.recognition_settings,
+                                         self.late_deadline, self.deadline,
+                                         on_recorded=self.update_status_text)
+        # Birinchi kelgan o'quvchilar sekin birinchi chaqiruv tufayli kech yozilmasligi uchun
+        self.session.warm_up(lambda: warm_up_recognizer(self.embedder, self.process_recognizer))
+        failed = self.session.open_cameras(camera_sources)
+        if failed is not None:
+            self.session = None
+            messagebox.showerror("Xato", f"Kamera ochilmadi! ({failed})")
             self.show_attendance_section()
             return
+        self.filename = attendance_filename()
+        self.journal_path = None
+        try:
+            if resumed:
+                self.filename = os.path.splitext(resumed[0])[0] + ".xlsx"
+                self.session.attach_journal(AttendanceJournal.resume(resumed[0]), resumed[2])
+                self.journal_path = resumed[0]
+            elif self.recognition_settings["journal"]:
+                self.journal_path = journal_filename(self.filename)
+                self.session.attach_journal(AttendanceJournal.create(
+                    self.journal_path, self.db_select_var.get(), self.late_deadline, self.deadline))
+        except OSError as e:
+            self.journal_path = None
+            messagebox.showerror("Xato", f"Davomat jurnalini ochishda xato: {e}")
+        self.attendance = self.session.attendance
             
-        self.attendance = {
-            name: {
-                "surname": data["surname"],
-                "father_name": data["father_name"],
-                "faculty": data["faculty"],
-                "direction": data["direction"],
-                "group": data["group"],
-                "status": "Kelmagan",
-                "arrival_time": None,
-                "late_time": None,
-                "recorded": False,
-                "distances": [],
-                "probability": 0.0,
-                "mean_distance": 0.0,
-                "variance": 0.0,
-                "std_dev": 0.0
-            } 
-            for name, data in self.database.items()
-        }
-        
         ttk.Label(self.current_frame, text="Davomat Davom Etmoqda...",
                  font=("Helvetica", 16, "bold")).pack(pady=10)
         
         self.time_label = ttk.Label(self.current_frame, text="", font=("Helvetica", 12))
         self.time_label.pack(pady=5)
         
-        # Video display in Tkinter
-        self.video_label = tk.Label(self.current_frame)
-        self.video_label.pack(pady=10)
+        # Video display in Tkinter: har bir kamera uchun alohida oyna
+        videos_frame = ttk.Frame(self.current_frame)
+        videos_frame.pack(pady=10)
+        self.video_labels = []
+        self.preview_renderers = []
+        columns = 1 if len(camera_sources) == 1 else 2
+        self.video_display_size = (640, 480) if len(camera_sources) == 1 else (320, 240)
+        for i in range(len(camera_sources)):
+            label = tk.Label(videos_frame)
+            label.grid(row=i // columns, column=i % columns, padx=2, pady=2)
+            self.video_labels.append(label)
+            # Kadrlar tezligini oqimning o'zi (preview_fps) cheklaydi
+            self.preview_renderers.append(PreviewRenderer(self.ui, label, self.video_display_size))
         
         self.status_text = tk.Text(self.current_frame, height=10, width=80)
         self.status_text.pack(pady=10)
         
+        self.pipeline_label = ttk.Label(self.current_frame, text="", font=("Helvetica", 9), justify="left")
+        self.pipeline_label.pack(pady=2)
+        
+        # Ixtiyoriy unumdorlik paneli: bosqichlar kechikishi va hisoblagichlar
+        self.profile_visible = tk.BooleanVar(value=bool(self.recognition_settings["profile_panel"]))
+        ttk.Checkbutton(self.current_frame, text="Unumdorlik paneli", variable=self.profile_visible,
+                        command=self.toggle_profile_panel).pack(pady=2)
+        profile_frame = ttk.Frame(self.current_frame)
+        profile_frame.pack()
+        self.profile_text = tk.Text(profile_frame, height=12, width=90, font=("Courier", 9), state="disabled")
+        self.toggle_profile_panel()
+        
         ttk.Button(self.current_frame, text="Yakunlash",
                   command=self.stop_attendance).pack(pady=10)
         
         self.timer_event = threading.Event()
-        self.video_event = threading.Event()
 
         def update_timer():
             while self.running and not self.timer_event.is_set():
                 current_time = datetime.now()
                 if current_time >= self.deadline:
-                    self.stop_attendance()
+                    # Jadval rejimida darsni ScheduleTimer'ning "end" hodisasi yakunlaydi
+                    if self.schedule_stop is None:
+                        self.ui.call(self.stop_attendance)
                     break
                 remaining_time = self.deadline - current_time
                 minutes, seconds = divmod(remaining_time.seconds, 60)
-                try:
-                    self.time_label.config(text=f"Davomat tugashiga qolgan vaqt: {minutes:02d}:{seconds:02d}")
-                except tk.TclError:
-                    self.running = False
-                    break
+                session = self.session
+                status = session.status_text() if session else None
+                profile = format_profile(session.profile()) if session and self.profile_panel_on else None
+                self.ui.post("attendance_timer", self.show_attendance_timer,
+                             f"Davomat tugashiga qolgan vaqt: {minutes:02d}:{seconds:02d}", status, profile)
                 self.timer_event.wait(1)
 
-        def video_loop():
-            while self.running and not self.video_event.is_set():
-                if not self.cap or not self.cap.isOpened():
-                    self.root.after(0, lambda: messagebox.showerror("Xato", "Kamera uzildi! Davomat to'xtatildi."))
-                    self.stop_attendance()
-                    break
-                    
-                ret, frame = self.cap.read()
-                if not ret:
-                    self.root.after(0, lambda: messagebox.showerror("Xato", "Kamera o'qishda xato! Davomat to'xtatildi."))
-                    self.stop_attendance()
-                    break
-                    
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = self.face_detection.process(rgb_frame)
-                
-                current_time = datetime.now()
-                if results.detections:
-                    for detection in results.detections:
-                        bbox = detection.location_data.relative_bounding_box
-                        h, w, _ = frame.shape
-                        x, y = int(bbox.xmin * w), int(bbox.ymin * h)
-                        width, height = int(bbox.width * w), int(bbox.height * h)
-                        
-                        face_img = frame[y:y+height, x:x+width]
-                        if face_img.size == 0:
-                            continue
-                            
-                        name = "Nomalum"
-                        color = (0, 0, 255)
-                        status = ""
-                        max_probability = 0.0
-                        best_match_name = None
-                        best_distance = float('inf')
-                        
-                        if self.arcface_model:
-                            for person_name, person_data in self.database.items():
-                                image_folder = person_data["image_folder"]
-                                for img_file in os.listdir(image_folder):
-                                    ref_img_path = os.path.join(image_folder, img_file)
-                                    try:
-                                        result = DeepFace.verify(face_img, ref_img_path, 
-                                                                model=self.arcface_model, 
-                                                                enforce_detection=False)
-                                        distance = result["distance"]
-                                        probability = 1 - distance
-                                        if probability > max_probability and probability > 0.5:
-                                            max_probability = probability
-                                            best_match_name = person_name
-                                            best_distance = distance
-                                            self.attendance[person_name]["distances"].append(distance)
-                                            mean, variance, std_dev = self.calculate_statistics(
-                                                self.attendance[person_name]["distances"])
-                                            self.attendance[person_name]["probability"] = probability
-                                            self.attendance[person_name]["mean_distance"] = mean
-                                            self.attendance[person_name]["variance"] = variance
-                                            self.attendance[person_name]["std_dev"] = std_dev
-                                    except Exception as e:
-                                        print(f"Yuz taqqoslashda xato: {e}")
-                                        continue
-                        
-                        if best_match_name:
-                            name = best_match_name
-                            if not self.attendance[name]["recorded"]:
-                                if current_time <= self.late_deadline:
-                                    self.attendance[name]["status"] = "Kelgan"
-                                    self.attendance[name]["arrival_time"] = current_time.strftime("%H:%M:%S")
-                                else:
-                                    self.attendance[name]["status"] = "Kech qolgan"
-                                    self.attendance[name]["late_time"] = current_time.strftime("%H:%M:%S")
-                                self.attendance[name]["recorded"] = True
-                                self.update_status_text(
-                                    name, 
-                                    self.attendance[name]["status"],
-                                    self.attendance[name]["probability"],
-                                    self.attendance[name]["mean_distance"],
-                                    self.attendance[name]["variance"],
-                                    self.attendance[name]["std_dev"]
-                                )
-                            status = self.attendance[name]["status"]
-                            probability = self.attendance[name]["probability"]
-                            if status == "Kelgan":
-                                color = (0, 255, 0)
-                            elif status == "Kech qolgan":
-                                color = (255, 165, 0)
-                            
-                            cv2.rectangle(frame, (x, y), (x + width, y + height), color, 2)
-                            cv2.putText(frame, f"{name} ({status}, {probability:.2%})", 
-                                       (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-                
-                # Convert frame to Tkinter-compatible format
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(frame_rgb)
-                img = img.resize((640, 480), Image.LANCZOS)  # Resize for display
-                imgtk = ImageTk.PhotoImage(image=img)
-                
-                # Update video label in main thread
-                self.root.after(0, lambda: self.video_label.config(image=imgtk))
-                self.video_label.imgtk = imgtk  # Keep reference to avoid garbage collection
-                
-                try:
-                    self.root.update()
-                except tk.TclError:
-                    self.running = False
-                    break
-                
-                # Small delay to avoid overloading
-                self.video_event.wait(0.03)  # ~30 FPS
-        
-            if self.cap:
-                self.cap.release()
-            self.cap = None
-        
-        threading.Thread(target=video_loop, daemon=True).start()
+        self.session.start(
+            self.process_recognizer.workers if self.process_recognizer
+            else self.recognition_settings["recognition_workers"],
+            face_detection=self.face_detection, on_frame=self.show_video_frame,
+            on_error=self.on_pipeline_error)
         threading.Thread(target=update_timer, daemon=True).start()
 
+    def show_attendance_timer(self, time_text, status, profile):
+        """Taymer, oqimlar holati va unumdorlik panelini yangilash (asosiy oqimda)"""
+        if not self.running:
+            return
+        self.time_label.config(text=time_text)
+        if status is not None:
+            self.pipeline_label.config(text=status)
+        if profile is not None and self.profile_visible.get():
+            self.profile_text.config(state="normal")
+            self.profile_text.delete("1.0", tk.END)
+            self.profile_text.insert(tk.END, profile)
+            self.profile_text.config(state="disabled")
+
+    def toggle_profile_panel(self):
+        """Unumdorlik panelini ko'rsatish yoki yashirish"""
+        # Taymer oqimi Tk o'zgaruvchisini emas, shu oddiy bayroqni o'qiydi
+        self.profile_panel_on = self.profile_visible.get()
+        if self.profile_visible.get():
+            self.profile_text.pack(pady=2)
+        else:
+            self.profile_text.pack_forget()
+
+    def show_video_frame(self, index, frame):
+        """Chizilgan kadrni Tkinter oynasida ko'rsatish"""
+        session = self.session
+        started = tm.perf_counter()
+        if self.preview_renderers[index].submit(frame) and session:
+            session.stats.record("preview", tm.perf_counter() - started)
+
+    def on_pipeline_error(self, pipeline, message):
+        """Kamera xatosida davomatni to'xtatish (boshqa kameralar ishlayotgan bo'lsa davom etish)"""
+        session = self.session
+        if session and any(p is not pipeline and p.running for p in session.pipelines):
+            self.ui.call(messagebox.showwarning, "Ogohlantirish",
+                         f"{pipeline.name}: {message} Qolgan kameralar bilan davom etilmoqda.")
+            return
+        self.ui.call(messagebox.showerror, "Xato", f"{message} Davomat to'xtatildi.")
+        self.ui.call(self.stop_attendance)
+
     def start_surveillance(self, camera_source):
         """Video kuzatuv rejimini boshqarish"""
         if self.current_frame:
@@ -970,6 +4651,8 @@ class AttendanceApp:
         
         self.video_label = tk.Label(self.current_frame)
         self.video_label.pack(pady=10)
+        renderer = PreviewRenderer(self.ui, self.video_label, (640, 480),
+                                   max_fps=self.recognition_settings["preview_fps"])
         
         ttk.Button(self.current_frame, text="To'xtatish",
                   command=self.stop_attendance).pack(pady=10)
@@ -979,33 +4662,18 @@ class AttendanceApp:
         def surveillance_loop():
             while self.running and not self.surveillance_event.is_set():
                 if not self.cap or not self.cap.isOpened():
-                    self.root.after(0, lambda: messagebox.showerror("Xato", "Kamera uzildi! Kuzatuv to'xtatildi."))
-                    self.stop_attendance()
+                    self.ui.call(messagebox.showerror, "Xato", "Kamera uzildi! Kuzatuv to'xtatildi.")
+                    self.ui.call(self.stop_attendance)
                     break
                     
                 ret, frame = self.cap.read()
                 if not ret:
-                    self.root.after(0, lambda: messagebox.showerror("Xato", "Kamera o'qishda xato! Kuzatuv to'xtatildi."))
-                    self.stop_attendance()
+                    self.ui.call(messagebox.showerror, "Xato", "Kamera o'qishda xato! Kuzatuv to'xtatildi.")
+                    self.ui.call(self.stop_attendance)
                     break
                     
-                # Convert frame to Tkinter-compatible format
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(frame_rgb)
-                img = img.resize((640, 480), Image.LANCZOS)
-                imgtk = ImageTk.PhotoImage(image=img)
-                
-                # Update video label in main thread
-                self.root.after(0, lambda: self.video_label.config(image=imgtk))
-                self.video_label.imgtk = imgtk
-                
-                try:
-                    self.root.update()
-                except tk.TclError:
-                    self.running = False
-                    break
-                
-                self.surveillance_event.wait(0.03)  # ~30 FPS
+                # Kamera to'liq tezlikda o'qiladi, oynaga preview_fps dan tez chizilmaydi
+                renderer.submit(frame)
             
             if self.cap:
                 self.cap.release()
@@ -1014,31 +4682,35 @@ class AttendanceApp:
         threading.Thread(target=surveillance_loop, daemon=True).start()
 
     def update_status_text(self, name, status, probability, mean_distance, variance, std_dev):
-        """Holatni matn maydonida yangilash"""
-        try:
-            if self.status_text and self.running:
-                self.status_text.config(state="normal")
-                self.status_text.insert(tk.END, f"{'='*50}\n")
-                self.status_text.insert(tk.END, 
-                    f"{name}: {status} ({datetime.now().strftime('%H:%M:%S')})\n"
-                    f"  Ehtimollik: {probability:.2%}\n"
-                    f"  O'rtacha masofa: {mean_distance:.4f}\n"
-                    f"  Dispersiya: {variance:.4f}\n"
-                    f"  Kvadrat chetlanish: {std_dev:.4f}\n\n"
-                    f"{'-'*30}\n"
-                )
-                self.status_text.config(state="disabled")
-                self.status_text.see(tk.END)
-        except tk.TclError:
-            pass
+        """Holat qatorini matn maydoniga yuborish (tanib olish ishchilaridan chaqiriladi)"""
+        self.ui.append("status_text", self.write_status_lines,
+            f"{'='*50}\n"
+            f"{name}: {status} ({datetime.now().strftime('%H:%M:%S')})\n"
+            f"  Ehtimollik: {probability:.2%}\n"
+            f"  O'rtacha masofa: {mean_distance:.4f}\n"
+            f"  Dispersiya: {variance:.4f}\n"
+            f"  Kvadrat chetlanish: {std_dev:.4f}\n\n"
+            f"{'-'*30}\n"
+        )
+
+    def write_status_lines(self, lines):
+        """Yig'ilgan holat qatorlarini bitta kiritish bilan yozish (asosiy oqimda)"""
+        if self.status_text and self.running:
+            self.status_text.config(state="normal")
+            self.status_text.insert(tk.END, "".join(lines))
+            self.status_text.config(state="disabled")
+            self.status_text.see(tk.END)
 
     def stop_attendance(self):
         """Davomatni to'xtatish"""
         self.running = False
+        if self.schedule_stop:
+            self.schedule_stop.set()
+            self.schedule_stop = None
         if hasattr(self, 'timer_event'):
             self.timer_event.set()
-        if hasattr(self, 'video_event'):
-            self.video_event.set()
+        self.stop_pipelines()
+        self.close_process_recognizer()
         if hasattr(self, 'surveillance_event'):
             self.surveillance_event.set()
         if self.cap:
@@ -1055,33 +4727,59 @@ class AttendanceApp:
         else:
             self.create_main_interface()
 
+    def stop_pipelines(self):
+        """Barcha kamera oqimlari va umumiy tanib olish ishchilarini to'xtatish"""
+        session, self.session = self.session, None
+        if session:
+            session.stop()
+            self.session_profile = session.profile()
+
+    def recover_attendance_journal(self):
+        """Yakunlanmagan davomat jurnalini tiklashni taklif qilish.
+
+        Faqat tanlangan bazaning jurnallari ko'riladi. Tugash vaqti o'tmagan eng
+        yangi jurnal tanlansa (yo'l, start yozuvi, yozuvlar) qaytariladi; qolgan
+        jurnallardan Excel yaratilib, ular yakunlanadi.
+        """
+        resumable = None
+        for path, start, records in find_unfinished_journals(self.db_select_var.get()):
+            deadline = datetime.fromisoformat(start["deadline"])
+            if resumable is None and deadline > datetime.now() and messagebox.askyesno(
+                    "Davomatni tiklash",
+                    f"Yakunlanmagan davomat topildi ({os.path.basename(path)}, "
+                    f"tugash {deadline.strftime('%H:%M')}). Davom ettirilsinmi?"):
+                resumable = (path, start, records)
+                continue
+            try:
+                finalize_journal(path, self.database)
+            except Exception as e:
+                messagebox.showerror("Xato", f"Davomat jurnalini saqlashda xato: {e}")
+        return resumable
+
     def save_attendance(self):
-        """Davomat ma'lumotlarini saqlash"""
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        self.filename = f"attendance_{timestamp}.xlsx"
-        df = pd.DataFrame([
-            {
-                "Ism": name,
-                "Familiya": data["surname"],
-                "Otasining ismi": data["father_name"],
-                "Fakultet": data["faculty"],
-                "Yo'nalish": data["direction"],
-                "Guruh": data["group"],
-                "Holati": data["status"],
-                "Kelgan vaqti": data["arrival_time"],
-                "Kech qolgan vaqti": data["late_time"],
-                "Ehtimollik": f"{data['probability']:.2%}" if data["probability"] > 0 else None,
-                "O'rtacha masofa": f"{data['mean_distance']:.4f}" if data["mean_distance"] > 0 else None,
-                "Dispersiya": f"{data['variance']:.4f}" if data["variance"] > 0 else None,
-                "Kvadrat chetlanish": f"{data['std_dev']:.4f}" if data["std_dev"] > 0 else None
-            }
-            for name, data in self.attendance.items()
-        ])
+        """Davomat ma'lumotlarini saqlash (jurnal yoqilgan bo'lsa Excel jurnaldan yaratiladi)"""
+        journal_path, self.journal_path = self.journal_path, None
+        if not journal_path:
+            self.filename = attendance_filename()
         try:
-            df.to_excel(self.filename, index=False)
+            if journal_path:
+                export_journal(journal_path, self.database, self.filename)
+            else:
+                write_attendance_excel(self.attendance, self.filename)
             self.attendance_data = self.attendance
         except Exception as e:
             messagebox.showerror("Xato", f"Davomat faylini saqlashda xato: {e}")
+        if self.database_path:
+            try:
+                record_attendance_history(self.database_path, self.filename, self.attendance, self.deadline.date())
+            except Exception as e:
+                messagebox.showerror("Xato", f"Davomat tarixini yozishda xato: {e}")
+        if self.recognition_settings["profile_export"] and self.session_profile:
+            try:
+                write_profile(self.session_profile, os.path.splitext(self.filename)[0])
+            except Exception as e:
+                messagebox.showerror("Xato", f"Unumdorlik profilini saqlashda xato: {e}")
+        self.session_profile = None
 
     def show_email_contact_selection(self):
         """Email yuborish uchun kontakt tanlash interfeysini ko'rsatish"""
@@ -1161,7 +4859,8 @@ class AttendanceApp:
             
             progress_label = ttk.Label(self.current_frame, text="Email yuborilmoqda...", font=("Helvetica", 12))
             progress_label.pack(pady=5)
-            self.root.update()
+            # Faqat chizish: SMTP kutilayotganda foydalanuvchi hodisalari qayta ishlanmaydi
+            self.root.update_idletasks()
             
             server = smtplib.SMTP(smtp_server, smtp_port)
             server.starttls()
@@ -1194,10 +4893,10 @@ class AttendanceApp:
         
         summary_text.insert(tk.END, "=== Davomat Yakuni ===\n\n")
         summary_text.insert(tk.END, "Kelganlar:\n")
-        for name, data in self.attendance.items():
+        for data in self.attendance.values():
             if data["status"] == "Kelgan":
                 summary_text.insert(tk.END, 
-                    f"- {name} {data['surname']} {data['father_name']} "
+                    f"- {data['name']} {data['surname']} {data['father_name']} "
                     f"({data['faculty']}, {data['direction']}, {data['group']}) - "
                     f"{data['arrival_time']}\n"
                     f"  Ehtimollik: {data['probability']:.2%}\n"
@@ -1207,10 +4906,10 @@ class AttendanceApp:
                 )
         
         summary_text.insert(tk.END, "\nKech qolganlar:\n")
-        for name, data in self.attendance.items():
+        for data in self.attendance.values():
             if data["status"] == "Kech qolgan":
                 summary_text.insert(tk.END, 
-                    f"- {name} {data['surname']} {data['father_name']} "
+                    f"- {data['name']} {data['surname']} {data['father_name']} "
                     f"({data['faculty']}, {data['direction']}, {data['group']}) - "
                     f"{data['late_time']}\n"
                     f"  Ehtimollik: {data['probability']:.2%}\n"
@@ -1220,10 +4919,10 @@ class AttendanceApp:
                 )
         
         summary_text.insert(tk.END, "\nKelmaganlar:\n")
-        for name, data in self.attendance.items():
+        for data in self.attendance.values():
             if data["status"] == "Kelmagan":
                 summary_text.insert(tk.END, 
-                    f"- {name} {data['surname']} {data['father_name']} "
+                    f"- {data['name']} {data['surname']} {data['father_name']} "
                     f"({data['faculty']}, {data['direction']}, {data['group']})\n"
                 )
         
@@ -1468,7 +5167,8 @@ class AttendanceApp:
             
             progress_label = ttk.Label(self.current_frame, text="Email yuborilmoqda...", font=("Helvetica", 12))
             progress_label.pack(pady=5)
-            self.root.update()
+            # Faqat chizish: SMTP kutilayotganda foydalanuvchi hodisalari qayta ishlanmaydi
+            self.root.update_idletasks()
             
             server = smtplib.SMTP(smtp_server, smtp_port)
             server.starttls()
@@ -1492,6 +5192,285 @@ class AttendanceApp:
         except Exception as e:
             print(f"Ilova ishga tushirishda xato: {e}")
 
+def run_ann_benchmark(args):
+    """ANN indeksining recall@1 benchmarkini konsolda chiqarish"""
+    if args.db:
+        store = EmbeddingStore(args.db).load()
+        embeddings, labels = store.embeddings, store.labels
+    else:
+        embeddings, labels = synthetic_embeddings(args.identities)
+    print(f"Vektorlar: {len(embeddings)}, o'quvchilar: {len(np.unique(labels))}")
+    print(f"{'Backend':<22}{'nprobe':>8}{'recall@1':>12}{'ms/query':>12}")
+    for row in benchmark_ann(embeddings, labels, nlist=args.nlist):
+        nprobe = "-" if row["nprobe"] is None else row["nprobe"]
+        print(f"{row['backend']:<22}{nprobe:>8}{row['recall@1']:>12.4f}{row['ms_per_query']:>12.3f}")
+
+
+def run_replay_benchmark(args):
+    """Yozilgan yoki sun'iy video bo'yicha end-to-end benchmarkni konsolda chiqarish"""
+    settings = read_recognition_settings(args.settings)
+    sizes = [int(size) for size in str(args.db_sizes).split(",") if size.strip()]
+    face_detection = create_face_detector()
+    embedder = FaceEmbedder(build_arcface_model(), settings["max_batch_size"])
+    database = {}
+    embeddings = np.zeros((0, ARCFACE_EMBEDDING_DIM), dtype=np.float32)
+    labels = np.array([], dtype=str)
+    face_images = []
+    if args.db:
+        database = load_database_metadata(args.db)
+        store = prepare_embedding_store(args.db, database, face_detection, embedder)
+        embeddings, labels = store.embeddings, store.labels
+        # Sun'iy video uchun har bir o'quvchining bitta surati
+        _, first_rows = np.unique(store.labels, return_index=True)
+        face_images = [cv2.imread(os.path.join(args.db, str(store.sources[row]))) for row in first_rows]
+    if not args.replay and not args.synthetic_frames:
+        print("--replay VIDEO yoki --synthetic-frames N (--db bilan) kerak!")
+        return 2
+    if args.synthetic_frames and not face_images:
+        print("Sun'iy video uchun suratli baza (--db) kerak!")
+        return 2
+
+    results = []
+    for size in sizes:
+        run_embeddings, run_labels = embeddings, labels
+        if size:
+            extra_embeddings, extra_labels = synthetic_embeddings(size)
+            run_embeddings = np.concatenate([embeddings, extra_embeddings]).astype(np.float32)
+            run_labels = np.concatenate([labels.astype(str), extra_labels])
+        matcher = FaceMatcher.from_arrays(run_embeddings, run_labels, settings)
+        sources = [parse_camera_source(path) for path in args.replay or []]
+        if args.synthetic_frames:
+            sources.append(SyntheticVideo(face_images, args.synthetic_frames))
+        # Har bir o'lchamda embedder va aniqlagich bir xil, faqat baza o'zgaradi
+        result = benchmark_replay(sources, database,
+                                  lambda faces, matcher=matcher: match_face_crops(faces, embedder, matcher),
+                                  settings, face_detection=face_detection, warm_up=embedder.warm_up)
+        result["db_vectors"] = len(run_labels)
+        result["db_identities"] = len(np.unique(run_labels))
+        results.append(result)
+        rss = "-" if result["peak_rss_mb"] is None else f"{result['peak_rss_mb']:.0f} MB"
+        print(f"Baza: {result['db_identities']} o'quvchi ({result['db_vectors']} vektor) | "
+              f"{result['frames']} kadr, {result['frames_per_s']:.1f} kadr/s, {result['faces_per_s']:.1f} yuz/s | "
+              f"eng katta RSS: {rss}")
+        print(f"  {'Bosqich':<36}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, entry in result["stages"].items():
+            print(f"  {stage:<36}{entry['p50_ms']:>10.1f}{entry['p95_ms']:>10.1f}{entry['p99_ms']:>10.1f}")
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=4, default=float)
+        print(f"Natijalar saqlandi: {args.json_out}")
+    return 0
+
+
+def run_headless(args):
+    """Tkinter'siz davomat rejimini konsoldan ishga tushirish"""
+    if not args.db or not args.camera:
+        print("Headless rejim uchun --db va --camera kerak!")
+        return 2
+    schedule = None
+    if args.schedule:
+        try:
+            with open(args.schedule, 'r') as f:
+                schedule = Schedule.parse(json.load(f))
+        except Exception as e:
+            print(f"Jadval faylini yuklashda xato: {e}")
+            return 2
+    elif not args.late or not args.deadline:
+        print("Qo'lda rejim uchun --late va --deadline kerak (HH:MM yoki daqiqalar)!")
+        return 2
+    else:
+        try:
+            late_deadline = parse_deadline(args.late)
+            deadline = parse_deadline(args.deadline)
+        except ValueError as e:
+            print(f"Vaqt noto'g'ri: {e}")
+            return 2
+
+    settings = read_recognition_settings(args.settings)
+    try:
+        runner = HeadlessAttendance(args.db, [parse_camera_source(c) for c in args.camera],
+                                    settings, output_dir=args.output_dir)
+    except Exception as e:
+        print(f"Bazani yoki modelni yuklashda xato: {e}")
+        return 1
+    # Ctrl+C yoki xizmatni to'xtatish signali joriy davomatni saqlab chiqadi
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: runner.stop())
+    try:
+        if schedule is not None:
+            runner.run_schedule(schedule)
+        else:
+            runner.run_manual(late_deadline, deadline)
+    except (RuntimeError, ValueError) as e:
+        print(e)
+        return 1
+    finally:
+        runner.close()
+    return 0
+
+
+def run_rooms(args):
+    """Ko'p xonali jadval rejimini konfiguratsiya faylidan ishga tushirish"""
+    try:
+        rooms, status_file, status_interval = read_rooms_config(args.rooms)
+    except (OSError, ValueError) as e:
+        print(f"Xonalar konfiguratsiyasini yuklashda xato: {e}")
+        return 2
+    settings = read_recognition_settings(args.settings)
+    try:
+        manager = RoomManager(rooms, settings, status_file=status_file, status_interval=status_interval)
+    except Exception as e:
+        print(f"Bazani yoki modelni yuklashda xato: {e}")
+        return 1
+    # Ctrl+C yoki xizmatni to'xtatish signali barcha xonalar davomatini saqlab chiqadi
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: manager.stop())
+    try:
+        manager.run()
+    finally:
+        manager.close()
+    return 0
+
+
+def run_export_journal(args):
+    """Davomat jurnalidan Excel hisobotni talab bo'yicha yaratish"""
+    if not args.db:
+        print("Jurnalni eksport qilish uchun --db kerak!")
+        return 2
+    try:
+        filename = export_journal(args.export_journal, load_database_metadata(args.db))
+    except Exception as e:
+        print(f"Jurnalni eksport qilishda xato: {e}")
+        return 1
+    print(f"Davomat saqlandi: {filename}")
+    return 0
+
+
+def run_import(args):
+    """Papka yoki CSV dan o'quvchilarni ommaviy ro'yxatga olish"""
+    if not args.db:
+        print("Import uchun --db kerak!")
+        return 2
+    try:
+        if os.path.isdir(args.import_path):
+            students = read_import_tree(args.import_path, args.faculty or "", args.direction or "")
+        else:
+            students = read_import_csv(args.import_path)
+    except (OSError, ValueError) as e:
+        print(f"Import manbasini o'qishda xato: {e}")
+        return 2
+    settings = read_recognition_settings(args.settings)
+    try:
+        embedder = FaceEmbedder(build_arcface_model(), settings["max_batch_size"])
+    except Exception as e:
+        print(f"Modelni yuklashda xato: {e}")
+        return 1
+    quality_gate = FaceQualityGate.from_settings(settings) if settings["quality_gate"] else None
+
+    def progress(done, total, seconds):
+        print(f"\r{done}/{total} surat, {done / max(seconds, 1e-6):.1f} surat/s", end="", flush=True)
+
+    report = bulk_import(args.db, students, embedder, workers=args.workers, min_images=args.min_images,
+                         quality_gate=quality_gate, progress=progress)
+    print()
+    if report["imported"]:
+        # Ishlab turgan sessiyalar va ishchilar yangi versiyaga o'zi o'tadi
+        version = publish_embedding_cache(args.db, EmbeddingStore(args.db).load(), settings)
+        if version:
+            print(f"Vektorlar keshi yangilandi: {version}")
+    for image_path, reason in report["rejected_images"]:
+        print(f"Rad etildi: {image_path} - {reason}")
+    for label, reason in report["rejected_students"].items():
+        print(f"Qo'shilmadi: {label} - {reason}")
+    print(f"Qo'shildi: {len(report['imported'])}, allaqachon bazada: {len(report['skipped'])}, "
+          f"qo'shilmadi: {len(report['rejected_students'])}, rad etilgan suratlar: "
+          f"{len(report['rejected_images'])} ({report['seconds']:.1f} s)")
+    return 0
+
+
+def run_history(args):
+    """Baza davomat tarixi bo'yicha o'quvchilar kesimidagi hisobot"""
+    if not args.db:
+        print("Davomat tarixi uchun --db kerak!")
+        return 2
+    try:
+        since = datetime.strptime(args.since, "%Y-%m-%d").date() if args.since else None
+        until = datetime.strptime(args.until, "%Y-%m-%d").date() if args.until else None
+    except ValueError as e:
+        print(f"Sana noto'g'ri (YYYY-MM-DD): {e}")
+        return 2
+    try:
+        load_database_metadata(args.db)
+        with closing(StudentDatabase.open(args.db)) as db:
+            rows = db.attendance_counts(status=args.status, group=args.group, since=since, until=until)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Davomat tarixini o'qishda xato: {e}")
+        return 1
+    print(f"{'Ism familiya':<30} {'Guruh':<12} {'Soni':>6}")
+    for key, name, surname, group, count in rows:
+        # Bir xil ismli o'quvchilar kaliti familiyani allaqachon o'z ichiga oladi
+        label = f"{name} {surname or ''}".strip() if key == name else key
+        print(f"{label:<30} {group or '':<12} {count:>6}")
+    return 0
+
+
 if __name__ == "__main__":
-    app = AttendanceApp()
-    app.run()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Davomat Tizimi")
+    parser.add_argument("--ann-benchmark", action="store_true",
+                        help="ANN indeksi recall@1 benchmarkini ishga tushirish")
+    parser.add_argument("--db", help="Baza papkasi (embeddings.npy joylashgan)")
+    parser.add_argument("--identities", type=int, default=10000,
+                        help="Sun'iy benchmark uchun o'quvchilar soni")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF klasterlari soni (0 - avtomatik)")
+    parser.add_argument("--headless", action="store_true",
+                        help="Oynasiz davomat (--db, --camera va --late/--deadline yoki --schedule bilan)")
+    parser.add_argument("--camera", action="append",
+                        help="Kamera indeksi yoki IP kamera URL manzili (bir necha marta berish mumkin)")
+    parser.add_argument("--late", help="Kech qolish chegarasi: HH:MM yoki daqiqalar soni")
+    parser.add_argument("--deadline", help="Davomat tugash vaqti: HH:MM yoki daqiqalar soni")
+    parser.add_argument("--schedule", help="Jadval JSON fayli (jadval rejimi)")
+    parser.add_argument("--rooms", help="Ko'p xonali jadval rejimi: xonalar konfiguratsiyasi JSON fayli")
+    parser.add_argument("--output-dir", default="", help="Davomat Excel fayllari papkasi")
+    parser.add_argument("--settings", default="recognition_settings.json",
+                        help="Tanib olish sozlamalari fayli")
+    parser.add_argument("--replay", action="append",
+                        help="Benchmark uchun yozilgan video fayl (bir necha marta berish mumkin)")
+    parser.add_argument("--synthetic-frames", type=int, default=0,
+                        help="Bazadagi suratlardan sun'iy video kadrlari soni (--db bilan)")
+    parser.add_argument("--db-sizes", default="0",
+                        help="Bazaga qo'shiladigan sun'iy o'quvchilar soni, vergul bilan (masalan 0,1000,10000)")
+    parser.add_argument("--json-out", help="Benchmark natijalarini JSON faylga yozish")
+    parser.add_argument("--export-journal", help="Davomat jurnalidan (.jsonl) Excel yaratish (--db bilan)")
+    parser.add_argument("--import", dest="import_path",
+                        help="O'quvchilarni ommaviy qo'shish: <guruh>/<Ism_Familiya>/ papkasi yoki CSV (--db bilan)")
+    parser.add_argument("--workers", type=int, default=4, help="Import ishchilari soni")
+    parser.add_argument("--min-images", type=int, default=4, help="O'quvchi uchun kerakli yaroqli suratlar soni")
+    parser.add_argument("--faculty", help="Papkadan importda fakultet")
+    parser.add_argument("--direction", help="Papkadan importda yo'nalish")
+    parser.add_argument("--history", action="store_true",
+                        help="Davomat tarixi hisoboti (--db; ixtiyoriy --group, --status, --since, --until)")
+    parser.add_argument("--group", help="Tarix hisoboti uchun guruh")
+    parser.add_argument("--status", help="Tarix hisoboti uchun holat: Kelgan, Kech qolgan yoki Kelmagan")
+    parser.add_argument("--since", help="Tarix hisoboti boshlanish sanasi (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Tarix hisoboti tugash sanasi (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    if args.ann_benchmark:
+        run_ann_benchmark(args)
+    elif args.export_journal:
+        sys.exit(run_export_journal(args))
+    elif args.history:
+        sys.exit(run_history(args))
+    elif args.import_path:
+        sys.exit(run_import(args))
+    elif args.replay or args.synthetic_frames:
+        sys.exit(run_replay_benchmark(args))
+    elif args.rooms:
+        sys.exit(run_rooms(args))
+    elif args.headless:
+        sys.exit(run_headless(args))
+    else:
+        app = AttendanceApp()
+        app.run()
@@ -0,0 +1,351 @@
+"""Kamera va modelsiz tekshiriladigan qismlar uchun testlar (numpy/sqlite)."""
+import importlib.util
+import json
+import os
+from contextlib import closing
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "face_mp_df_tf(FOR GPU).py")
+_spec = importlib.util.spec_from_file_location("face_mp_df_tf", MODULE_PATH)
+app = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(app)
+
+DIM = app.ARCFACE_EMBEDDING_DIM
+
+
+def unit(index, dim=DIM):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[index] = 1.0
+    return vector
+
+
+def blend(a, b, weight):
+    """a dan b tomon weight ulushda burilgan birlik vektor"""
+    vector = (1 - weight) * a + weight * b
+    return vector / np.linalg.norm(vector)
+
+
+def test_matcher_min_picks_nearest_photo():
+    embeddings = np.stack([unit(0), unit(1), unit(2)])
+    matcher = app.FaceMatcher(embeddings, ["ali", "ali", "vali"], min_probability=0.5)
+    matches = matcher.match(np.stack([unit(1), unit(2)]))
+    assert [m.name for m in matches] == ["ali", "vali"]
+    assert matches[0].distance == pytest.approx(0.0, abs=1e-6)
+    assert matches[0].margin == pytest.approx(1.0, abs=1e-6)
+
+
+def test_matcher_topk_averages_nearest_photos():
+    query = unit(0)
+    # ali: bitta juda yaqin va bitta uzoq surat; vali: ikkita o'rtacha yaqin surat
+    embeddings = np.stack([blend(unit(0), unit(1), 0.05), unit(1),
+                           blend(unit(0), unit(2), 0.2), blend(unit(0), unit(3), 0.2)])
+    labels = ["ali", "ali", "vali", "vali"]
+    assert app.FaceMatcher(embeddings, labels, reduction="min").match(query)[0].name == "ali"
+    matcher = app.FaceMatcher(embeddings, labels, reduction="topk", top_k=2, min_probability=0)
+    match = matcher.match(query)[0]
+    assert match.name == "vali"
+    expected = 1.0 - float(embeddings[2] @ query)
+    assert match.distance == pytest.approx(expected, abs=1e-6)
+
+
+def test_matcher_topk_with_fewer_photos_than_k():
+    embeddings = np.stack([unit(0), unit(1), unit(1)])
+    matcher = app.FaceMatcher(embeddings, ["ali", "vali", "vali"], reduction="topk", top_k=3)
+    distances = matcher.person_distances(unit(0))
+    assert distances.shape == (1, 2)
+    assert distances[0, 0] == pytest.approx(0.0, abs=1e-6)
+    assert np.isfinite(distances).all()
+
+
+def test_matcher_rejects_below_min_probability():
+    matcher = app.FaceMatcher(np.stack([unit(0)]), ["ali"], min_probability=0.5)
+    match = matcher.match(blend(unit(0), unit(1), 0.9))[0]
+    assert match.name is None
+    assert match.margin == np.inf
+
+
+def test_matcher_empty_store():
+    matcher = app.FaceMatcher(np.zeros((0, DIM), dtype=np.float32), [])
+    assert matcher.match(unit(0)) == [app.FaceMatch(None, float("inf"), 0.0)]
+
+
+def test_ivf_full_probe_matches_exact_search():
+    embeddings, labels = app.synthetic_embeddings(200, images_per_person=3, seed=0)
+    results = app.benchmark_ann(embeddings, labels, nprobe_values=(1, 1000), queries=200)
+    # Barcha klasterlar ko'rilsa qidiruv to'liq qidiruv bilan bir xil
+    assert results[-1]["recall@1"] == 1.0
+    assert 0.0 < results[1]["recall@1"] <= 1.0
+
+
+def test_ivf_drops_empty_clusters_from_duplicate_photos():
+    rng = np.random.default_rng(1)
+    base = app.normalize_rows(rng.standard_normal((3, DIM)))
+    embeddings = np.repeat(base, 4, axis=0)
+    labels = np.repeat(["a", "b", "c"], 4)
+    matcher = app.FaceMatcher(embeddings, labels, index_backend="ivf", ivf_nlist=6, ivf_nprobe=1)
+    assert (np.diff(matcher.index.offsets) > 0).all()
+    assert [m.name for m in matcher.match(base)] == ["a", "b", "c"]
+
+
+def test_ivf_falls_back_to_exact_when_probes_are_empty():
+    embeddings = np.stack([unit(0), unit(1)])
+    matcher = app.FaceMatcher(embeddings, ["a", "b"], index_backend="ivf", ivf_nlist=2, ivf_nprobe=1)
+    matcher.index.offsets[:] = 0
+    match = matcher.match(unit(1))[0]
+    assert match.name == "b"
+    assert match.distance == pytest.approx(0.0, abs=1e-6)
+
+
+class FakeEmbedder:
+    """Yuz o'rniga fayl raqamini olib, unga mos birlik vektor beradi"""
+
+    def embed(self, faces):
+        return np.stack([unit(face) for face in faces]) if faces else np.zeros((0, DIM), dtype=np.float32)
+
+
+def make_store(tmp_path, monkeypatch, broken=()):
+    """Suratni o'qimasdan, fayl raqamidan vektor beradigan ombor"""
+    store = app.EmbeddingStore(str(tmp_path))
+    calls = []
+
+    def fake_load(image_path, face_detection):
+        calls.append(os.path.basename(image_path))
+        if os.path.basename(image_path) in broken:
+            raise ValueError("buzuq surat")
+        with open(image_path) as f:
+            return int(f.read())
+
+    monkeypatch.setattr(store, "load_reference_face", fake_load)
+    return store, calls
+
+
+def write_photo(folder, filename, index):
+    folder.mkdir(exist_ok=True)
+    (folder / filename).write_text(str(index))
+
+
+def test_sync_person_embeds_only_new_or_changed_photos(tmp_path, monkeypatch):
+    store, calls = make_store(tmp_path, monkeypatch)
+    folder = tmp_path / "ali"
+    write_photo(folder, "1.jpg", 1)
+    write_photo(folder, "2.jpg", 2)
+    assert store.sync_person("ali", str(folder), None, FakeEmbedder())
+    assert sorted(calls) == ["1.jpg", "2.jpg"]
+
+    calls.clear()
+    assert not store.sync_person("ali", str(folder), None, FakeEmbedder())
+    assert calls == []
+
+    write_photo(folder, "2.jpg", 3)
+    (folder / "1.jpg").unlink()
+    assert store.sync_person("ali", str(folder), None, FakeEmbedder())
+    assert calls == ["2.jpg"]
+    assert len(store.embeddings) == 1
+    np.testing.assert_array_equal(store.embeddings[0], unit(3))
+    assert list(store.image_index) == [os.path.join("ali", "2.jpg")]
+
+
+def test_sync_person_retries_failed_photos(tmp_path, monkeypatch):
+    broken = {"2.jpg"}
+    store, calls = make_store(tmp_path, monkeypatch, broken)
+    folder = tmp_path / "ali"
+    write_photo(folder, "1.jpg", 1)
+    write_photo(folder, "2.jpg", 2)
+    store.sync_person("ali", str(folder), None, FakeEmbedder())
+    assert list(store.sources) == [os.path.join("ali", "1.jpg")]
+    assert os.path.join("ali", "2.jpg") not in store.image_index
+
+    broken.clear()
+    calls.clear()
+    assert store.sync_person("ali", str(folder), None, FakeEmbedder())
+    assert calls == ["2.jpg"]
+    assert sorted(store.sources.tolist()) == [os.path.join("ali", "1.jpg"), os.path.join("ali", "2.jpg")]
+
+
+def test_sync_person_keeps_other_students(tmp_path, monkeypatch):
+    store, calls = make_store(tmp_path, monkeypatch)
+    write_photo(tmp_path / "ali", "1.jpg", 1)
+    write_photo(tmp_path / "vali", "1.jpg", 2)
+    store.sync_person("ali", str(tmp_path / "ali"), None, FakeEmbedder())
+    store.sync_person("vali", str(tmp_path / "vali"), None, FakeEmbedder())
+    with closing(app.StudentDatabase.open(str(tmp_path))) as db:
+        for key in ("ali", "vali"):
+            db.save_student(key, dict(STUDENT, name=key, image_folder=str(tmp_path / key)))
+    store.save()
+    reloaded = app.EmbeddingStore(str(tmp_path)).load()
+    assert sorted(reloaded.labels.tolist()) == ["ali", "vali"]
+    assert reloaded.sync_person("ali", str(tmp_path / "ali"), None, FakeEmbedder()) is False
+
+
+def test_distance_stats_match_numpy():
+    values = np.random.default_rng(2).uniform(0.1, 1.2, size=500)
+    stats = app.DistanceStats()
+    for value in values:
+        stats.add(value)
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.variance == pytest.approx(values.var())
+    assert stats.std_dev == pytest.approx(values.std())
+    assert stats.recent is None
+
+
+def test_distance_stats_empty_and_recent_window():
+    stats = app.DistanceStats(recent_size=3)
+    assert (stats.mean, stats.variance, stats.std_dev) == (0.0, 0.0, 0.0)
+    for value in (0.5, 0.6, 0.7, 0.8):
+        stats.add(value)
+    assert list(stats.recent) == pytest.approx([0.6, 0.7, 0.8])
+    assert stats.mean == pytest.approx(0.65)
+
+
+STUDENT = {"surname": "Karimov", "father_name": "", "faculty": "", "direction": "", "group": "101"}
+
+
+def marked_session(tmp_path, db_path="db"):
+    """Bitta o'quvchi yozilgan va statistikasi yangilangan jurnal"""
+    attendance = app.new_attendance_table({"ali": STUDENT, "vali": STUDENT})
+    person = attendance["ali"]
+    for distance in (0.2, 0.4):
+        person["distances"].add(distance)
+    person.update(status="Kelgan", arrival_time="08:01:00", recorded=True,
+                  mean_distance=person["distances"].mean, variance=person["distances"].variance)
+    path = str(tmp_path / "attendance_2026-01-01_08-00-00.jsonl")
+    deadline = datetime.now() + timedelta(hours=1)
+    journal = app.AttendanceJournal.create(path, str(tmp_path / db_path), deadline, deadline)
+    journal.mark("ali", person)
+    return journal, path, attendance
+
+
+def test_journal_replays_marks_and_distance_stats(tmp_path):
+    journal, path, _ = marked_session(tmp_path)
+    journal.close()
+    start, records, finished = app.read_journal(path)
+    assert start["db"] == str(tmp_path / "db") and not finished
+
+    restored = app.apply_journal(app.new_attendance_table({"ali": STUDENT, "vali": STUDENT}), records)
+    person = restored["ali"]
+    assert person["recorded"] and person["status"] == "Kelgan"
+    assert not restored["vali"]["recorded"]
+    person["distances"].add(0.6)
+    assert person["distances"].count == 3
+    assert person["distances"].mean == pytest.approx(0.4)
+    assert person["distances"].variance == pytest.approx(np.var([0.2, 0.4, 0.6]))
+
+
+def test_journal_ignores_torn_last_line(tmp_path):
+    journal, path, _ = marked_session(tmp_path)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"event": "mark", "name": "va')
+    app.AttendanceJournal.resume(path).close()
+    _, records, _ = app.read_journal(path)
+    assert [record["event"] for record in records] == ["start", "mark", "resume"]
+
+
+def test_unfinished_journals_are_matched_by_database(tmp_path):
+    journal, path, _ = marked_session(tmp_path)
+    journal.close()
+    assert [found[0] for found in app.find_unfinished_journals(str(tmp_path / "db"), str(tmp_path))] == [path]
+    assert app.find_unfinished_journals(str(tmp_path / "other"), str(tmp_path)) == []
+
+
+def test_finalize_journal_exports_and_ends(tmp_path, monkeypatch):
+    journal, path, _ = marked_session(tmp_path)
+    journal.close()
+    written = {}
+    monkeypatch.setattr(app, "write_attendance_excel",
+                        lambda table, filename: written.update(table=table, filename=filename))
+    filename = app.finalize_journal(path, {"ali": STUDENT, "vali": STUDENT})
+    assert filename == os.path.splitext(path)[0] + ".xlsx" == written["filename"]
+    assert written["table"]["ali"]["status"] == "Kelgan"
+    assert app.read_journal(path)[2]
+    assert app.find_unfinished_journals(str(tmp_path / "db"), str(tmp_path)) == []
+
+
+def test_student_keys_do_not_overwrite_namesakes(tmp_path):
+    with closing(app.StudentDatabase.open(str(tmp_path))) as db:
+        keys = []
+        for surname, group in (("Karimov", "101"), ("Karimov", "102"), ("Karimov", "103")):
+            key = db.student_key("Ali", surname, "", group)
+            db.save_student(key, dict(STUDENT, name="Ali", surname=surname, group=group))
+            keys.append(key)
+        assert keys == ["Ali", "Ali Karimov", "Ali Karimov (2)"]
+        # Shu o'quvchi qayta qo'shilsa uning kaliti qaytariladi
+        assert db.student_key("Ali", "Karimov", "", "102") == "Ali Karimov"
+        assert db.students()["Ali Karimov (2)"]["group"] == "103"
+
+
+def test_student_database_migrates_metadata_and_embeddings(tmp_path):
+    folder = str(tmp_path / "ali")
+    with open(tmp_path / "metadata.json", "w") as f:
+        json.dump({"ali": dict(STUDENT, image_folder=folder)}, f)
+    source = os.path.join("ali", "1.jpg")
+    np.save(tmp_path / "embeddings.npy", np.stack([unit(0), unit(1)]))
+    np.save(tmp_path / "labels.npy", np.array(["ali", "ali"]))
+    np.save(tmp_path / "sources.npy", np.array([source, ""]))
+    with open(tmp_path / "image_index.json", "w") as f:
+        json.dump({source: {"label": "ali", "sha1": "x", "size": 1, "mtime": 0.0, "version": 2}}, f)
+
+    assert app.load_database_metadata(str(tmp_path))["ali"]["name"] == "ali"
+    store = app.EmbeddingStore(str(tmp_path)).load()
+    # Manbasiz eski vektor ko'chirilmaydi, u keyingi indekslashda qayta olinadi
+    assert store.labels.tolist() == ["ali"] and store.sources.tolist() == [source]
+    np.testing.assert_array_equal(store.embeddings[0], unit(0))
+    assert store.image_index[source]["sha1"] == "x"
+    assert os.path.exists(tmp_path / "metadata.json")
+
+
+LESSON = {"start": "09:00", "late": "09:10", "end": "10:20"}
+
+
+def test_schedule_rejects_invalid_entries():
+    for data in ({}, {"Monday": {"start": "9", "late": "09:10", "end": "10:20"}},
+                 {"Monday": {"start": "09:30", "late": "09:10", "end": "10:20"}},
+                 {"Monday": [LESSON, {"start": "10:00", "late": "10:05", "end": "11:00"}]},
+                 {"exceptions": {"05.01.2026": []}}):
+        with pytest.raises(ValueError):
+            app.Schedule.parse(data)
+
+
+def test_schedule_exception_dates_override_weekdays():
+    schedule = app.Schedule.parse({
+        "Monday": [{"start": "11:00", "late": "11:10", "end": "12:20"}, LESSON],
+        "exceptions": {"2026-01-05": [], "2026-01-07": {"start": "14:00", "late": "14:05", "end": "15:00"}},
+    })
+    # 2026-01-05 - dushanba, lekin istisnoda dars yo'q
+    assert schedule.sessions_on(date(2026, 1, 5)) == []
+    assert [s[0].hour for s in schedule.sessions_on(date(2026, 1, 12))] == [9, 11]
+    start, late, end = schedule.next_window(datetime(2026, 1, 5, 8, 0))
+    assert start == datetime(2026, 1, 7, 14, 0) and end == datetime(2026, 1, 7, 15, 0)
+    assert schedule.next_window(datetime(2026, 1, 12, 9, 30))[0] == datetime(2026, 1, 12, 9, 0)
+    assert schedule.next_window(datetime(2026, 1, 12, 10, 20))[0] == datetime(2026, 1, 12, 11, 0)
+
+
+def test_schedule_with_only_past_exceptions_has_no_window():
+    schedule = app.Schedule.parse({"exceptions": {"2026-01-07": LESSON}})
+    assert schedule.next_window(datetime(2026, 1, 7, 9, 5))[0] == datetime(2026, 1, 7, 9, 0)
+    assert schedule.next_window(datetime(2026, 1, 8)) is None
+
+
+def test_unfinished_journals_are_matched_by_room(tmp_path):
+    deadline = datetime.now() + timedelta(hours=1)
+    path = str(tmp_path / "attendance_2026-01-01_08-00-00.jsonl")
+    app.AttendanceJournal.create(path, str(tmp_path / "db"), deadline, deadline, "101-xona").close()
+    assert app.find_unfinished_journals(str(tmp_path / "db"), str(tmp_path)) == []
+    assert len(app.find_unfinished_journals(str(tmp_path / "db"), str(tmp_path), "101-xona")) == 1
+
+
+def test_rooms_config_rejects_shared_output_dir(tmp_path):
+    rooms = [{"name": name, "db": "db", "cameras": [0], "schedule": {"Monday": LESSON}, "output_dir": "out"}
+             for name in ("a", "b")]
+    path = tmp_path / "rooms.json"
+    path.write_text(json.dumps({"rooms": rooms}))
+    with pytest.raises(ValueError, match="output_dir"):
+        app.read_rooms_config(str(path))
+    rooms[1]["output_dir"] = "out-b"
+    path.write_text(json.dumps({"rooms": rooms}))
+    assert [room["output_dir"] for room in app.read_rooms_config(str(path))[0]] == [
+        str(tmp_path / "out"), str(tmp_path / "out-b")]